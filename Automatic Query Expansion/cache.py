@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+from collections import OrderedDict
+from json import dump, load
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from time import monotonic
+import os
+
+CAPACITY = 1024  # the default number of queries whose results are cached
+CHECK_INTERVAL = 1.0  # the seconds between two checks of the index files
+
+
+def index_generation(file_paths):
+    """
+    Returns the generation of an index, the path, size and modification time of each of its files.
+
+    Rewriting any file of the index, e.g. by indexing the <collection> again, changes its generation,
+    as does removing or renaming it, in which case its size and modification time are None.
+
+    :param file_paths: the paths to the files of the index, where None is ignored
+    :return: a list of [path, size, modification time in nanoseconds] lists, in order of path
+    """
+    generation = []
+    for file_path in sorted(set(os.path.abspath(file_path) for file_path in file_paths if file_path)):
+        try:
+            status = os.stat(file_path)
+        except OSError:
+            generation.append([file_path, None, None])
+            continue
+        generation.append([file_path, status.st_size, status.st_mtime_ns])
+    return generation
+
+
+class ResultCache:
+
+    def __init__(self, file_paths, capacity=CAPACITY, file_path=None):
+        """
+        Keeps the results of the most recently evaluated queries of an index.
+
+        A query is looked up by a key, a string describing its terms and every option that changes
+        its results, see <result_key>, and its results are returned without being evaluated again.
+        The least recently used results are evicted once <capacity> queries are held. The cache is
+        safe to share between the threads of a server.
+
+        The results only hold for the generation of the index they were evaluated against, see
+        <index_generation>. The files of the index are checked at most every <CHECK_INTERVAL>
+        seconds, and every result is discarded once they change.
+
+        With a <file_path>, the results are loaded from a JSON file, unless they were evaluated
+        against another generation of the index, and <save> writes them back:
+
+        > {"generation": [[path, size, mtime], ...], "entries": [[key, results], ...]}
+
+        :param file_paths: the paths to the files of the index
+        :param capacity: the maximum number of queries whose results are held
+        :param file_path: an optional path to a JSON file persisting the cache between runs
+        """
+        self.file_paths = list(file_paths)
+        self.capacity = capacity
+        self.file_path = file_path
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = index_generation(self.file_paths)
+        self.checked = monotonic()
+        if file_path:
+            self.load()
+
+    def validate(self):
+        """
+        Discards every result if the files of the index changed since the last check.
+        """
+        now = monotonic()
+        if now - self.checked < CHECK_INTERVAL:
+            return
+        self.checked = now
+        generation = index_generation(self.file_paths)
+        if generation != self.generation:
+            self.generation = generation
+            if self.entries:
+                self.entries.clear()
+                self.invalidations += 1
+
+    def get(self, key):
+        """
+        Returns the results of a query, or None if they are not cached.
+
+        :param key: the key of the query
+        :return: the results of the query, or None
+        """
+        with self.lock:
+            self.validate()
+            results = self.entries.get(key)
+            if results is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return results
+
+    def put(self, key, results):
+        """
+        Caches the results of a query, evicting the least recently used results if the cache is full.
+
+        :param key: the key of the query
+        :param results: the results of the query, a value that can be serialized as JSON
+        """
+        if self.capacity <= 0:
+            return
+        with self.lock:
+            self.entries[key] = results
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Discards every result.
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def load(self):
+        """
+        Loads the results of the JSON file of the cache, if it exists and holds the current generation of the index.
+        """
+        try:
+            with open(self.file_path, 'r') as f:
+                persisted = load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if persisted.get('generation') != self.generation:
+            self.invalidations += 1
+            return
+        with self.lock:
+            for key, results in persisted['entries'][-self.capacity:] if self.capacity > 0 else []:
+                self.entries[key] = results
+
+    def save(self):
+        """
+        Replaces the JSON file of the cache atomically, in order of least recently used.
+        """
+        with self.lock:
+            entries = [[key, results] for key, results in self.entries.items()]
+            persisted = {'generation': self.generation, 'entries': entries}
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        with NamedTemporaryFile('w', dir=directory, delete=False) as f:
+            dump(persisted, f)
+        os.replace(f.name, self.file_path)
+
+    def hit_rate(self):
+        """
+        Returns the fraction of lookups that found their results.
+
+        :return: the hit rate, or 0 before the first lookup
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self):
+        """
+        Returns the statistics of the cache as a dictionary that can be serialized as JSON.
+
+        :return: a dictionary of the "entries", "capacity", "hits", "misses", "hit_rate", "evictions" and
+        "invalidations"
+        """
+        return {'entries': len(self.entries), 'capacity': self.capacity, 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hit_rate(), 'evictions': self.evictions, 'invalidations': self.invalidations}
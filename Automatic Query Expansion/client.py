@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from json import dumps, loads
+from socket import socket, create_connection, AF_UNIX
+
+
+def main():
+    """
+    <client.py> sends a query to a running <server.py> and prints the results like <search.py>.
+
+    The optional "-u" argument is the path of the server's Unix socket
+    The optional "-p" argument is the server's TCP port, used if "-u" is not given
+    The remaining arguments match those of <search.py>
+    """
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument('-a', metavar="<algorithm>", required=True)
+    parser.add_argument('-q', metavar="<query-label>", required=True)
+    parser.add_argument('-n', metavar='<num-results>', type=int, required=True)
+    parser.add_argument('-u', metavar='<socket>')
+    parser.add_argument('-p', metavar='<port>', type=int, default=8080)
+    parser.add_argument('-H', metavar='<host>', default='127.0.0.1')
+    parser.add_argument('query', metavar='<queryterm-1> [<queryterm-2> ... <queryterm-N>]', nargs='+')
+    args = parser.parse_args()
+
+    if args.u:
+        connection = socket(AF_UNIX)
+        connection.connect(args.u)
+    else:
+        connection = create_connection((args.H, args.p))
+    request = {'a': args.a, 'q': args.q, 'n': args.n, 'query': ' '.join(args.query)}
+    with connection, connection.makefile('rwb') as stream:
+        stream.write(dumps(request).encode('utf-8') + b'\n')
+        stream.flush()
+        response = loads(stream.readline())
+
+    if 'error' in response:
+        exit(response['error'])
+    for docno, rank, score in response['results']:
+        print("%s %s %d %.3f" % (args.q, docno, rank, score))
+    print("\nLatency: %.3f ms" % response['latency_ms'])
+
+
+if __name__ == "__main__":
+    main()
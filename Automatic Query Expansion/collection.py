@@ -1,38 +1,25 @@
 #!/usr/bin/env python
 
+from array import array
 from collections import Counter
+from docstore import DocumentStore, DocumentStoreWriter
+from document_map import DocumentMap, DocumentMapWriter
+from forward import ForwardIndexWriter
+from impacts import write_impacts
+from inverted_file import InvertedFile
+from lexicon import Lexicon, LexiconWriter
+from multiprocessing import Pool
+from positions import write_positions, RUN_BUDGET
 from ranking import BM25
-from re import compile, split
+from spimi import SPIMIIndexer
 from struct import pack
+from tempfile import TemporaryFile
+from tokenizer import tokenize
+from trec import parse_documents, read_chunk, read_documents, split_collection, CHUNK_SIZE
+import numpy
+import os
 
-term_regex = compile('[^a-zA-Z-/\']')
-
-def tokenize(content, stoplist=None):
-    """
-    Converts a list of words into terms based on a set of rules/
-
-    We decided to keep words containing either hyphens, forward-slashes or apostrophes
-    in our earlier regex because they themselves are composed of multiple words.
-    We now use another another regex that matches word groups to extract the words.
-
-    The reasoning behind these decisions is to maintain the structure of the words.
-    This is so the index reflects what a typical user expects. For example in a search
-    function where the user wants to find occurrences of "campus", it is preferable to
-    recognize "on-campus" as a legitimate source of "campus".
-
-    :param content: a string of text
-    :return terms: a list of words after tokenization
-    """
-    words = term_regex.sub(' ', content).lower().split()
-    terms = []
-    for word in words:
-        if word.isalpha():
-            terms.append(word)
-        else:
-            terms.extend(split('\W+', word))
-    if stoplist:
-        terms = [t for t in terms if t not in stoplist]
-    return terms
+vocabulary = None  # the <lexicon> term ids and <docstore> path, opened by the workers of a forward or positional index
 
 
 class Document:
@@ -56,122 +43,448 @@ class Document:
         self.length = sum(map(len, terms))
 
 
+def index_chunk(chunk):
+    """
+    Accumulates the postings and <map> entries of one chunk of a collection in a worker process.
+
+    :param chunk: a (collection, stoplist, start, end, id) tuple describing the chunk
+    :return: a tuple of the postings dictionary, the list of <map> entries and the list of texts of the chunk
+    """
+    collection, stoplist, start, end, id = chunk
+    chunk_collection = Collection(stoplist)
+    texts = []
+    for id, docno, text in parse_documents(read_chunk(collection, start, end), id=id):
+        chunk_collection.add_document(Document(id, docno, tokenize(text, chunk_collection.stoplist)))
+        texts.append(text)
+    return chunk_collection.postings, chunk_collection.map, texts
+
+
+def open_vocabulary(stoplist=None, directory='.'):
+    """
+    Loads the rank of every term of the <lexicon> for <vector_chunk> and <position_chunk>.
+
+    :param stoplist: an optional path to the <stoplist> used to index the collection
+    :param directory: a path to the directory of the index
+    """
+    global vocabulary
+    with Lexicon(os.path.join(directory, 'lexicon')) as lexicon:
+        term_ids = dict((term, rank) for rank, (term, _) in enumerate(lexicon.items()))
+    vocabulary = (term_ids, Collection(stoplist).stoplist, os.path.join(directory, 'docstore'))
+
+
+def vector_chunk(chunk):
+    """
+    Computes the term vectors of a range of documents of the <docstore> in a worker process.
+
+    :param chunk: a (first, last) tuple of the ids of the range
+    :return: a list of term vectors, see <Collection.term_vector>
+    """
+    first, last = chunk
+    term_ids, stoplist, docstore_path = vocabulary
+    with DocumentStore(docstore_path) as docstore:
+        return [Collection.term_vector(tokenize(docstore.text(id), stoplist), term_ids)
+                for id in range(first, last + 1)]
+
+
+def position_chunk(chunk):
+    """
+    Replaces the terms of a range of documents of the <docstore> by their term ids in a worker process.
+
+    :param chunk: a (first, last) tuple of the ids of the range
+    :return: a tuple of an array of the term ids of every document in order, and an array of the number of terms
+    of each document
+    """
+    first, last = chunk
+    term_ids, stoplist, docstore_path = vocabulary
+    documents = []
+    with DocumentStore(docstore_path) as docstore:
+        for id in range(first, last + 1):
+            terms = tokenize(docstore.text(id), stoplist)
+            documents.append(numpy.array([term_ids[term] for term in terms], numpy.uint32))
+    return numpy.concatenate(documents), numpy.array([len(terms) for terms in documents], numpy.int64)
+
+
 class Collection:
 
-    def __init__(self, stoplist=None):
+    def __init__(self, stoplist=None, workers=1, directory='.'):
         """
         Contains functions to index a collection.
 
-        :param sourcefile: a path to a collection
+        The files of the index are written to <directory>, the current working directory by default.
+
         :param stoplist: an optional path to a stoplist
+        :param workers: the number of processes used to parse a collection
+        :param directory: a path to the directory the files of the index are written to
         """
+        self.stoplist_file = stoplist
+        self.workers = workers
+        self.directory = directory
         self.stoplist = None
         if stoplist:
             with open(stoplist, 'r') as f:
                 self.stoplist = set(f.read().split('\n'))
         self.documents = []
+        self.postings = {}
+        self.map = []
+        self.weights = array('f')
+        self.average_length = None
+
+    def path(self, name):
+        """
+        Returns the path to a file of the index.
+
+        :param name: the name of the file, e.g. "lexicon"
+        :return: the path to the file within <directory>
+        """
+        return os.path.join(self.directory, name)
 
     def parse_document(self, collection, docno):
-        with open(collection, 'r') as f:
-            content = ''
-            appending = False
-            found = False
-            for line in f:
-                if not found:
-                    if line.startswith('<DOCNO>') and docno == line[8:-10]:
-                        found = True
-                else:
-                    if line == '<TEXT>\n' or line == '<HEADLINE>\n':
-                        appending = True
-                    elif line == '</TEXT>\n' or line == '</HEADLINE>\n':
-                        appending = False
-                    elif appending and not line.startswith(('<', '</')):
-                        content += line
-                    elif line == '</DOC>\n':
-                        terms = tokenize(content, self.stoplist)
-                        self.documents.append(Document(len(self.documents), docno, terms))
-                        return True
-            return False
-
-    def parse_collection(self, collection):
-        """
-        Iterates the <collection> one line at time to store important data.
-
-        > begin <appending> if line equals "<TEXT>" or "<HEADLINE>"
-        > stop <appending> if line equals "</TEXT>" or "</HEADLINE>"
-        > appends the line to <content> if <appending> and not a tag ELSE
-        > assigns <docno> if it encounters a <DOCNO></DOCNO> tag ELSE
-        > resets <content> if line equals "<DOC>"
-        > tokenizes <content> if line equals "</DOC>" and increments <id>
+        """
+        Parses a single document from the <collection> and stores it in <documents>.
+
+        :param collection: a path to a <collection>
+        :param docno: the docno of the document to parse
+        :return: True if the document was found, otherwise False
+        """
+        for id, docno, text in read_documents(collection, {docno}):
+            self.documents.append(Document(len(self.documents), docno, tokenize(text, self.stoplist)))
+            return True
+        return False
+
+    def load_document(self, docstore, id, docno):
+        """
+        Fetches a single document from a <docstore> and stores it in <documents>.
+
+        Unlike <parse_document>, the <collection> is not scanned for the document.
+
+        :param docstore: a DocumentStore
+        :param id: the identifier of the document to fetch
+        :param docno: the docno of the document
+        """
+        self.documents.append(Document(len(self.documents), docno, tokenize(docstore.text(id), self.stoplist)))
+
+    def parse_collection(self, collection, chunk=None):
+        """
+        Streams the <collection> one document at a time into the Collection.
+
+        Each (id, docno, text) record from <read_documents> is tokenized and handed to
+        <add_document> before the next document is read, so parsing, tokenization and
+        postings accumulation form a single pipeline.
+
+        With more than one worker, the <collection> is split at "<DOC>" boundaries and
+        the chunks are indexed by a process pool. Each chunk knows the <id> preceding it,
+        so ids are globally consistent, and the partial postings are merged in order of
+        chunk so that the files written are identical to those of a serial build.
+
+        The text of every document is also written to a <docstore> file in the <directory>,
+        so that search can fetch documents without scanning the <collection>.
+
+        A <chunk> of the <collection> is indexed on its own by a single process, with its documents
+        numbered from 1, as a shard of a sharded index, see <build_shards>.
 
         :param collection: a path to a <collection>
+        :param chunk: an optional (start, end) tuple of the byte-offsets of the documents to index
+        """
+        if chunk:
+            with DocumentStoreWriter(self.path('docstore')) as docstore:
+                for id, docno, text in parse_documents(read_chunk(collection, *chunk)):
+                    self.add_document(Document(id, docno, tokenize(text, self.stoplist)))
+                    docstore.add(id, text)
+        elif self.workers > 1:
+            with open(collection, 'rb') as f:
+                f.seek(0, 2)
+                chunk_size = min(CHUNK_SIZE, f.tell() // (4 * self.workers) + 1)  # several chunks per worker
+            chunks = [(collection, self.stoplist_file, start, end, id)
+                      for start, end, id in split_collection(collection, chunk_size)]
+            pool = Pool(self.workers)
+            try:
+                with DocumentStoreWriter(self.path('docstore')) as docstore:
+                    for postings, map_entries, texts in pool.imap(index_chunk, chunks):
+                        self.add_postings(postings, map_entries)
+                        for (id, _, _), text in zip(map_entries, texts):
+                            docstore.add(id, text)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            with DocumentStoreWriter(self.path('docstore')) as docstore:
+                for id, docno, text in read_documents(collection):
+                    self.add_document(Document(id, docno, tokenize(text, self.stoplist)))
+                    docstore.add(id, text)
+
+    def add_document(self, document):
+        """
+        Accumulates the postings and <map> entry of a parsed Document.
+
+        The Document itself is not retained.
+
+        :param document: a Document
+        """
+        for term, token_frequency in Counter(document.terms).items():  # tallies term occurrences in the Document
+            if term in self.postings:
+                self.postings[term].append((document.id, token_frequency))
+            else:
+                self.postings[term] = [(document.id, token_frequency)]
+        self.map.append((document.id, document.docno, document.length))
+
+    def add_postings(self, postings, map_entries):
+        """
+        Merges the partial postings and <map> entries of a chunk indexed by a worker.
+
+        :param postings: a dictionary with "term" as a key and a list of (id, token_frequency) as a value
+        :param map_entries: a list of (id, docno, length) tuples
+        """
+        for term, term_postings in postings.items():
+            if term in self.postings:
+                self.postings[term].extend(term_postings)
+            else:
+                self.postings[term] = term_postings
+        self.map.extend(map_entries)
+
+    def document_statistics(self):
+        """
+        Returns the number of documents parsed and their combined length.
+
+        :return: a tuple of the number of documents and the sum of their lengths
         """
-        with open(collection, 'r') as f:
-            id = 0
-            docno = ''
-            content = ''
-            appending = False
-            for line in f:
-                if line == '<TEXT>\n' or line == '<HEADLINE>\n':
-                    appending = True
-                elif line == '</TEXT>\n' or line == '</HEADLINE>\n':
-                    appending = False
-                elif appending and not line.startswith(('<', '</')):
-                    content += line
-                elif line.startswith('<DOCNO>'):
-                    docno = line[8:-10]
-                elif line == '<DOC>\n':
-                    content = ''
-                elif line == '</DOC>\n':
-                    id += 1
-                    terms = self.tokenize_terms(content, self.stoplist)
-                    self.documents.append(Document(id, docno, terms))
-
-    def write_map_to_disk(self):
-        """
-        Writes a <map> file to the current working directory.
-
-        The <map> file is line-separated, where each line consists of '<id> <docno> <document_weight>'.
+        return len(self.map), sum(map(lambda entry: entry[2], self.map))
+
+    def write_map_to_disk(self, average_length=None):
+        """
+        Writes a <map> file to the <directory>.
+
+        The <map> file is a binary file written by a DocumentMapWriter, holding the <docno>
+        and <document_weight> of each document indexed by <id>.
         The <document_weight> is calculated as the value of K in BM25's scoring function.
+        The weights are also kept in <weights> to bound the scores in the <lexicon>,
+        and the average document length in <average_length>.
+
+        :param average_length: the average document length of the whole collection when the Collection
+        is one shard of it, by default the average length of the documents of the Collection
         """
-        al = sum(map(lambda d: d.length, self.documents)) / len(self.documents)
+        if not self.map:
+            raise ValueError("The collection has no documents.")
+        al = average_length or sum(map(lambda entry: entry[2], self.map)) / len(self.map)
+        self.average_length = al
         ranker = BM25()
-        with open('map', 'w') as f:
-            for document in self.documents:
-                f.write(str(document.id) + ' ' + document.docno + ' ' + str(ranker.document_weight(document.length, al)) + '\n')
+        with DocumentMapWriter(self.path('map')) as map_writer:
+            for id, docno, length in self.map:
+                self.weights.append(ranker.document_weight(length, al))
+                map_writer.add(id, docno, self.weights[-1])
 
-    def create_postings(self):
+    def iterate_postings(self):
         """
-        Builds a dictionary for the term occurrence statistics of the Collection.
+        Yields the inverted list of each term in the Collection in order of term.
 
-        :return postings: a dictionary with "term" as a key and a list of Document "id" as a value
+        :return: a generator of ("term", [(id, token_frequency), ...]) tuples
         """
-        postings = {}
-        if self.documents:
-            for document in self.documents:
-                for term in document.terms:
-                    if term in postings:
-                        postings[term].append(document.id)
-                    else:
-                        postings[term] = [document.id]
-        return postings
+        for term in sorted(self.postings):
+            yield term, self.postings[term]
 
     def write_invlists_lexicon_to_disk(self):
         """
-        Writes an <invlists> file and <lexicon> file to the current working directory.
+        Writes an <invlists> file and <lexicon> file to the <directory>.
 
         <invlists> is a binary integer file (32-bit) composed of sequential inverted lists.
         Each inverted list is preceded by a document frequency integer.
         This is followed by an number of "<id> <token_frequency>" pairs equal to the document frequency.
-        <lexicon> is a key-value-pair where every "key" is "term" that is assigned a byte-offset from <tell>.
-        The order of terms/documents in <invlists> and <lexicon> are unordered because <postings> is unordered.
-        """
-        postings = self.create_postings()
-        with open('invlists', 'wb') as invlists_file, open('lexicon', 'w') as lexicon_file:
-            for term in postings.keys():
-                lexicon_file.write(term + ' ' + str(invlists_file.tell()) + '\n')  # gets the position of the file
-                term_occurrences = Counter(postings[term])  # tallies term occurrences by document <id>
-                document_frequency = len(term_occurrences.keys())
-                invlists_file.write(str(pack('I', document_frequency)))
-                for document_id in term_occurrences.keys():
-                    invlists_file.write(pack('II', document_id, term_occurrences[document_id]))
+        <lexicon> is a binary file written by a LexiconWriter, where every term is assigned
+        a byte-offset from <tell>, its document frequency, its collection frequency and the
+        maximum BM25 <tf_term_weight> over its inverted list, used by search to bound scores.
+        The terms in <invlists> and <lexicon> are sorted.
+
+        The <document_weight> values are taken from <weights>, so <write_map_to_disk> must be called first.
+        """
+        if len(self.weights) == 0:
+            raise ValueError("The map must be written before the invlists and lexicon.")
+        weights = numpy.frombuffer(self.weights, numpy.float32).astype(numpy.float64)
+        ranker = BM25()
+        with open(self.path('invlists'), 'wb') as invlists_file, LexiconWriter(self.path('lexicon')) as lexicon_writer:
+            for term, term_occurrences in self.iterate_postings():
+                occurrences = numpy.array(term_occurrences, numpy.int64)
+                collection_frequency = int(occurrences[:, 1].sum())
+                max_score = float(ranker.tf_term_weight(occurrences[:, 1], weights[occurrences[:, 0] - 1]).max())
+                lexicon_writer.add(term, invlists_file.tell(), len(term_occurrences), collection_frequency, max_score)
+                invlists_file.write(pack('I', len(term_occurrences)))
+                for document_id, token_frequency in term_occurrences:
+                    invlists_file.write(pack('II', document_id, token_frequency))
+
+    def write_impacts_to_disk(self, bits=8):
+        """
+        Writes an impact-ordered <impacts> file to the <directory>.
+
+        The <impacts> file is derived from the <lexicon>, <invlists> and <map> files,
+        so it must be written after them. See <write_impacts> for its format.
+
+        :param bits: the number of bits of a quantized impact
+        """
+        lexicon_path, invlists_path, map_path = self.path('lexicon'), self.path('invlists'), self.path('map')
+        with Lexicon(lexicon_path) as lexicon, InvertedFile(invlists_path) as invlists, DocumentMap(map_path) as map:
+            write_impacts(self.path('impacts'), lexicon, invlists, map, bits)
+
+    @staticmethod
+    def term_vector(terms, term_ids):
+        """
+        Returns the term vector of a document.
+
+        :param terms: the terms of the document
+        :param term_ids: a dictionary with "term" as a key and its rank in the <lexicon> as a value
+        :return: a list of (term_id, token_frequency) tuples sorted by term id
+        """
+        return sorted((term_ids[term], token_frequency) for term, token_frequency in Counter(terms).items())
+
+    def write_forward_index_to_disk(self):
+        """
+        Writes a <forward> index to the <directory>.
+
+        The documents are tokenized again from the <docstore>, and each term is replaced by
+        its rank in the <lexicon>, so both must be written first. See <ForwardIndexWriter>.
+        With more than one worker, ranges of documents are tokenized by a process pool.
+        """
+        chunks = self.document_ranges()
+        with ForwardIndexWriter(self.path('forward')) as forward_writer:
+            if self.workers > 1:
+                pool = Pool(self.workers, open_vocabulary, (self.stoplist_file, self.directory))
+                vectors = pool.imap(vector_chunk, chunks)
+            else:
+                pool = None
+                open_vocabulary(self.stoplist_file, self.directory)
+                vectors = map(vector_chunk, chunks)
+            try:
+                for (first, _), chunk_vectors in zip(chunks, vectors):
+                    for id, vector in enumerate(chunk_vectors, first):
+                        forward_writer.add(id, vector)
+            finally:
+                if pool:
+                    pool.close()
+                    pool.join()
+
+    def document_ranges(self):
+        """
+        Splits the documents of the <docstore> into ranges tokenized by <vector_chunk> or <position_chunk>.
+
+        :return: a list of (first, last) tuples of the ids of each range
+        """
+        with DocumentStore(self.path('docstore')) as docstore:
+            count = len(docstore)
+        step = max(1, min(4096, count // (4 * self.workers) + 1))
+        return [(first, min(first + step - 1, count)) for first in range(1, count + 1, step)]
+
+    def write_positions_to_disk(self, budget=None):
+        """
+        Writes a <positions> file to the <directory>.
+
+        The documents are tokenized again from the <docstore>, and each term is replaced by its
+        rank in the <lexicon>, so both must be written first. The position of a term is its index
+        among the terms of the document once the stoplist is applied, matching query terms
+        tokenized with the same stoplist. The occurrences are sorted by term id in runs spilled to
+        temporary files, and the runs are merged one range of term ids at a time by <write_positions>,
+        so memory use is bounded by the <budget> rather than by the size of the collection.
+        With more than one worker, ranges of documents are tokenized by a process pool.
+
+        :param budget: the memory budget for occurrences measured in bytes, <RUN_BUDGET> by default
+        """
+        with Lexicon(self.path('lexicon')) as lexicon:
+            term_count = len(lexicon)
+        chunks = self.document_ranges()
+        if self.workers > 1:
+            pool = Pool(self.workers, open_vocabulary, (self.stoplist_file, self.directory))
+            window = 2 * self.workers  # the ranges tokenized at a time, so that results never queue up unspilled
+            results = (result for start in range(0, len(chunks), window)
+                       for result in pool.imap(position_chunk, chunks[start:start + window]))
+        else:
+            pool = None
+            open_vocabulary(self.stoplist_file, self.directory)
+            results = map(position_chunk, chunks)
+        try:
+            write_positions(self.path('positions'), term_count,
+                            ((first, terms, lengths) for (first, _), (terms, lengths) in zip(chunks, results)),
+                            budget or RUN_BUDGET)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+
+class SPIMICollection(Collection):
+
+    def __init__(self, stoplist=None, budget=64 * 1024 * 1024, workers=1, directory='.'):
+        """
+        Indexes a collection in a single pass without retaining its Documents.
+
+        Postings are handed to a SPIMIIndexer as each Document is parsed and the
+        <map> entries are spooled to a temporary file, so memory use is bounded
+        by the <budget> rather than by the size of the collection.
+
+        :param stoplist: an optional path to a stoplist
+        :param budget: the memory budget for accumulated postings measured in bytes
+        :param workers: the number of processes used to parse a collection
+        :param directory: a path to the directory the files of the index are written to
+        """
+        Collection.__init__(self, stoplist, workers, directory)
+        self.indexer = SPIMIIndexer(budget)
+        self.map_spool = TemporaryFile('w+')
+        self.total_length = 0
+        self.count = 0
+
+    def add_document(self, document):
+        """
+        Adds the postings of a Document to the SPIMIIndexer and spools its <map> entry.
+
+        :param document: a Document
+        """
+        self.indexer.add_document(document.id, document.terms)
+        self.map_spool.write(str(document.id) + ' ' + document.docno + ' ' + str(document.length) + '\n')
+        self.total_length += document.length
+        self.count += 1
+
+    def add_postings(self, postings, map_entries):
+        """
+        Adds the partial postings of a chunk to the SPIMIIndexer and spools its <map> entries.
+
+        :param postings: a dictionary with "term" as a key and a list of (id, token_frequency) as a value
+        :param map_entries: a list of (id, docno, length) tuples
+        """
+        self.indexer.add_postings(postings)
+        for id, docno, length in map_entries:
+            self.map_spool.write(str(id) + ' ' + docno + ' ' + str(length) + '\n')
+            self.total_length += length
+            self.count += 1
+
+    def document_statistics(self):
+        """
+        Returns the number of documents parsed and their combined length.
+
+        :return: a tuple of the number of documents and the sum of their lengths
+        """
+        return self.count, self.total_length
+
+    def write_map_to_disk(self, average_length=None):
+        """
+        Writes a <map> file to the <directory> from the spooled entries.
+
+        The average document length is only known once parsing is complete,
+        so the <document_weight> of each spooled entry is computed here.
+
+        :param average_length: the average document length of the whole collection when the Collection
+        is one shard of it, by default the average length of the documents of the Collection
+        """
+        if not self.count:
+            raise ValueError("The collection has no documents.")
+        al = average_length or self.total_length / self.count
+        self.average_length = al
+        ranker = BM25()
+        self.map_spool.seek(0)
+        with DocumentMapWriter(self.path('map')) as map_writer:
+            for line in self.map_spool:
+                id, docno, length = line.split()
+                self.weights.append(ranker.document_weight(int(length), al))
+                map_writer.add(int(id), docno, self.weights[-1])
+
+    def iterate_postings(self):
+        """
+        Yields the inverted list of each term in order of term by merging the SPIMI runs.
+
+        :return: a generator of ("term", [(id, token_frequency), ...]) tuples
+        """
+        return self.indexer.merge_runs()
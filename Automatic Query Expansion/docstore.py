@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+from array import array
+from collections import OrderedDict
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from threading import Lock
+from zlib import compress, decompress
+import numpy
+
+HEADER = Struct('<4sIQQQ')  # magic, block size, number of documents, number of blocks, byte-offset of the tables
+MAGIC = b'DST1'
+BLOCK_SIZE = 64 * 1024  # the uncompressed size at which a block is compressed, measured in bytes
+DOCUMENT = numpy.dtype([('block', '<u4'), ('start', '<u4'), ('length', '<u4')])
+
+
+class DocumentStoreWriter:
+
+    def __init__(self, file_path, block_size=BLOCK_SIZE):
+        """
+        Writes a <docstore> file of the text of every document, compressed in blocks.
+
+        The text of consecutive documents is appended to a block until it holds <block_size>
+        bytes, and the block is then compressed with zlib and written. Two tables follow the
+        blocks: the byte-offset of every block, and the (block, start, length) of every document
+        within its uncompressed block, where document <id> is at index <id - 1>.
+
+        :param file_path: a path to the <docstore> file
+        :param block_size: the uncompressed size of a block measured in bytes
+        """
+        self.file = open(file_path, 'wb')
+        self.block_size = block_size
+        self.block = []
+        self.block_length = 0
+        self.block_offsets = array('Q')
+        self.documents = array('I')
+        self.count = 0
+        self.file.write(HEADER.pack(MAGIC, block_size, 0, 0, 0))
+
+    def add(self, id, text):
+        """
+        Appends the text of a document, documents must be added in order of id.
+
+        :param id: the identifier of the document, one greater than the previous document
+        :param text: the text of the document
+        """
+        if id != self.count + 1:
+            raise ValueError("Document ids in the docstore must be consecutive, expected %d but found %d."
+                             % (self.count + 1, id))
+        encoded = text.encode('utf-8')
+        self.documents.extend((len(self.block_offsets), self.block_length, len(encoded)))
+        self.block.append(encoded)
+        self.block_length += len(encoded)
+        self.count += 1
+        if self.block_length >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Compresses and writes the current block.
+        """
+        if self.block:
+            self.block_offsets.append(self.file.tell())
+            self.file.write(compress(b''.join(self.block)))
+            self.block = []
+            self.block_length = 0
+
+    def close(self):
+        """
+        Writes the last block and the tables, and completes the header of the <docstore>.
+        """
+        self.flush()
+        self.block_offsets.append(self.file.tell())
+        self.file.write(b'\0' * (-self.file.tell() % 8))  # aligns the tables
+        table_offset = self.file.tell()
+        self.file.write(numpy.frombuffer(self.block_offsets, numpy.uint64).astype('<u8').tobytes())
+        self.file.write(numpy.frombuffer(self.documents, numpy.uint32).astype('<u4').tobytes())
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, self.block_size, self.count, len(self.block_offsets) - 1, table_offset))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class DocumentStore:
+
+    def __init__(self, file_path, capacity=16):
+        """
+        Fetches the text of documents by id from a memory-mapped <docstore> file.
+
+        Fetching a document decompresses only its block. The <capacity> most recently
+        decompressed blocks are kept, as the top-ranked documents of a query are often
+        close to each other in the collection.
+
+        :param file_path: a path to a <docstore> file
+        :param capacity: the number of decompressed blocks kept
+        """
+        self.file = open(file_path, 'rb')
+        self.buffer = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+        magic, _, self.count, block_count, table_offset = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError("'%s' is not a docstore file." % file_path)
+        self.block_offsets = numpy.frombuffer(self.buffer, '<u8', block_count + 1, table_offset)
+        self.documents = numpy.frombuffer(self.buffer, DOCUMENT, self.count, table_offset + 8 * (block_count + 1))
+        self.capacity = capacity
+        self.blocks = OrderedDict()
+        self.lock = Lock()  # guards <blocks> when documents are fetched by several threads
+
+    def block(self, number):
+        """
+        Returns a decompressed block.
+
+        :param number: the number of the block
+        :return: the bytes of the block
+        """
+        with self.lock:
+            if number in self.blocks:
+                self.blocks.move_to_end(number)
+                return self.blocks[number]
+        start, end = self.block_offsets[number:number + 2].tolist()
+        block = decompress(self.buffer[start:end])
+        with self.lock:
+            self.blocks[number] = block
+            if len(self.blocks) > self.capacity:
+                self.blocks.popitem(last=False)
+        return block
+
+    def text(self, id):
+        """
+        Returns the text of a document.
+
+        :param id: the identifier of a document
+        :return: the text of the document
+        """
+        number, start, length = self.documents[id - 1].tolist()
+        return self.block(number)[start:start + length].decode('utf-8')
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        """
+        Releases the mapping and closes the <docstore> file.
+        """
+        self.block_offsets = self.documents = None
+        self.blocks.clear()
+        try:
+            self.buffer.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+from array import array
+from mmap import mmap, ACCESS_READ
+from shutil import copyfileobj
+from struct import Struct
+from tempfile import TemporaryFile
+import numpy
+
+HEADER = Struct('<4s4xQ')  # magic, number of documents
+MAGIC = b'MAP1'
+
+
+class DocumentMapWriter:
+
+    def __init__(self, file_path):
+        """
+        Writes a binary <map> file of document weights and docnos indexed by document id.
+
+        The file consists of a header, an array of 32-bit float <document_weight> values,
+        an array of 64-bit byte-offsets into a blob of docnos, and the blob itself.
+        The weight and docno of document <id> are found at index <id - 1> of the arrays.
+        Each section is spooled to a temporary file, so only the current entry is held in memory.
+
+        :param file_path: a path to the <map> file
+        """
+        self.file_path = file_path
+        self.weights = TemporaryFile()
+        self.offsets = TemporaryFile()
+        self.docnos = TemporaryFile()
+        self.count = 0
+        self.offsets.write(array('Q', [0]).tobytes())
+
+    def add(self, id, docno, weight):
+        """
+        Appends the entry of a document, documents must be added in order of id.
+
+        :param id: the identifier of the document, one greater than the previous document
+        :param docno: the docno of the document
+        :param weight: the BM25 <document_weight> of the document
+        """
+        if id != self.count + 1:
+            raise ValueError("Document ids in the map must be consecutive, expected %d but found %d."
+                             % (self.count + 1, id))
+        self.weights.write(array('f', [weight]).tobytes())
+        self.docnos.write(docno.encode('utf-8'))
+        self.offsets.write(array('Q', [self.docnos.tell()]).tobytes())
+        self.count += 1
+
+    def close(self):
+        """
+        Assembles the header and the spooled sections into the <map> file.
+        """
+        with open(self.file_path, 'wb') as map_file:
+            map_file.write(HEADER.pack(MAGIC, self.count))
+            for section in (self.weights, self.offsets, self.docnos):
+                if section is self.offsets:
+                    map_file.write(b'\0' * (-map_file.tell() % 8))  # aligns the byte-offsets
+                section.seek(0)
+                copyfileobj(section, map_file)
+                section.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class DocumentMap:
+
+    def __init__(self, file_path):
+        """
+        Looks up documents by id in a memory-mapped binary <map> file written by a DocumentMapWriter.
+
+        Opening the file does not parse it. <weights> is a zero-copy float array
+        of every <document_weight>, where document <id> is at index <id - 1>.
+
+        :param file_path: a path to a <map> file
+        """
+        self.file = open(file_path, 'rb')
+        self.buffer = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError("'%s' is not a binary map file." % file_path)
+        position = HEADER.size
+        self.weights = numpy.frombuffer(self.buffer, numpy.float32, self.count, position)
+        position += 4 * self.count
+        position += -position % 8
+        self.offsets = numpy.frombuffer(self.buffer, numpy.uint64, self.count + 1, position)
+        self.blob_offset = position + 8 * (self.count + 1)
+
+    def docno(self, id):
+        """
+        Returns the docno of a document.
+
+        :param id: the identifier of a document
+        :return: the docno of the document
+        """
+        start, end = self.offsets[id - 1:id + 1].tolist()
+        return self.buffer[self.blob_offset + start:self.blob_offset + end].decode('utf-8')
+
+    def weight(self, id):
+        """
+        Returns the BM25 <document_weight> of a document.
+
+        :param id: the identifier of a document
+        :return: the document weight
+        """
+        return float(self.weights[id - 1])
+
+    def __getitem__(self, id):
+        return self.docno(id), self.weight(id)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        """
+        Releases the mapping and closes the <map> file.
+
+        If views of <weights> are still alive, the mapping is instead
+        released once the last of them is garbage collected.
+        """
+        self.weights = self.offsets = None
+        try:
+            self.buffer.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
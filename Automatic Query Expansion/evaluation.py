@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from math import log2
+
+MEASURES = ('MAP', 'P@10', 'NDCG')
+
+
+def read_qrels(file_path):
+    """
+    Returns the relevance judgements of a TREC qrels file.
+
+    Each line of the file is "<label> <iteration> <docno> <relevance>", where a relevance
+    greater than zero judges the document relevant, and a higher relevance more so.
+
+    :param file_path: a path to a qrels file
+    :return: a dictionary with a topic label as a key and a dictionary of {docno: relevance} as a value
+    """
+    qrels = {}
+    with open(file_path, 'r') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 4:
+                qrels.setdefault(fields[0], {})[fields[2]] = int(fields[3])
+    return qrels
+
+
+def read_run(file_path):
+    """
+    Returns the ranked docnos of each query of a TREC run file.
+
+    :param file_path: a path to a run file of "<label> Q0 <docno> <rank> <score> <tag>" lines
+    :return: a dictionary with a topic label as a key and a list of docnos in order of rank as a value
+    """
+    ranked = {}
+    with open(file_path, 'r') as f:
+        for line in f:
+            label, _, docno, rank, _, _ = line.split()
+            ranked.setdefault(label, []).append((int(rank), docno))
+    return {label: [docno for _, docno in sorted(documents)] for label, documents in ranked.items()}
+
+
+def average_precision(ranking, judgements):
+    """
+    Returns the average of the precision at the rank of every relevant document.
+
+    Relevant documents that were not retrieved add a precision of 0.
+
+    :param ranking: a list of docnos in order of rank
+    :param judgements: a dictionary of {docno: relevance} of a topic
+    :return: the average precision
+    """
+    relevant = sum(1 for relevance in judgements.values() if relevance > 0)
+    if not relevant:
+        return 0.0
+    found = 0
+    total = 0.0
+    for rank, docno in enumerate(ranking, 1):
+        if judgements.get(docno, 0) > 0:
+            found += 1
+            total += found / rank
+    return total / relevant
+
+
+def precision(ranking, judgements, k=10):
+    """
+    Returns the fraction of the top k ranks holding a relevant document.
+
+    :param ranking: a list of docnos in order of rank
+    :param judgements: a dictionary of {docno: relevance} of a topic
+    :param k: the number of ranks
+    :return: the precision at k
+    """
+    return sum(1 for docno in ranking[:k] if judgements.get(docno, 0) > 0) / k
+
+
+def ndcg(ranking, judgements):
+    """
+    Returns the normalised discounted cumulative gain of a ranking.
+
+    The gain of a document is its relevance, discounted by log2(rank + 1), and the sum
+    over the ranking is divided by that of the ideal ranking of the judged documents
+    cut at the same depth.
+
+    :param ranking: a list of docnos in order of rank
+    :param judgements: a dictionary of {docno: relevance} of a topic
+    :return: the NDCG of the ranking
+    """
+    gains = sorted((relevance for relevance in judgements.values() if relevance > 0), reverse=True)[:len(ranking)]
+    ideal = sum(gain / log2(rank + 1) for rank, gain in enumerate(gains, 1))
+    if not ideal:
+        return 0.0
+    return sum(max(judgements.get(docno, 0), 0) / log2(rank + 1) for rank, docno in enumerate(ranking, 1)) / ideal
+
+
+def evaluate(rankings, qrels):
+    """
+    Returns the mean of each of <MEASURES> over the topics with a relevant document.
+
+    Topics with a relevant document that were not ranked count as an empty ranking.
+
+    :param rankings: a dictionary with a topic label as a key and a list of docnos in order of rank as a value
+    :param qrels: a dictionary returned by <read_qrels>
+    :return: a dictionary of {measure: mean} and the number of "topics" evaluated
+    """
+    labels = [label for label, judgements in qrels.items() if any(relevance > 0 for relevance in judgements.values())]
+    scores = {measure: 0.0 for measure in MEASURES}
+    for label in labels:
+        ranking = rankings.get(label, [])
+        judgements = qrels[label]
+        scores['MAP'] += average_precision(ranking, judgements)
+        scores['P@10'] += precision(ranking, judgements, 10)
+        scores['NDCG'] += ndcg(ranking, judgements)
+    result = {measure: total / len(labels) if labels else 0.0 for measure, total in scores.items()}
+    result['topics'] = len(labels)
+    return result
+
+
+def main():
+    """
+    <evaluation.py> scores a TREC run file against a qrels file, printing each of <MEASURES>:
+
+    > [measure] [mean]
+    """
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument('qrels', metavar='<qrels>')
+    parser.add_argument('run', metavar='<run>')
+    args = parser.parse_args()
+
+    result = evaluate(read_run(args.run), read_qrels(args.qrels))
+    for measure in MEASURES:
+        print("%s %.4f" % (measure, result[measure]))
+    print("topics %d" % result['topics'])
+
+
+if __name__ == "__main__":
+    main()
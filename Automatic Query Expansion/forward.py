@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+from compression import decode_postings, encode_postings
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+import numpy
+
+HEADER = Struct('<4s4xQQ')  # magic, number of documents, byte-offset of the offset table
+MAGIC = b'FWD1'
+
+
+class ForwardIndexWriter:
+
+    def __init__(self, file_path):
+        """
+        Writes a <forward> index of the term vector of every document.
+
+        The vector of a document is its sorted term ids, the rank of each term in the <lexicon>,
+        and the frequency of each term in the document. It is stored like a compressed inverted
+        list, as interleaved "<term id gap> <token_frequency>" variable-byte sequences. An offset
+        table of the byte-offset of every vector follows the vectors, where document <id> is at
+        index <id - 1>.
+
+        :param file_path: a path to the <forward> file
+        """
+        self.file = open(file_path, 'wb')
+        self.offsets = [HEADER.size]
+        self.file.write(HEADER.pack(MAGIC, 0, 0))
+
+    def add(self, id, vector):
+        """
+        Appends the term vector of a document, documents must be added in order of id.
+
+        :param id: the identifier of the document, one greater than the previous document
+        :param vector: a list of (term_id, token_frequency) tuples sorted by term id
+        """
+        if id != len(self.offsets):
+            raise ValueError("Document ids in the forward index must be consecutive, expected %d but found %d."
+                             % (len(self.offsets), id))
+        self.file.write(encode_postings(vector))
+        self.offsets.append(self.file.tell())
+
+    def close(self):
+        """
+        Appends the offset table and completes the header of the <forward> index.
+        """
+        self.file.write(b'\0' * (-self.file.tell() % 8))  # aligns the offset table
+        table_offset = self.file.tell()
+        self.file.write(numpy.array(self.offsets, '<u8').tobytes())
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, len(self.offsets) - 1, table_offset))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ForwardIndex:
+
+    def __init__(self, file_path):
+        """
+        Reads the term vectors of documents from a memory-mapped <forward> index.
+
+        :param file_path: a path to a <forward> file
+        """
+        self.file = open(file_path, 'rb')
+        self.buffer = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+        magic, self.count, table_offset = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError("'%s' is not a forward index file." % file_path)
+        self.offsets = numpy.frombuffer(self.buffer, '<u8', self.count + 1, table_offset)
+
+    def vector(self, id):
+        """
+        Returns the term vector of a document.
+
+        :param id: the identifier of a document
+        :return: a tuple of numpy arrays of sorted term ids and token frequencies
+        """
+        start, end = self.offsets[id - 1:id + 1].tolist()
+        return decode_postings(memoryview(self.buffer)[start:end])
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        """
+        Releases the mapping and closes the <forward> file.
+        """
+        self.offsets = None
+        try:
+            self.buffer.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
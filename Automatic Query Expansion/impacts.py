@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+from mmap import mmap, ACCESS_READ
+from pruning import top_ranked
+from ranking import BM25
+from struct import Struct
+import numpy
+
+HEADER = Struct('<4sIQdQ')  # magic, bits, term count, quantum, byte-offset of the offset table
+MAGIC = b'IMP1'
+SEGMENT = numpy.dtype([('impact', '<u4'), ('count', '<u4')])
+MINIMUM_CHUNK = 4096  # the fewest postings processed between checks of the top-k
+
+
+def write_impacts(file_path, lexicon, invlists, map, bits=8, ranker=None):
+    """
+    Writes an impact-ordered <impacts> file of quantized BM25 scores.
+
+    The BM25 score of every posting is precomputed from the <lexicon>, <invlists> and <map>
+    of an index. Scores are quantized to integer impacts from 1 to 2^bits - 1 by a single
+    <quantum>, the highest score in the index divided by 2^bits - 1, so that impacts can be
+    summed across terms. Postings with a score of 0 or less, i.e. of terms found in more
+    than half of the documents, are dropped.
+
+    The postings of each term are grouped into segments of equal impact, stored in
+    descending order of impact. A term is a 32-bit segment count, the (impact, count)
+    header of each segment and the 32-bit ids of each segment in ascending order.
+    The terms are stored in the order of the <lexicon>, and an offset table of the
+    byte-offset of each term by its rank is appended after them.
+
+    :param file_path: a path to the <impacts> file
+    :param lexicon: a Lexicon
+    :param invlists: an InvertedFile of a <invlists> file
+    :param map: a DocumentMap
+    :param bits: the number of bits of an impact
+    :param ranker: a BM25 instance, the default constants by default
+    """
+    ranker = ranker or BM25()
+    N = len(map)
+    levels = 2 ** bits - 1
+    weights = map.weights.astype(numpy.float64)
+    highest = max([ranker.idf_term_weight(N, entry.df) * entry.max_score for _, entry in lexicon.items()] + [0.0])
+    quantum = highest / levels if highest > 0 else 1.0
+
+    with open(file_path, 'wb') as impacts_file:
+        impacts_file.write(HEADER.pack(MAGIC, bits, 0, quantum, 0))
+        offsets = []
+        for _, entry in lexicon.items():
+            offsets.append(impacts_file.tell())
+            ids, frequencies = invlists.postings(entry.offset)  # inverted list of term
+            scores = ranker.score(N, entry.df, frequencies, weights[ids - 1])
+            kept = scores > 0
+            impacts = numpy.minimum(numpy.ceil(scores[kept] / quantum), levels).astype(numpy.uint32)
+            ids = ids[kept]
+            order = numpy.lexsort((ids, -impacts.astype(numpy.int64)))  # descending impact, then ascending id
+            impacts, ids = impacts[order], ids[order]
+            # the first posting of each segment
+            starts = numpy.flatnonzero(numpy.diff(impacts, prepend=impacts[:1] + 1))
+            segments = numpy.empty(len(starts), SEGMENT)
+            segments['impact'] = impacts[starts]
+            segments['count'] = numpy.diff(numpy.append(starts, len(ids)))
+            impacts_file.write(numpy.uint32(len(segments)).tobytes() + segments.tobytes())
+            impacts_file.write(ids.astype('<u4').tobytes())
+        offsets.append(impacts_file.tell())
+
+        impacts_file.write(b'\0' * (-impacts_file.tell() % 8))  # aligns the offset table
+        table_offset = impacts_file.tell()
+        impacts_file.write(numpy.array(offsets, '<u8').tobytes())
+        impacts_file.seek(0)
+        impacts_file.write(HEADER.pack(MAGIC, bits, len(offsets) - 1, quantum, table_offset))
+
+
+class ImpactFile:
+
+    def __init__(self, file_path):
+        """
+        Reads the segments of terms from a memory-mapped <impacts> file written by <write_impacts>.
+
+        :param file_path: a path to an <impacts> file
+        """
+        self.file = open(file_path, 'rb')
+        self.buffer = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+        magic, self.bits, self.count, self.quantum, table_offset = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError("'%s' is not an impacts file." % file_path)
+        self.offsets = numpy.frombuffer(self.buffer, '<u8', self.count + 1, table_offset)
+
+    def segments(self, term_id):
+        """
+        Returns the segments of a term in descending order of impact.
+
+        :param term_id: the rank of the term in the <lexicon>
+        :return: a list of (impact, ids) tuples, where ids is a zero-copy array in ascending order
+        """
+        position = int(self.offsets[term_id])
+        count = int(numpy.frombuffer(self.buffer, '<u4', 1, position)[0])
+        headers = numpy.frombuffer(self.buffer, SEGMENT, count, position + 4)
+        position += 4 + SEGMENT.itemsize * count
+        segments = []
+        for impact, length in headers.tolist():
+            segments.append((impact, numpy.frombuffer(self.buffer, '<u4', length, position)))
+            position += 4 * length
+        return segments
+
+    def close(self):
+        """
+        Releases the mapping and closes the <impacts> file.
+        """
+        self.offsets = None
+        try:
+            self.buffer.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def score_at_a_time(query, k, lexicon, impacts, N, budget=None):
+    """
+    Returns the top-k documents for a query by processing impact segments in descending order.
+
+    The segments of every query term are merged and processed from the highest impact down,
+    adding the impact of a segment to the integer accumulators of its documents. While the
+    segments are processed, the sum of the next impact of every term bounds what any document
+    can still gain. Processing stops once that bound cannot lift the (k+1)-th score above the
+    k-th, as the top-k documents are then known; their scores are completed by searching the
+    remaining segments for them alone.
+
+    Segments are processed in chunks that double the postings processed, with the impacts of a
+    chunk summed by a single <bincount>. The top-k is checked after each chunk, and only once the
+    bound is below the highest score, so checks cost little compared to the processing itself.
+
+    With a <budget>, processing also stops after that many postings and the documents are
+    ranked by their partial scores, bounding the latency of long queries.
+
+    Scores are the summed impacts multiplied by the <quantum> of the <impacts> file, which
+    approximate BM25 scores with the contributions of terms with a negative IDF dropped.
+
+    :param query: a list of terms
+    :param k: the number of top-ranked documents that should be returned
+    :param lexicon: a Lexicon
+    :param impacts: an ImpactFile
+    :param N: the number of documents in the collection
+    :param budget: an optional maximum number of postings to process
+    :return: a list of (score, id) tuples with ascending scores
+    """
+    segments = []  # (impact, query term, ids)
+    term_impacts = []  # the impacts of the segments of each query term, followed by 0
+    for index, term in enumerate(query):
+        found = lexicon.find(term)
+        term_segments = impacts.segments(found[0]) if found else []
+        segments.extend((impact, index, ids) for impact, ids in term_segments)
+        term_impacts.append([impact for impact, _ in term_segments] + [0])
+    segments.sort(key=lambda segment: -segment[0])  # stable, so the segments of a term keep their order
+    if k <= 0 or not segments:
+        return []
+
+    accumulators = numpy.zeros(N + 1, numpy.int64)  # indexed by id, so that ids need no offset
+    processed_segments = [0] * len(query)
+    processed = 0
+    highest = 0  # the highest score, which the k-th score cannot exceed
+    position = 0
+    complete = None  # the index of the first unprocessed segment once the top-k is known
+    while position < len(segments):
+        end, length = position, 0  # each chunk of segments at least doubles the postings processed
+        while end < len(segments) and length < max(processed, MINIMUM_CHUNK):
+            if budget is not None and processed + length >= budget:
+                break
+            length += len(segments[end][2])
+            end += 1
+        if end == position:
+            break
+        chunk = segments[position:end]
+        if len(chunk) == 1:
+            ids = chunk[0][2]
+            accumulators[ids] += chunk[0][0]
+        else:
+            ids = numpy.concatenate([segment_ids for _, _, segment_ids in chunk])
+            weights = numpy.repeat([impact for impact, _, _ in chunk],
+                                   [len(segment_ids) for _, _, segment_ids in chunk])
+            accumulators += numpy.bincount(ids, weights, N + 1).astype(numpy.int64)
+        for _, index, _ in chunk:
+            processed_segments[index] += 1
+        processed += length
+        position = end
+        if len(ids):
+            highest = max(highest, int(accumulators[ids].max()))
+
+        remaining = sum(levels[count] for levels, count in zip(term_impacts, processed_segments))
+        if remaining < highest and k < N:  # bounds the score still to be added to any document
+            kth, following = numpy.partition(accumulators, [N - k, N + 1 - k])[[N + 1 - k, N - k]]
+            if kth > 0 and following + remaining < kth:
+                complete = position
+                break
+
+    candidates = numpy.flatnonzero(accumulators)
+    scores = accumulators[candidates]
+    if complete is not None:  # completes the scores of the top-k from the remaining segments
+        ranked = top_ranked(candidates, scores, k)
+        candidates = numpy.array(sorted(id for _, id in ranked), numpy.int64)
+        scores = accumulators[candidates]
+        keys = candidates.astype(numpy.uint32)  # matches the segments, so that searches do not copy them
+        for impact, _, ids in segments[complete:]:
+            positions = numpy.minimum(numpy.searchsorted(ids, keys), len(ids) - 1)
+            scores[ids[positions] == keys] += impact
+    return [(score * impacts.quantum, id) for score, id in top_ranked(candidates, scores, k)]
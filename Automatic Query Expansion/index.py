@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 
 from argparse import ArgumentParser
-from collection import Collection
+from collection import Collection, SPIMICollection
+from shards import build_shards
 
 
 def main():
@@ -9,17 +10,43 @@ def main():
     <index.py> requires a path to a <collection> as an argument.
 
     The optional "-s" argument requires a path to a <stoplist> as an extra argument
+    The optional "-b" argument is a memory budget in megabytes, enabling single-pass (SPIMI) indexing,
+    which also bounds the memory used to write the <positions> file
+    The optional "-w" argument is a number of worker processes used to parse the <collection>
+    The optional "-i" argument is a number of bits, writing an impact-ordered <impacts> file of quantized BM25 scores
+    The optional "-p" argument writes a <positions> file, enabling phrase and proximity queries
+    The optional "-S" argument is a number of shards, writing a sharded index of document-partitioned shards
+    to the current working directory instead, see <build_shards>, each parsed by a process of its own
     The required "sourcefile" argument is a path to a <collection>
     """
     parser = ArgumentParser(add_help=False)
     parser.add_argument('-s', metavar='<stopfile>', nargs=1)
+    parser.add_argument('-b', metavar='<budget>', type=int)
+    parser.add_argument('-w', '--workers', metavar='<workers>', type=int, default=1)
+    parser.add_argument('-i', metavar='<bits>', type=int)
+    parser.add_argument('-p', action='store_true')
+    parser.add_argument('-S', metavar='<shards>', type=int)
     parser.add_argument('sourcefile', metavar='<sourcefile>')
     args = parser.parse_args()
 
-    collection = Collection(args.s[0]) if args.s else Collection()
+    stoplist = args.s[0] if args.s else None
+    if args.S:
+        if args.i or args.p:
+            parser.error("impacts and positions are not written for a sharded index")
+        build_shards('.', args.sourcefile, args.S, stoplist, args.b * 1024 * 1024 if args.b else None)
+        return
+    if args.b:
+        collection = SPIMICollection(stoplist, args.b * 1024 * 1024, args.workers)
+    else:
+        collection = Collection(stoplist, args.workers)
     collection.parse_collection(args.sourcefile)
     collection.write_map_to_disk()
     collection.write_invlists_lexicon_to_disk()
+    collection.write_forward_index_to_disk()
+    if args.i:
+        collection.write_impacts_to_disk(args.i)
+    if args.p:
+        collection.write_positions_to_disk(args.b * 1024 * 1024 if args.b else None)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+from collections import OrderedDict
+from mmap import mmap, ACCESS_READ
+import numpy
+
+
+class InvertedFile:
+
+    def __init__(self, file_path):
+        """
+        Reads inverted lists from a memory-mapped <invlists> file.
+
+        The whole file is mapped once, so reading an inverted list is a slice of the
+        mapping rather than a <seek> followed by a <read> for every posting.
+
+        :param file_path: a path to an <invlists> file
+        """
+        self.file = open(file_path, 'rb')
+        try:
+            self.buffer = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+        except ValueError:  # an empty file cannot be mapped
+            self.buffer = b''
+
+    def postings(self, byte_offset):
+        """
+        Returns the inverted list found at a <byte_offset> as arrays of ids and frequencies.
+
+        Every 4 bytes (32 bit) from the <byte_offset> are treated as an integer and
+        the arrays are zero-copy strided views of the mapping.
+
+        :param byte_offset: the byte-offset of the inverted list from the <lexicon>
+        :return: a tuple of numpy arrays of document ids and within-document frequencies
+        """
+        document_frequency = int(numpy.frombuffer(self.buffer, numpy.uint32, 1, byte_offset)[0])
+        pairs = numpy.frombuffer(self.buffer, numpy.uint32, 2 * document_frequency, byte_offset + 4)
+        return pairs[0::2], pairs[1::2]
+
+    def close(self):
+        """
+        Releases the mapping and closes the <invlists> file.
+
+        If views returned by <postings> are still alive, the mapping is instead
+        released once the last of them is garbage collected.
+        """
+        if isinstance(self.buffer, mmap):
+            try:
+                self.buffer.close()
+            except BufferError:
+                pass
+        self.buffer = b''
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class PostingsCache:
+
+    def __init__(self, invlists, capacity=4096):
+        """
+        Keeps the most recently read inverted lists of an InvertedFile.
+
+        Queries evaluated one after another against the same index often share terms,
+        and a cached inverted list is returned without being read again. The least
+        recently used list is evicted once <capacity> lists are held.
+
+        :param invlists: an InvertedFile
+        :param capacity: the maximum number of inverted lists held
+        """
+        self.invlists = invlists
+        self.capacity = capacity
+        self.lists = OrderedDict()
+
+    def postings(self, byte_offset):
+        """
+        Returns the inverted list found at a <byte_offset>, see InvertedFile.postings.
+
+        :param byte_offset: the byte-offset of the inverted list from the <lexicon>
+        :return: a tuple of numpy arrays of document ids and within-document frequencies
+        """
+        if byte_offset in self.lists:
+            self.lists.move_to_end(byte_offset)
+            return self.lists[byte_offset]
+        inverted_list = self.invlists.postings(byte_offset)
+        self.lists[byte_offset] = inverted_list
+        if len(self.lists) > self.capacity:
+            self.lists.popitem(last=False)
+        return inverted_list
+
+    def close(self):
+        self.lists.clear()
+        self.invlists.close()
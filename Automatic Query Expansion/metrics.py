@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+from contextlib import contextmanager
+from cProfile import Profile
+from time import perf_counter
+
+
+class Timer:
+
+    def __init__(self, metrics, stage):
+        """
+        Adds the time spent within a "with" block to a stage of a Metrics.
+
+        :param metrics: a Metrics
+        :param stage: the name of the stage
+        """
+        self.metrics = metrics
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.metrics.add_time(self.stage, perf_counter() - self.start)
+
+
+class NullTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics:
+
+    enabled = True
+
+    def __init__(self):
+        """
+        Accumulates the time spent in each stage of a search and counters of the work done.
+
+        Stages are timed with <timer> and may be nested, e.g. the "postings" read during the
+        "first_pass", so the time of a stage includes the stages within it. Stages and counters
+        are reported in order of first use.
+        """
+        self.seconds = {}
+        self.calls = {}
+        self.counters = {}
+
+    def timer(self, stage):
+        """
+        Returns a context manager timing a stage.
+
+        :param stage: the name of the stage
+        :return: a Timer
+        """
+        return Timer(self, stage)
+
+    def add_time(self, stage, seconds, calls=1):
+        """
+        Adds time to a stage.
+
+        :param stage: the name of the stage
+        :param seconds: the time spent in the stage
+        :param calls: the number of times the stage was entered
+        """
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + calls
+
+    def count(self, counter, value=1):
+        """
+        Adds to a counter.
+
+        :param counter: the name of the counter
+        :param value: the amount added
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def clear(self):
+        """
+        Discards every stage and counter.
+        """
+        self.seconds.clear()
+        self.calls.clear()
+        self.counters.clear()
+
+    def merge(self, report):
+        """
+        Adds the stages and counters of a report of another Metrics, e.g. from a worker process.
+
+        :param report: a dictionary returned by <report>
+        """
+        for stage, measured in report['stages'].items():
+            self.add_time(stage, measured['seconds'], measured['calls'])
+        for counter, value in report['counters'].items():
+            self.count(counter, value)
+
+    def report(self):
+        """
+        Returns the stages and counters as a dictionary that can be serialized as JSON.
+
+        :return: a dictionary of {"stages": {stage: {"seconds", "calls"}}, "counters": {counter: value}}
+        """
+        return {'stages': {stage: {'seconds': seconds, 'calls': self.calls[stage]}
+                           for stage, seconds in self.seconds.items()},
+                'counters': dict(self.counters)}
+
+
+class NullMetrics:
+
+    enabled = False
+
+    def timer(self, stage):
+        return NULL_TIMER
+
+    def add_time(self, stage, seconds, calls=1):
+        pass
+
+    def count(self, counter, value=1):
+        pass
+
+    def clear(self):
+        pass
+
+    def merge(self, report):
+        pass
+
+    def report(self):
+        return {'stages': {}, 'counters': {}}
+
+
+NULL_METRICS = NullMetrics()  # measures nothing, the default of every function taking a Metrics
+
+
+class MeteredInvertedFile:
+
+    def __init__(self, invlists, metrics):
+        """
+        Counts the inverted lists read from an InvertedFile and times the reads as the "postings" stage.
+
+        Wrapped by a PostingsCache, only the lists that are not cached are counted. The lists of
+        a memory-mapped InvertedFile are views of the mapping, so the time of reading their pages
+        falls in the stage that first touches them rather than in "postings".
+
+        :param invlists: an InvertedFile
+        :param metrics: a Metrics
+        """
+        self.invlists = invlists
+        self.metrics = metrics
+
+    def postings(self, byte_offset):
+        """
+        Returns the inverted list found at a <byte_offset>, see InvertedFile.postings.
+
+        Counts one seek, the postings of the list and the bytes of its 32-bit
+        document frequency and "<id> <token_frequency>" pairs.
+
+        :param byte_offset: the byte-offset of the inverted list from the <lexicon>
+        :return: a tuple of numpy arrays of document ids and within-document frequencies
+        """
+        with self.metrics.timer('postings'):
+            ids, frequencies = self.invlists.postings(byte_offset)
+        self.metrics.count('seeks')
+        self.metrics.count('postings_decoded', len(ids))
+        self.metrics.count('bytes_read', 4 + 8 * len(ids))
+        return ids, frequencies
+
+    def close(self):
+        self.invlists.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+@contextmanager
+def profiled(file_path=None):
+    """
+    Profiles the "with" block with cProfile, writing the statistics to a file for <pstats>.
+
+    :param file_path: a path to the statistics file, or None to not profile
+    """
+    if file_path is None:
+        yield None
+        return
+    profiler = Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(file_path)
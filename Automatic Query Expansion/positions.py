@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+
+from compression import decode_list, encode_list
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from tempfile import TemporaryFile
+import numpy
+
+HEADER = Struct('<4s4xQQ')  # magic, number of terms, byte-offset of the offset table
+MAGIC = b'POS1'
+SHIFT = 32  # an occurrence is keyed as <id> << SHIFT | <position>, so keys sort by id and then by position
+RUN_BUDGET = 64 * 1024 * 1024  # the default memory budget of <write_positions> in bytes
+OCCURRENCE_SIZE = 48  # approximate bytes held per occurrence while a run is sorted, temporaries included
+
+
+class PositionsWriter:
+
+    def __init__(self, file_path):
+        """
+        Writes a <positions> file of the positions of every term within the documents containing it.
+
+        The positions of a term follow the order of its inverted list in <invlists>, and the
+        number of positions of each posting is its token frequency, so only the positions are
+        stored. Within a posting, each position is the difference from the previous position,
+        the first being the position itself, encoded as a variable-byte sequence. An offset
+        table of the byte-offset of every term by its rank in the <lexicon> follows the terms.
+
+        :param file_path: a path to the <positions> file
+        """
+        self.file = open(file_path, 'wb')
+        self.offsets = [HEADER.size]
+        self.file.write(HEADER.pack(MAGIC, 0, 0))
+
+    def add(self, term_id, gaps):
+        """
+        Appends the positions of a term, terms must be added in order of rank.
+
+        :param term_id: the rank of the term in the <lexicon>, one greater than the previous term
+        :param gaps: a sequence of position gaps over the postings of the term, see <PositionsWriter>
+        """
+        if term_id != len(self.offsets) - 1:
+            raise ValueError("Terms in the positions file must be consecutive, expected %d but found %d."
+                             % (len(self.offsets) - 1, term_id))
+        self.file.write(encode_list(gaps))
+        self.offsets.append(self.file.tell())
+
+    def close(self):
+        """
+        Appends the offset table and completes the header of the <positions> file.
+        """
+        self.file.write(b'\0' * (-self.file.tell() % 8))  # aligns the offset table
+        table_offset = self.file.tell()
+        self.file.write(numpy.array(self.offsets, '<u8').tobytes())
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, len(self.offsets) - 1, table_offset))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def spill_run(documents, term_count):
+    """
+    Sorts the occurrences of consecutive ranges of documents by term id into a temporary run file.
+
+    Within a term, the occurrences keep the order of documents and of positions. A run file is the
+    index of the first occurrence of every term id and the end of the last (64-bit), followed by the
+    ids (32-bit) and then the positions (32-bit) of the occurrences.
+
+    :param documents: a list of (first, terms, lengths) tuples of consecutive ranges of documents, see <write_positions>
+    :param term_count: the number of terms in the <lexicon>
+    :return: a tuple of the run file and the number of occurrences of each term id in the run
+    """
+    terms = numpy.concatenate([terms for _, terms, _ in documents])
+    lengths = numpy.concatenate([lengths for _, _, lengths in documents])
+    first = documents[0][0]
+    order = numpy.argsort(terms, kind='stable')  # by term, keeping the order of documents and positions
+    ids = numpy.repeat(numpy.arange(first, first + len(lengths), dtype=numpy.uint32), lengths)[order]
+    positions = (numpy.arange(len(terms)) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths))[order]
+    counts = numpy.bincount(terms, minlength=term_count)
+    run = TemporaryFile()
+    run.write(numpy.concatenate(([0], numpy.cumsum(counts))).astype('<u8').tobytes())
+    run.write(ids.astype('<u4').tobytes())
+    run.write(positions.astype('<u4').tobytes())
+    return run, counts
+
+
+def read_run(run, term_count, start, end):
+    """
+    Reads the occurrences of a range of term ids from a run file of <spill_run>.
+
+    :param run: a run file
+    :param term_count: the number of terms in the <lexicon>
+    :param start: the first term id of the range
+    :param end: the term id following the range
+    :return: a tuple of the arrays of the term ids, ids and positions of the occurrences in the order of the run
+    """
+    run.seek(8 * start)
+    boundaries = numpy.frombuffer(run.read(8 * (end - start + 1)), '<u8').astype(numpy.int64)
+    run.seek(0, 2)
+    occurrences = (run.tell() - 8 * (term_count + 1)) // 8
+    arrays = []
+    for offset in (8 * (term_count + 1), 8 * (term_count + 1) + 4 * occurrences):
+        run.seek(offset + 4 * int(boundaries[0]))
+        arrays.append(numpy.frombuffer(run.read(4 * int(boundaries[-1] - boundaries[0])), '<u4'))
+    return numpy.repeat(numpy.arange(start, end), numpy.diff(boundaries)), arrays[0], arrays[1]
+
+
+def write_positions(file_path, term_count, documents, budget=RUN_BUDGET):
+    """
+    Writes a <positions> file from the term ids of every document using a bounded amount of memory.
+
+    The occurrences of the documents are accumulated in order of id until about <budget> bytes
+    are held, and are then sorted by term id and spilled to a temporary run file, see <spill_run>,
+    like the postings of a SPIMIIndexer. Once every document has been read, the runs are merged
+    one range of term ids at a time: the occurrences of the range are read from every run and
+    sorted by term id, keeping the order of the runs, so each term lists its occurrences in
+    order of document and position. Each range holds at most about <budget> bytes of occurrences,
+    unless a single term has more, whatever the size of the collection.
+
+    :param file_path: a path to the <positions> file
+    :param term_count: the number of terms in the <lexicon>
+    :param documents: an iterable of (first, terms, lengths) tuples of consecutive ranges of documents in order of id,
+    with the id of the first document of the range, an array of the term ids of every document of the range in order,
+    and an array of the number of terms of each document of the range
+    :param budget: the memory budget for occurrences measured in bytes
+    """
+    limit = max(1, budget // OCCURRENCE_SIZE)  # the number of occurrences held at once
+    runs = []
+    counts = numpy.zeros(term_count, numpy.int64)  # the number of occurrences of each term id over every run
+    try:
+        pending, size = [], 0
+        for document_range in documents:
+            pending.append(document_range)
+            size += len(document_range[1])
+            if size >= limit:
+                run, run_counts = spill_run(pending, term_count)
+                runs.append(run)
+                counts += run_counts
+                pending, size = [], 0
+        if size:
+            run, run_counts = spill_run(pending, term_count)
+            runs.append(run)
+            counts += run_counts
+
+        ends = numpy.cumsum(counts)  # the number of occurrences of the term ids up to each term id
+        with PositionsWriter(file_path) as positions_writer:
+            start = 0
+            while start < term_count:
+                held = int(ends[start - 1]) if start else 0
+                end = max(start + 1, int(numpy.searchsorted(ends, held + limit, 'right')))
+                ranges = [read_run(run, term_count, start, end) for run in runs]
+                terms = numpy.concatenate([terms for terms, _, _ in ranges] + [numpy.empty(0, numpy.int64)])
+                order = numpy.argsort(terms, kind='stable')  # by term, keeping the order of the runs
+                ids = numpy.concatenate([ids for _, ids, _ in ranges] + [numpy.empty(0, '<u4')])[order]
+                positions = numpy.concatenate([positions for _, _, positions in ranges] +
+                                              [numpy.empty(0, '<u4')])[order].astype(numpy.int64)
+                terms = terms[order]
+                ranges = None
+                gaps = positions.copy()
+                same = (terms[1:] == terms[:-1]) & (ids[1:] == ids[:-1])  # follows a position in the same posting
+                gaps[1:][same] -= positions[:-1][same]
+                boundaries = numpy.searchsorted(terms, numpy.arange(start, end + 1)).tolist()
+                for term_id in range(start, end):
+                    positions_writer.add(term_id, gaps[boundaries[term_id - start]:boundaries[term_id - start + 1]])
+                start = end
+    finally:
+        for run in runs:
+            run.close()
+
+
+class PositionsFile:
+
+    def __init__(self, file_path):
+        """
+        Reads the positions of terms from a memory-mapped <positions> file.
+
+        :param file_path: a path to a <positions> file
+        """
+        self.file = open(file_path, 'rb')
+        self.buffer = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+        magic, self.count, table_offset = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError("'%s' is not a positions file." % file_path)
+        self.offsets = numpy.frombuffer(self.buffer, '<u8', self.count + 1, table_offset)
+
+    def positions(self, term_id, frequencies):
+        """
+        Returns the positions of a term aligned with its inverted list.
+
+        The gaps of every posting are decoded at once, and the running sum of the gaps is
+        restarted at the first position of each posting.
+
+        :param term_id: the rank of the term in the <lexicon>
+        :param frequencies: the array of token frequencies of the inverted list of the term
+        :return: an array of positions, where the positions of each posting follow those of the previous posting
+        """
+        start, end = self.offsets[term_id:term_id + 2].tolist()
+        gaps = decode_list(memoryview(self.buffer)[start:end])
+        frequencies = frequencies.astype(numpy.int64)
+        firsts = numpy.cumsum(frequencies) - frequencies  # the index of the first position of each posting
+        totals = numpy.cumsum(gaps)
+        return totals - numpy.repeat(totals[firsts] - gaps[firsts], frequencies)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        """
+        Releases the mapping and closes the <positions> file.
+        """
+        self.offsets = None
+        try:
+            self.buffer.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def match_positions(query, window, lexicon, invlists, positions):
+    """
+    Returns the documents in which a list of terms occurs as a phrase, or within a window.
+
+    The inverted lists are intersected from the rarest term, and only the positions of the documents
+    containing every term are kept. Every occurrence is keyed by its id and position, so that each
+    list of keys is sorted. For a phrase, the i-th term is shifted back by i positions and the keys
+    of the terms are intersected. For a <window> of k, a document matches if every term occurs at one
+    of the occurrences, or within k positions after it, which is found by binary searching the keys
+    of each term; a term repeated in the query may match the same occurrence.
+
+    :param query: a list of terms
+    :param window: the largest distance between the terms, or None for a phrase
+    :param lexicon: a Lexicon
+    :param invlists: an InvertedFile of a <invlists> file
+    :param positions: a PositionsFile
+    :return: an array of the ids of the matching documents in ascending order
+    """
+    lists = []  # (term id, ids, frequencies) in order of query term
+    for term in query:
+        found = lexicon.find(term)
+        if not found:
+            return numpy.empty(0, numpy.int64)
+        ids, frequencies = invlists.postings(found[1].offset)  # inverted list of term
+        lists.append((found[0], ids, frequencies))
+    if not lists:
+        return numpy.empty(0, numpy.int64)
+
+    common = None  # the documents containing every term
+    for _, ids, _ in sorted(lists, key=lambda inverted_list: len(inverted_list[1])):
+        common = ids.astype(numpy.int64) if common is None else numpy.intersect1d(common, ids, assume_unique=True)
+    if len(lists) == 1 or not len(common):
+        return common
+
+    keys = []  # the sorted occurrences of each term in the common documents
+    for term_id, ids, frequencies in lists:
+        kept = numpy.repeat(numpy.isin(ids, common, assume_unique=True), frequencies)
+        occurrences = (numpy.repeat(ids.astype(numpy.int64) << SHIFT, frequencies)
+                       + positions.positions(term_id, frequencies))
+        keys.append(occurrences[kept])
+
+    if window is None:
+        matched = keys[0]
+        for offset, term_keys in enumerate(keys[1:], 1):
+            matched = numpy.intersect1d(matched, term_keys - offset, assume_unique=True)
+    else:
+        matched = numpy.sort(numpy.concatenate(keys))  # every occurrence starts a window
+        within = numpy.ones(len(matched), bool)
+        for term_keys in keys:
+            following = numpy.searchsorted(term_keys, matched)  # the next occurrence of the term
+            found = following < len(term_keys)
+            within &= found
+            within[found] &= term_keys[following[found]] - matched[found] <= window
+        matched = matched[within]
+    ids = matched >> SHIFT  # in ascending order, with an id for every match
+    return ids[numpy.diff(ids, prepend=-1) != 0]
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+from ranking import BM25
+import numpy
+
+EPSILON = 1e-9  # relative slack for upper bounds summed in a different order to the scores
+
+
+def exceeds(bound, threshold):
+    """
+    Returns whether a document with a score of at most <bound> could still enter the top-k.
+
+    The bound is widened by <EPSILON> so that rounding never prunes a document whose score
+    equals the threshold, as it may still enter the top-k with a smaller id.
+
+    :param bound: an upper bound of the score of a document
+    :param threshold: the score of the lowest ranked document in the top-k
+    :return: False if the document can be skipped
+    """
+    return bound + EPSILON * (abs(bound) + 1) >= threshold
+
+
+def top_ranked(ids, scores, k):
+    """
+    Returns the k documents with the highest scores in ascending order of score.
+
+    The documents are partitioned around the k-th highest score with <argpartition>,
+    and only the top k are sorted. Documents with equal scores are ranked by ascending id.
+
+    :param ids: an array of unique document ids in ascending order
+    :param scores: an array of scores aligned with <ids>
+    :param k: the number of top-ranked documents that should be returned
+    :return: a list of (score, id) tuples with ascending scores
+    """
+    if k <= 0:
+        return []
+    if len(ids) > k:
+        threshold = scores[numpy.argpartition(-scores, k - 1)[k - 1]]  # the k-th highest score
+        above = numpy.flatnonzero(scores > threshold)
+        tied = numpy.flatnonzero(scores == threshold)[:k - len(above)]  # the smallest ids come first
+        selected = numpy.concatenate((above, tied))
+        ids, scores = ids[selected], scores[selected]
+    order = numpy.lexsort((-ids, scores))  # ascending score, then descending id
+    return list(zip(scores[order].tolist(), ids[order].tolist()))
+
+
+def maxscore(query, k, lexicon, invlists, map, ranker=None):
+    """
+    Returns the top-k documents for a weighted query using MaxScore.
+
+    Each query term contributes <weight> * <tf_term_weight> to the score of a document, where
+    a weight of None is the BM25 <idf_term_weight> of the term. The <lexicon> stores the maximum
+    <tf_term_weight> of each term, so <weight> * <max_score> bounds what the term can add to a score.
+
+    The inverted lists are accumulated term-at-a-time in descending order of bound. Once the bounds
+    of the unvisited lists sum to less than the k-th highest accumulated score, a document found only
+    in the unvisited lists cannot enter the top-k, and their postings are never scanned. Terms with a
+    negative weight can lower a score, so the k-th score is first lowered by what they could remove.
+    The accumulated documents that may still enter the top-k are then scored exactly, by adding
+    the scores of the visited lists again in order of query term, and binary searching the
+    unvisited lists for them alone.
+
+    The exact scores are summed in order of the query terms, and ties are ranked by ascending id,
+    so the results are identical to an exhaustive evaluation of every posting.
+
+    :param query: a list of (term, weight) tuples
+    :param k: the number of top-ranked documents that should be returned
+    :param lexicon: a Lexicon
+    :param invlists: an InvertedFile of a <invlists> file
+    :param map: a DocumentMap
+    :param ranker: a BM25 instance, the default constants by default
+    :return: a list of (score, id) tuples with ascending scores
+    """
+    ranker = ranker or BM25()
+    N = len(map)
+    lists = []  # (weight, ids, frequencies) in order of query term
+    for term, weight in query:
+        entry = lexicon.get(term)
+        if entry:
+            if weight is None:
+                weight = ranker.idf_term_weight(N, entry.df)
+            ids, frequencies = invlists.postings(entry.offset)  # inverted list of term
+            lists.append((weight * entry.max_score, weight, ids, frequencies))
+    if not lists or k <= 0:
+        return []
+
+    weights = map.weights.astype(numpy.float64)
+    accumulators = numpy.zeros(N + 1)  # indexed by id, so that ids need no offset
+    found = numpy.zeros(N + 1, bool)
+    unvisited = sorted(range(len(lists)), key=lambda i: lists[i][0])  # ascending bound
+    visited = {}  # the scores of the postings of each visited list
+    highest = None  # the highest accumulated score, which the k-th score cannot exceed
+    while unvisited:
+        index = unvisited.pop()
+        _, weight, ids, frequencies = lists[index]
+        scores = visited[index] = weight * ranker.tf_term_weight(frequencies, weights[ids - 1])
+        accumulators[ids] += scores
+        found[ids] = True
+        if len(ids):
+            top = accumulators[ids].max()
+            highest = top if highest is None else max(highest, top)
+        upper = sum(max(lists[i][0], 0.0) for i in unvisited)  # bounds what a document can still gain
+        lower = sum(min(lists[i][0], 0.0) for i in unvisited)  # bounds what a document can still lose
+        if unvisited and highest is not None and not exceeds(upper, highest + lower):
+            candidates = numpy.flatnonzero(found)
+            if len(candidates) >= k:
+                threshold = numpy.partition(accumulators[candidates], len(candidates) - k)[len(candidates) - k] + lower
+                if not exceeds(upper, threshold):
+                    break  # a document found only in the unvisited lists cannot enter the top-k
+
+    candidates = numpy.flatnonzero(found)
+    if len(candidates) > k:  # discards the documents that cannot reach the k-th score
+        upper = sum(max(lists[i][0], 0.0) for i in unvisited)
+        lower = sum(min(lists[i][0], 0.0) for i in unvisited)
+        partial = accumulators[candidates]
+        threshold = numpy.partition(partial, len(candidates) - k)[len(candidates) - k] + lower
+        candidates = candidates[exceeds(partial + upper, threshold)]
+
+    accumulators[:] = 0
+    for index, (_, weight, ids, frequencies) in enumerate(lists):  # sums in order of query term
+        if index in visited:
+            accumulators[ids] += visited[index]
+        else:
+            keys = candidates.astype(ids.dtype)
+            positions = numpy.minimum(numpy.searchsorted(ids, keys), len(ids) - 1)
+            matched = ids[positions] == keys
+            accumulators[keys[matched]] += weight * ranker.tf_term_weight(frequencies[positions[matched]],
+                                                                          weights[candidates[matched] - 1])
+    return top_ranked(candidates, accumulators[candidates], k)
@@ -43,7 +43,7 @@ class BM25:
         :param m: optional multiplier used in query expansion
         :return:
         """
-        return log((N - f_t + 0.5) / (f_t + 0.5)) * (((self.k + 1) * d) / (w + d))
+        return self.idf_term_weight(N, f_t) * self.tf_term_weight(d, w)
 
     def score_aqe(self, s, d, w):
         """
@@ -59,7 +59,28 @@ class BM25:
         :param m: optional multiplier used in query expansion
         :return:
         """
-        return s * (((self.k + 1) * d) / (w + d))
+        return s * self.tf_term_weight(d, w)
 
-    def idf_term_weight(self):
-        return
+    def idf_term_weight(self, N, f_t):
+        """
+        Computes the inverse document frequency (IDF) weight of a term.
+
+        :param N: the number of documents in the collection
+        :param f_t: the number of documents containing the term
+        :return: the IDF weight, which is negative for terms in more than half of the documents
+        """
+        return log((N - f_t + 0.5) / (f_t + 0.5))
+
+    def tf_term_weight(self, d, w):
+        """
+        Computes the saturated within-document frequency component of the BM25 score.
+
+        The component is independent of the collection statistics of a term, so its
+        maximum over an inverted list bounds the score of the term in any document.
+        Both arguments may also be numpy arrays to compute a whole inverted list at once.
+
+        :param d: the within-document frequency
+        :param w: the document weight
+        :return: the within-document frequency component
+        """
+        return ((self.k + 1) * d) / (w + d)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from cache import ResultCache
+from collection import Collection
+from evaluation import MEASURES, evaluate, read_qrels
+from json import dump
+from multiprocessing import Pool
+from os import path
+from search import (EXPANSION_MODES, EXPANSION_TERMS, POOL_SIZE, evaluate_topic, open_batch_index, parse_operators,
+                    result_key)
+from time import perf_counter
+from tokenizer import tokenize
+from topics import read_topics
+import numpy
+
+PERCENTILES = (50, 95, 99)
+result_cache = None  # the ResultCache of the main process, or of each worker process, of a replay with "C=<capacity>"
+
+
+def parse_configuration(configuration):
+    """
+    Returns the search options of a configuration string.
+
+    A configuration is an algorithm optionally followed by ":" and comma-separated options named
+    after the arguments of <search.py>: "d" prunes with MaxScore, "e=<expansion>", "E=<terms>",
+    "P=<pool>" and "b=<budget>" set the AQE expansion mode, the number of expansion terms, the
+    rerank pool and the impact budget, and "C=<capacity>" caches the results of that many queries
+    in each worker, see <open_replay_index>, e.g. "BM25", "BM25:d,C=1024" or "AQE:e=rerank,E=10".
+
+    :param configuration: a configuration string
+    :return: a dictionary of the options
+    """
+    algorithm, _, options = configuration.partition(':')
+    if algorithm not in ('BM25', 'AQE'):
+        raise ValueError("Unrecognized algorithm '%s' in '%s'." % (algorithm, configuration))
+    parsed = {'algorithm': algorithm, 'pruned': False, 'budget': None, 'expansion': 'full', 'E': EXPANSION_TERMS,
+              'pool': POOL_SIZE, 'cache': 0}
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        if key == 'd' and not value:
+            parsed['pruned'] = True
+        elif key == 'e' and value in EXPANSION_MODES:
+            parsed['expansion'] = value
+        elif key in ('E', 'P', 'b', 'C') and value.isdigit():
+            parsed[{'E': 'E', 'P': 'pool', 'b': 'budget', 'C': 'cache'}[key]] = int(value)
+        else:
+            raise ValueError("Unrecognized option '%s' in '%s'." % (option, configuration))
+    return parsed
+
+
+def open_replay_index(index, capacity=0):
+    """
+    Opens the index of a replay, see <open_batch_index>, and a <result_cache> of <capacity> queries.
+
+    Called once in the main process, or once in each worker process of a pool, so every worker only
+    finds the results of the queries it evaluated itself, like a replica of a service.
+
+    :param index: a tuple of the arguments of <open_batch_index>
+    :param capacity: the number of queries whose results are cached, 0 for no cache
+    """
+    global result_cache
+    open_batch_index(*index)
+    result_cache = ResultCache(index[:-1], capacity) if capacity else None  # every file of the index
+
+
+def timed_topic(task):
+    """
+    Evaluates a single query of a replay against the <batch_index> of <search.py>, timing it.
+
+    With a <result_cache>, the results of a query are looked up by its <result_key> first, and the
+    results of a query evaluated are added to it.
+
+    :param task: a tuple of a task tuple of <evaluate_topic> and the <result_key> of the query
+    :return: a tuple of the label, a list of (docno, rank, score) tuples, the latency in seconds and whether the
+    results were cached
+    """
+    topic, key = task
+    start = perf_counter()
+    results = result_cache.get(key) if result_cache is not None else None
+    if results is None:
+        label, documents, _ = evaluate_topic(topic)
+        if result_cache is not None:
+            result_cache.put(key, [[docno, score] for docno, _, score in documents])
+    else:
+        label, documents = topic[0], [(docno, rank, score) for rank, (docno, score) in enumerate(results, 1)]
+    return label, documents, perf_counter() - start, results is not None
+
+
+def replay(topics, configuration, num_results, index, concurrency=1, rounds=1):
+    """
+    Replays a list of queries against an index with a number of concurrent workers.
+
+    Every worker process opens the index once, see <open_batch_index>, and evaluates one query at a time,
+    so <concurrency> queries are in flight until the log is exhausted. The latency of a query is the time
+    taken to evaluate it within its worker, and the throughput is the number of queries over the time taken
+    to replay them all, which excludes starting the workers. The log is replayed <rounds> times, so later
+    rounds find their inverted lists in the PostingsCache of each worker, as in a long-running service, and
+    with "C=<capacity>" their results in the ResultCache of each worker, see <open_replay_index>.
+
+    :param topics: a list of (label, query) tuples
+    :param configuration: a dictionary of search options, see <parse_configuration>
+    :param num_results: the number of top-ranked documents returned for each query
+    :param index: a tuple of the arguments of <open_batch_index>
+    :param concurrency: the number of worker processes
+    :param rounds: the number of times the list of queries is replayed
+    :return: a tuple of the rankings of the first round, as {label: [docno, ...]}, the latencies in seconds, the
+    elapsed time and the number of queries whose results were cached
+    """
+    algorithm, budget, expansion, E, pool = (configuration['algorithm'], configuration['budget'],
+                                             configuration['expansion'], configuration['E'], configuration['pool'])
+    keys = [None] * len(topics)
+    if configuration['cache']:
+        stopwords = Collection(index[4]).stoplist
+        keys = [result_key(tokenize(query, stopwords), parse_operators(query, stopwords), algorithm, num_results,
+                           budget if index[5] else None, expansion, E, pool) for _, query in topics]
+    tasks = [((label, query, algorithm, num_results, configuration['pruned'], budget, expansion, E, pool), key)
+             for (label, query), key in zip(topics, keys)] * rounds
+    if concurrency > 1:
+        processes = Pool(concurrency, open_replay_index, (index, configuration['cache']))
+        try:
+            start = perf_counter()
+            results = list(processes.imap_unordered(timed_topic, tasks))
+            elapsed = perf_counter() - start
+        finally:
+            processes.close()
+            processes.join()
+    else:
+        open_replay_index(index, configuration['cache'])
+        start = perf_counter()
+        results = [timed_topic(task) for task in tasks]
+        elapsed = perf_counter() - start
+
+    rankings = {}
+    for label, documents, _, _ in results:
+        if label not in rankings:
+            rankings[label] = [docno for docno, _, _ in documents]
+    return rankings, [latency for _, _, latency, _ in results], elapsed, sum(cached for _, _, _, cached in results)
+
+
+def summarize(latencies, elapsed):
+    """
+    Returns the throughput and latency percentiles of a replay.
+
+    :param latencies: a list of latencies in seconds
+    :param elapsed: the time taken by the replay in seconds
+    :return: a dictionary of the number of "queries", "seconds", "throughput" in queries per second and "latency_ms"
+    """
+    milliseconds = numpy.array(latencies) * 1000
+    latency = {'mean': float(milliseconds.mean()), 'max': float(milliseconds.max())}
+    for percentile, value in zip(PERCENTILES, numpy.percentile(milliseconds, PERCENTILES).tolist()):
+        latency['p%d' % percentile] = value
+    return {'queries': len(latencies), 'seconds': elapsed, 'throughput': len(latencies) / elapsed,
+            'latency_ms': latency}
+
+
+def main():
+    """
+    <replay.py> replays a query log or TREC topics file against an index and reports speed and effectiveness.
+
+    Every configuration, see <parse_configuration>, is replayed in turn and printed as a row of its
+    throughput, latency percentiles and, with a qrels file, its MAP, P@10 and NDCG:
+
+    > [configuration] [queries] q [throughput] q/s mean [ms] p50 [ms] p95 [ms] p99 [ms] MAP [map] P@10 [p10] NDCG [ndcg]
+
+    The latencies of a configuration with "C=<capacity>" are followed by "cached [queries]", the number of
+    queries answered from the ResultCache of a worker.
+
+    The required "-t" argument is a path to a TREC topics file or query log
+    The required "-l", "-i" and "-m" arguments are the paths to the <lexicon>, <invlists> and <map>
+    The optional "-c", "-D", "-F", "-p", "-x" and "-s" arguments match those of <search.py>
+    The optional "-Q" argument is a path to a TREC qrels file
+    The optional "-w" argument is the number of concurrent worker processes, 1 by default
+    The optional "-r" argument is the number of times the queries are replayed, 1 by default
+    The optional "-o" argument writes the report to a JSON file
+    """
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument('-t', metavar='<topics>', required=True)
+    parser.add_argument('-n', metavar='<num-results>', type=int, default=1000)
+    parser.add_argument('-l', metavar='<lexicon>', required=True)
+    parser.add_argument('-i', metavar='<invlists>', required=True)
+    parser.add_argument('-m', metavar='<map>', required=True)
+    parser.add_argument('-c', metavar='<collection>')
+    parser.add_argument('-D', metavar='<docstore>')
+    parser.add_argument('-F', metavar='<forward>')
+    parser.add_argument('-p', metavar='<impacts>')
+    parser.add_argument('-x', metavar='<positions>')
+    parser.add_argument('-s', metavar='<stoplist>')
+    parser.add_argument('-Q', metavar='<qrels>')
+    parser.add_argument('-w', metavar='<concurrency>', type=int, default=1)
+    parser.add_argument('-r', metavar='<rounds>', type=int, default=1)
+    parser.add_argument('-o', metavar='<report>')
+    parser.add_argument('configurations', metavar='<configuration>', nargs='+')
+    args = parser.parse_args()
+    try:
+        configurations = [parse_configuration(configuration) for configuration in args.configurations]
+    except ValueError as e:
+        parser.error(str(e))
+    aqe = any(configuration['algorithm'] == 'AQE' for configuration in configurations)
+    if aqe and not (args.c or args.D or args.F):
+        parser.error("AQE requires a collection, a docstore or a forward index")
+    if args.w < 1 or args.r < 1:
+        parser.error("the concurrency and the number of rounds must be at least 1")
+
+    lexicon, invlists, map, collection, impacts, docstore, forward, positions = [
+        path.abspath(file_path) if file_path else None
+        for file_path in (args.l, args.i, args.m, args.c, args.p, args.D, args.F, args.x)]
+    index = (lexicon, invlists, map, collection, args.s, impacts, docstore, forward, positions, False)
+    topics = read_topics(args.t)
+    qrels = read_qrels(args.Q) if args.Q else None
+
+    report = []
+    for name, configuration in zip(args.configurations, configurations):
+        rankings, latencies, elapsed, cached = replay(topics, configuration, args.n, index, args.w, args.r)
+        row = dict(summarize(latencies, elapsed), configuration=name)
+        line = "%-24s %5d q %8.1f q/s mean %7.2f ms p50 %7.2f ms p95 %7.2f ms p99 %7.2f ms" % (
+            name, row['queries'], row['throughput'], row['latency_ms']['mean'], row['latency_ms']['p50'],
+            row['latency_ms']['p95'], row['latency_ms']['p99'])
+        if configuration['cache']:
+            row['cached'] = cached
+            line += " cached %d" % cached
+        if qrels is not None:
+            row['effectiveness'] = evaluate(rankings, qrels)
+            line += ''.join(" %s %.4f" % (measure, row['effectiveness'][measure]) for measure in MEASURES)
+        print(line)
+        report.append(row)
+
+    if args.o:
+        with open(args.o, 'w') as f:
+            dump({'topics': len(topics), 'num_results': args.n, 'concurrency': args.w, 'rounds': args.r,
+                  'configurations': report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,54 +2,69 @@
 
 from __future__ import division
 from argparse import ArgumentParser
+from cache import CAPACITY, ResultCache
+from docstore import DocumentStore
+from document_map import DocumentMap
+from forward import ForwardIndex
 from heapq import heapify, heappush, heappop
-from struct import unpack
+from impacts import ImpactFile, score_at_a_time
+from inverted_file import InvertedFile, PostingsCache
+from lexicon import Lexicon
+from metrics import Metrics, MeteredInvertedFile, NULL_METRICS, profiled
+from positions import PositionsFile, match_positions
+from pruning import maxscore, top_ranked
+from segments import SegmentedIndex
+from shards import ShardedIndex
 from ranking import BM25
-from time import time
-from collection import Collection, tokenize
+from json import dump, dumps
+from time import perf_counter, time
+from collection import Collection
 from math import factorial, pow, log
-from itertools import repeat
+from multiprocessing import Pool
+from re import compile
+from sys import stderr, stdout
+from tokenizer import tokenize
+from topics import read_topics
+import numpy
+
+batch_index = None  # the index opened by a batch, or by each worker process of a batch
+EXPANSION_TERMS = 25  # the default number of expansion terms E
+POOL_SIZE = 1000  # the default number of first-pass candidates reranked by the "rerank" expansion mode
+EXPANSION_MODES = ('full', 'rerank', 'fold')
+operator_regex = compile('"([^"]*)"(?:~(\\d+))?')  # a quoted phrase, optionally followed by "~<window>"
 
 
 def load_map(file_path):
     """
-    Returns a map dictionary from a <map> file.
+    Returns a DocumentMap from a binary <map> file.
 
-    The map dictionary has an 'id' of a document as the key.
-    The value of each entry is a tuple of a 'docno' identifier
-    and pre-calculated 'document_weight' for BM25 scoring.
+    The DocumentMap is memory-mapped rather than loaded, and is indexed by
+    the integer 'id' of a document. It holds the 'docno' identifier and the
+    pre-calculated 'document_weight' for BM25 scoring of each document,
+    with the weights also available as an array in 'weights'.
 
     :param file_path: an absolute path to a <map> file
-    :return: a map dictionary
+    :return: a DocumentMap
     """
-    map = {}
-    with open(file_path, 'r') as map_file:
-        for line in map_file:
-            id, docno, weight = line.split()
-            map[id] = (docno, float(weight))
-    return map
+    return DocumentMap(file_path)
 
 
 def load_lexicon(file_path):
     """
-    Returns a lexicon dictionary from a <lexicon> file.
+    Returns a Lexicon from a binary <lexicon> file.
 
-    The lexicon dictionary has a 'term' as the key.
-    The value of each entry is a 'byte_offset' of the term
-    in the <invlists> file.
+    The Lexicon is memory-mapped rather than loaded, and is used like a dictionary
+    with a 'term' as the key. The value of each entry is a LexiconEntry of the
+    'byte_offset' of the term in the <invlists> file, the document frequency,
+    the collection frequency and the maximum BM25 'tf_term_weight' of the term.
 
     :param file_path: an absolute path to a <lexicon> file
-    :return: a lexicon dictionary
+    :return: a Lexicon
     """
-    lexicon = {}
-    with open(file_path, 'r') as lexicon_file:
-        for line in lexicon_file:
-            term, byte_offset = line.split()
-            lexicon[term] = byte_offset
-    return lexicon
+    return Lexicon(file_path)
 
 
-def print_relevant_documents(query_label, relevant_documents):
+def print_relevant_documents(query_label, relevant_documents, map):
     """
     Prints detail of the relevant documents starting with the highest ranked.
 
@@ -58,68 +73,143 @@ def print_relevant_documents(query_label, relevant_documents):
     is truncated to 3 decimal places.
 
     :param query_label: a user-defined string to unique identify a query
-    :param relevant_documents: a list of (score, docno) tuples with ascending scores
+    :param relevant_documents: a list of (score, id) tuples with ascending scores
+    :param map: a DocumentMap
     :return:
     """
-    for rank in range(1, len(relevant_documents) + 1):
-        score, docno = relevant_documents[-rank]
+    print_results(query_label, [(map.docno(id), score) for score, id in reversed(relevant_documents)])
+
+
+def print_results(query_label, results):
+    """
+    Prints the results of a query, e.g. from a ResultCache, in order of rank.
+
+    :param query_label: a user-defined string to unique identify a query
+    :param results: a list of (docno, score) tuples in order of rank
+    """
+    for rank, (docno, score) in enumerate(results, 1):
         print("%s %s %d %.3f" % (query_label, docno, rank, score))
 
 
 def accumulate_similarity_scores(query, lexicon, invlists, map):
     """
-    Returns a dictionary of accumulated scores.
+    Returns a dense array of accumulated scores.
+
+    Scores are accumulated one term at a time. The inverted list of a term is decoded
+    into arrays, its BM25 scores are computed in bulk against the document weights of
+    <map>, and they are added to the accumulators of its documents. The accumulator
+    of document <id> is at index <id - 1>, and is NaN until a query term is found in it.
 
-    The
-    
     :param query: a list of terms
-    :param lexicon: a lexicon dictionary
-    :param invlists: an absolute path to a <invlists> file
-    :param map: a map dictionary
-    :param appended: a list of appended (term, )
-    :return: 
+    :param lexicon: a Lexicon
+    :param invlists: an InvertedFile of a <invlists> file
+    :param map: a DocumentMap
+    :return: an array of document scores indexed by document 'id' - 1
     """
-    document_scores = {}
+    document_scores = numpy.full(len(map), numpy.nan)
     N = len(map)  # number of documents in the collection
     ranker = BM25()  # BM25 instance with default constants
-    with open(invlists, 'rb') as invlists_file:
-        for term in query:  # one term at a time
-            if term in lexicon:  # term needs to exist in lexicon
-                byte_offset = int(lexicon[term])  # address of term
-                invlists_file.seek(byte_offset)  # move to address of term
-                document_frequency = unpack('I', invlists_file.read(4))[0]  #
-                for _ in repeat(None, document_frequency):  # iterate inverted list of term
-                    docno, weight = map[str(unpack('I', invlists_file.read(4))[0])]  # get the docno
-                    within_document_frequency = unpack('I', invlists_file.read(4))[0]  # get the within doc freq
-                    if docno not in document_scores:  # create an accumulator for docno
-                        document_scores[docno] = 0
-                    document_scores[docno] += ranker.score(N, document_frequency, within_document_frequency, weight)
+    for term in query:  # one term at a time
+        entry = lexicon.get(term)
+        if entry:  # term needs to exist in lexicon
+            ids, frequencies = invlists.postings(entry.offset)  # inverted list of term
+            weights = map.weights[ids - 1].astype(numpy.float64)
+            add_scores(document_scores, ids, ranker.score(N, entry.df, frequencies, weights))
     return document_scores
 
 
+def add_scores(document_scores, ids, scores):
+    """
+    Adds the scores of an inverted list to the accumulators of its documents.
+
+    :param document_scores: an array of document scores indexed by document 'id' - 1
+    :param ids: an array of unique document ids
+    :param scores: an array of scores aligned with <ids>
+    """
+    accumulators = document_scores[ids - 1]
+    document_scores[ids - 1] = numpy.where(numpy.isnan(accumulators), 0, accumulators) + scores
+
+
 def retrieve_top_ranked_documents(document_scores, R):
     """
     Returns a list of relevant documents in ascending similarity scores.
 
-    Maintains a min-heap of (score, docno) tuples by adding the first 'num_results' documents.
-    Pops the root until the heap is empty to retrieve the top re
+    The documents with an accumulator are ranked by <top_ranked>, which partitions them
+    around the R-th highest score and only sorts the top R. Documents with equal scores
+    are ranked by ascending id, so the ranking is deterministic.
 
     The number of documents return is not guaranteed to be equal to 'num_results'
     because a collection may contain less than 'num_results' relevant documents.
 
-    :param document_scores: a dictionary of document scores
+    :param document_scores: an array of document scores indexed by document 'id' - 1
     :param R: the number of top-ranked documents that should be returned
-    :return: a list of top-ranked documents
+    :return: a list of (score, id) tuples with ascending scores
     """
-    heap = []
-    for docno, score in document_scores.iteritems():  # iterate accumulators
-        if len(heap) < R:
-            heappush(heap, (score, docno))
-        else:  # heap is full
-            if heap[0][0] < score:
-                heap[0] = (score, docno)
-                heapify(heap)
-    return [heappop(heap) for _ in repeat(None, len(heap))]
+    indices = numpy.flatnonzero(~numpy.isnan(document_scores))
+    return top_ranked(indices + 1, document_scores[indices], R)
+
+
+def parse_operators(query, stoplist=None):
+    """
+    Returns the phrase and proximity operators of a query string.
+
+    A phrase is quoted, as in '"white house"', and a proximity window follows the quotes,
+    as in '"white house"~5' for the terms within 5 positions of each other. The terms of
+    an operator are tokenized like the rest of the query, which they are also part of.
+
+    :param query: a query string
+    :param stoplist: an optional set of stopwords
+    :return: a list of (terms, window) tuples, where window is None for a phrase
+    """
+    operators = []
+    for phrase, window in operator_regex.findall(query):
+        terms = tokenize(phrase, stoplist)
+        if terms:
+            operators.append((terms, int(window) if window else None))
+    return operators
+
+
+def result_key(query, operators, algorithm, num_results, budget=None, expansion='full', E=EXPANSION_TERMS,
+               pool=POOL_SIZE):
+    """
+    Returns the key of the results of a query in a ResultCache.
+
+    The query is normalized by <tokenize>, so queries differing only in case, punctuation or
+    stopwords share their results, but the order of its terms is kept, as scores are summed in
+    that order. Pruning with MaxScore gives identical results, so it is not part of the key,
+    while the budget of an impact-ordered search and the options of AQE are.
+
+    :param query: a list of terms
+    :param operators: a list of (terms, window) tuples, see <parse_operators>
+    :param algorithm: either "BM25" or "AQE"
+    :param num_results: the number of top-ranked documents returned
+    :param budget: the maximum number of postings processed with an <impacts> file, or None
+    :param expansion: the expansion mode of "AQE", one of "full", "rerank" or "fold"
+    :param E: the number of expansion terms of "AQE"
+    :param pool: the number of first-pass documents reranked by the "rerank" mode
+    :return: a string
+    """
+    options = {} if budget is None else {'b': budget}
+    if algorithm == 'AQE':
+        options.update(e=expansion, E=E)
+        if expansion == 'rerank':
+            options['P'] = pool
+    operators = [[terms, window] for terms, window in operators]
+    return dumps([algorithm, num_results, query, operators, options], sort_keys=True)
+
+
+def restrict_scores(document_scores, ids):
+    """
+    Discards the accumulators of the documents that are not in <ids>.
+
+    :param document_scores: an array of document scores indexed by document 'id' - 1
+    :param ids: an array of the ids of the documents that may be ranked
+    :return: the array of document scores
+    """
+    kept = numpy.zeros(len(document_scores), bool)
+    kept[ids - 1] = True
+    document_scores[~kept] = numpy.nan
+    return document_scores
 
 
 def get_term_candidates(query, documents):
@@ -140,145 +230,721 @@ def get_term_candidates(query, documents):
     return set([t for t in candidates if t not in query])
 
 
-def accumulate_term_selection_values(lexicon, invlists, map, term_candidates, R, relevant_docnos):
+def accumulate_term_selection_values(lexicon, invlists, map, term_candidates, R, relevant_ids, E=EXPANSION_TERMS,
+                                     metrics=NULL_METRICS):
+    """
+    Returns the expansion terms among the candidates by reading the inverted list of each candidate.
+
+    :param lexicon: a Lexicon
+    :param invlists: an InvertedFile of a <invlists> file
+    :param map: a DocumentMap
+    :param term_candidates: a set of candidate terms
+    :param R: the number of relevant documents
+    :param relevant_ids: a set of the ids of the relevant documents
+    :param E: the number of expansion terms
+    :param metrics: a Metrics counting the "candidate_terms" evaluated
+    :return: a list of (-tsv, term, rsj) tuples, see <rank_expansion_terms>
+    """
+    statistics = []
+    for term in sorted(term_candidates):  # in order of term, so that ties are broken consistently
+        entry = lexicon.get(term)
+        if not entry:  # the term was stopped when the collection was indexed
+            continue
+        ids, _ = invlists.postings(entry.offset)  # inverted list of term
+        r_t = len(relevant_ids.intersection(ids.tolist()))  # frequency of term in relevant documents
+        statistics.append((term, entry.df, r_t))
+    metrics.count('candidate_terms', len(statistics))
+    return rank_expansion_terms(statistics, len(map), R, E)
+
+
+def forward_term_selection_values(lexicon, forward, map, query, R, relevant_ids, E=EXPANSION_TERMS,
+                                  metrics=NULL_METRICS):
+    """
+    Returns the expansion terms of the relevant documents by reading their term vectors.
+
+    The candidates are the terms of the relevant documents, excluding the query terms.
+    The number of relevant documents containing a term is counted from the R term vectors,
+    and its document frequency is read from the <lexicon>, so no inverted list is read.
+
+    :param lexicon: a Lexicon
+    :param forward: a ForwardIndex
+    :param map: a DocumentMap
+    :param query: a list of terms
+    :param R: the number of relevant documents
+    :param relevant_ids: a set of the ids of the relevant documents
+    :param E: the number of expansion terms
+    :param metrics: a Metrics counting the "candidate_terms" evaluated
+    :return: a list of (-tsv, term, rsj) tuples, see <rank_expansion_terms>
+    """
+    if not relevant_ids:
+        return []
+    vectors = [forward.vector(id)[0] for id in sorted(relevant_ids)]
+    term_ids, counts = numpy.unique(numpy.concatenate(vectors), return_counts=True)
+    statistics = []
+    for (_, term, entry), r_t in zip(lexicon.entries(term_ids.tolist()), counts.tolist()):  # in order of term
+        if term not in query:
+            statistics.append((term, entry.df, r_t))
+    metrics.count('candidate_terms', len(statistics))
+    return rank_expansion_terms(statistics, len(map), R, E)
+
+
+def rank_expansion_terms(statistics, N, R, E=EXPANSION_TERMS):
+    """
+    Returns the E candidate terms with the lowest term selection value (TSV).
+
+    The TSV of a term is the probability of it occurring in as many of the relevant documents
+    by chance, and each term is weighted by its Robertson/Sparck Jones (RSJ) weight.
 
+    :param statistics: a list of (term, f_t, r_t) tuples of candidate terms
+    :param N: the number of documents in the collection
+    :param R: the number of relevant documents
+    :param E: the number of expansion terms
+    :return: a list of (-tsv, term, rsj) tuples, starting with the highest TSV
+    """
+    if E <= 0:
+        return []
     R_f = factorial(R)
-    N = len(map)
-    E = 25
 
     heap = []
-    with open(invlists, 'rb') as invlists_file:
-        for term in term_candidates:
-            visited = []
-            byte_offset = int(lexicon[term])  # address of term
-            invlists_file.seek(byte_offset)  # move to address of term
-            f_t = unpack('I', invlists_file.read(4))[0]  # frequency of term in collection
-            r_t = 0  # frequency of term in relevant documents
-            for _ in range(f_t):  # iterate inverted list of term
-                docno = map[str(unpack('I', invlists_file.read(4))[0])][0]  # get the docno
-                invlists_file.read(4)
-                if docno in relevant_docnos and docno not in visited:
-                    visited.append(docno)
-                    r_t += 1
-
-            # tsv calculation
-            tsv = pow((f_t / N), r_t) * (R_f / (factorial(r_t) * factorial(R - r_t)))
-
-            rsj = 0.3 * log(((r_t + 0.5) * (N - f_t - R + r_t + 0.5)) / ((f_t - r_t + 0.5) * (R - r_t + 0.5)))
-
-
-            if len(heap) < E:
-                heappush(heap, (-tsv, term, rsj))
-            elif heap[0][0] < -tsv:
-                heap[0] = (-tsv, term, rsj)
-                heapify(heap)
+    for term, f_t, r_t in statistics:
+
+        # tsv calculation
+        tsv = pow((f_t / N), r_t) * (R_f / (factorial(r_t) * factorial(R - r_t)))
+
+        rsj = 0.3 * log(((r_t + 0.5) * (N - f_t - R + r_t + 0.5)) / ((f_t - r_t + 0.5) * (R - r_t + 0.5)))
+
+        if len(heap) < E:
+            heappush(heap, (-tsv, term, rsj))
+        elif heap[0][0] < -tsv:
+            heap[0] = (-tsv, term, rsj)
+            heapify(heap)
 
     return [(heappop(heap)) for _ in range(len(heap))]
 
 
 def additional_similarity_scores(document_scores, query, lexicon, invlists, map):
     """
-    Returns a dictionary of accumulated scores.
+    Adds the scores of the expansion terms to an array of accumulated scores.
+
+    :param document_scores: an array of document scores indexed by document 'id' - 1
+    :param query: a list of (term, weight) tuples
+    :param lexicon: a Lexicon
+    :param invlists: an InvertedFile of a <invlists> file
+    :param map: a DocumentMap
+    :return: the array of document scores
+    """
+    ranker = BM25()  # BM25 instance with default constants
+    for term, s in query:  # one term at a time
+        ids, frequencies = invlists.postings(lexicon[term].offset)  # inverted list of term
+        add_scores(document_scores, ids, ranker.score_aqe(s, frequencies, map.weights[ids - 1].astype(numpy.float64)))
+    return document_scores
+
+
+def rerank_candidates(candidates, query, num_results, lexicon, invlists, map):
+    """
+    Returns the top-ranked documents of a pool of candidates after adding the scores of the expansion terms.
+
+    Only the candidates are scored: the inverted list of each expansion term is binary searched
+    for their ids, so neither the scores of the whole collection are updated nor sorted again.
+
+    :param candidates: a list of (score, id) tuples of the first pass
+    :param query: a list of (term, weight) tuples
+    :param num_results: the number of top-ranked documents that should be returned
+    :param lexicon: a Lexicon
+    :param invlists: an InvertedFile of a <invlists> file
+    :param map: a DocumentMap
+    :return: a list of (score, id) tuples with ascending scores
+    """
+    ranker = BM25()  # BM25 instance with default constants
+    ids = numpy.array([id for _, id in candidates], numpy.int64)
+    scores = numpy.array([score for score, _ in candidates], numpy.float64)
+    order = numpy.argsort(ids)
+    ids, scores = ids[order], scores[order]
+    weights = map.weights[ids - 1].astype(numpy.float64)
+    for term, s in query:  # one term at a time
+        term_ids, frequencies = invlists.postings(lexicon[term].offset)  # inverted list of term
+        keys = ids.astype(term_ids.dtype)
+        positions = numpy.minimum(numpy.searchsorted(term_ids, keys), len(term_ids) - 1)
+        matched = term_ids[positions] == keys
+        scores[matched] += ranker.score_aqe(s, frequencies[positions[matched]], weights[matched])
+    return top_ranked(ids, scores, num_results)
+
+
+def run_query(query, algorithm, num_results, lexicon, invlists, map, collection, stoplist=None, pruned=False,
+              impacts=None, budget=None, forward=None, expansion='full', E=EXPANSION_TERMS, pool=POOL_SIZE,
+              operators=None, positions=None, metrics=NULL_METRICS):
+    """
+    Returns the top-ranked documents for a query using BM25 or automatic query expansion.
+
+    With "BM25" and <pruned>, the documents are ranked by <maxscore>, which gives identical
+    results while skipping the postings that cannot reach the top-ranked.
+    With <impacts>, "BM25" instead ranks the documents score-at-a-time by quantized scores.
+    With "AQE", the top-ranked documents of the BM25 ranking are fetched from a
+    DocumentStore, or parsed from the <collection>, as relevance feedback, and the
+    best E expansion terms are used to score the documents a second time. With a <forward>
+    index, the expansion terms are instead selected from the term vectors of the documents.
+
+    The <expansion> mode sets how the documents are scored a second time:
+    "full" adds the scores of the expansion terms to the scores of every document,
+    "rerank" adds them only to the top <pool> documents of the first pass, and
+    "fold" ranks the query and expansion terms as one weighted query with <maxscore>,
+    giving the same results as "full" while skipping the postings that cannot reach the top-ranked.
+
+    With phrase or proximity <operators>, only the documents matching every operator, found
+    with the <positions> file, are ranked. The scores of the remaining documents are
+    accumulated exhaustively, so <pruned> and <impacts> are not used, and "fold" is "full".
+    Queries without operators never read the <positions> file.
+
+    The stages "operators", "first_pass", "ranking", "feedback", "term_selection" and
+    "second_pass" are timed by <metrics>, which also counts the "accumulators" created by an
+    exhaustive first pass and the "feedback_documents" fetched or parsed.
+
+    :param query: a list of terms
+    :param algorithm: either "BM25" or "AQE"
+    :param num_results: the number of top-ranked documents that should be returned
+    :param lexicon: a Lexicon
+    :param invlists: an InvertedFile of a <invlists> file
+    :param map: a DocumentMap
+    :param collection: a DocumentStore, or an absolute path to the <collection>
+    :param stoplist: an optional path to a <stoplist> for the feedback documents
+    :param pruned: whether BM25 skips the postings that cannot reach the top-ranked
+    :param impacts: an optional ImpactFile of an <impacts> file
+    :param budget: an optional maximum number of postings processed with <impacts>
+    :param forward: an optional ForwardIndex used to select the expansion terms
+    :param expansion: the expansion mode of "AQE", one of "full", "rerank" or "fold"
+    :param E: the number of expansion terms of "AQE"
+    :param pool: the number of first-pass documents reranked by the "rerank" mode
+    :param operators: an optional list of (terms, window) tuples, see <parse_operators>
+    :param positions: a PositionsFile, required by <operators>
+    :param metrics: a Metrics, measuring nothing by default
+    :return: a list of (score, id) tuples with ascending scores
+    """
+    matched = None  # the documents matching every operator
+    if operators:
+        if positions is None:
+            raise ValueError("Phrase and proximity queries require a positions file.")
+        with metrics.timer('operators'):
+            for terms, window in operators:
+                ids = match_positions(terms, window, lexicon, invlists, positions)
+                matched = ids if matched is None else numpy.intersect1d(matched, ids, assume_unique=True)
+        pruned, impacts = False, None
+        if expansion == 'fold':
+            expansion = 'full'
+
+    if algorithm == "BM25" and impacts:
+        with metrics.timer('first_pass'):
+            return score_at_a_time(query, num_results, lexicon, impacts, len(map), budget)
+    if algorithm == "BM25" and pruned:
+        with metrics.timer('first_pass'):
+            return maxscore([(term, None) for term in query], num_results, lexicon, invlists, map)
+
+    # accumulate similarity scores
+
+    if algorithm == "AQE" and expansion == 'rerank':
+        depth = max(pool, num_results)  # the first pass ranks the pool, of which the top are the feedback
+    else:
+        depth = num_results
+    if pruned and algorithm == "AQE" and expansion != 'full':
+        with metrics.timer('first_pass'):
+            top_scores = maxscore([(term, None) for term in query], depth, lexicon, invlists, map)
+    else:
+        with metrics.timer('first_pass'):
+            document_scores = accumulate_similarity_scores(query, lexicon, invlists, map)
+            if matched is not None:
+                restrict_scores(document_scores, matched)
+        if metrics.enabled:
+            metrics.count('accumulators', int(numpy.count_nonzero(~numpy.isnan(document_scores))))
+        with metrics.timer('ranking'):
+            top_scores = retrieve_top_ranked_documents(document_scores, depth)
+    candidates = top_scores  # the pool of the "rerank" mode
+    top_scores = top_scores[max(len(top_scores) - num_results, 0):]
+
+    if algorithm == "AQE":
+
+        relevant_ids = set(top[1] for top in top_scores)
+        if forward:
+            with metrics.timer('term_selection'):
+                top_E_terms = forward_term_selection_values(lexicon, forward, map, query, len(top_scores), relevant_ids,
+                                                            E, metrics)
+        else:
+            with metrics.timer('feedback'):
+                c = Collection(stoplist)
+                for id in relevant_ids:
+                    if isinstance(collection, DocumentStore):
+                        c.load_document(collection, id, map.docno(id))
+                    else:
+                        c.parse_document(collection, map.docno(id))
+            metrics.count('feedback_documents', len(relevant_ids))
+
+            with metrics.timer('term_selection'):
+                term_candidates = get_term_candidates(query, c.documents)
+
+                top_E_terms = accumulate_term_selection_values(lexicon, invlists, map, term_candidates, len(top_scores),
+                                                               relevant_ids, E, metrics)
+
+        additional_terms = []
+        for top in top_E_terms:
+            additional_terms.append((top[1], top[2]))
+
+        with metrics.timer('second_pass'):
+            if expansion == 'rerank':
+                return rerank_candidates(candidates, additional_terms, num_results, lexicon, invlists, map)
+            if expansion == 'fold':
+                weighted = [(term, None) for term in query] + additional_terms
+                return maxscore(weighted, num_results, lexicon, invlists, map)
+
+            new = additional_similarity_scores(document_scores, additional_terms, lexicon, invlists, map)
+            if matched is not None:
+                restrict_scores(new, matched)
+
+            top_scores = retrieve_top_ranked_documents(new, num_results)
+
+    return top_scores
+
+
+def run_segmented_query(query, algorithm, num_results, index, E=EXPANSION_TERMS):
+    """
+    Returns the top-ranked documents for a query across the live segments of a segmented index,
+    or across the shards of a sharded index.
 
-    The
+    With "AQE", the top-ranked documents are fetched from the <docstore> of their segments as
+    relevance feedback. The frequency of each candidate term in the relevant documents is counted
+    from their terms, and its document frequency is summed over the segments. The query and the
+    best E expansion terms are then ranked as one weighted query, as by the "fold" mode.
 
     :param query: a list of terms
-    :param lexicon: a lexicon dictionary
+    :param algorithm: either "BM25" or "AQE"
+    :param num_results: the number of top-ranked documents that should be returned
+    :param index: a SegmentedIndex or a ShardedIndex
+    :param E: the number of expansion terms of "AQE"
+    :return: a list of (score, id) tuples with ascending scores, with the global ids of <index>
+    """
+    top_scores = index.search([(term, None) for term in query], num_results)
+
+    if algorithm == "AQE":
+
+        c = Collection(index.stoplist)
+        for _, id in top_scores:
+            c.load_document(index, id, index.docno(id))
+        relevant_terms = [set(document.terms) for document in c.documents]
+
+        statistics = []
+        # in order of term, so that ties are broken consistently
+        for term in sorted(get_term_candidates(query, c.documents)):
+            f_t = index.df(term)
+            if f_t:
+                statistics.append((term, f_t, sum(term in terms for terms in relevant_terms)))
+        top_E_terms = rank_expansion_terms(statistics, len(index), len(top_scores), E)
+
+        top_scores = index.search([(term, None) for term in query] + [(top[1], top[2]) for top in top_E_terms],
+                                  num_results)
+
+    return top_scores
+
+
+def run_segmented_batch(topics, algorithm, num_results, index, E=EXPANSION_TERMS):
+    """
+    Yields the results of a list of queries evaluated across the segments of a segmented index,
+    or across the shards of a sharded index.
+
+    :param topics: a list of (label, query) tuples
+    :param algorithm: either "BM25" or "AQE"
+    :param num_results: the number of top-ranked documents returned for each query
+    :param index: a SegmentedIndex or a ShardedIndex
+    :param E: the number of expansion terms of "AQE"
+    :return: a generator of (label, [(docno, rank, score), ...]) tuples
+    """
+    stopwords = Collection(index.stoplist).stoplist
+    for label, query in topics:
+        top_scores = run_segmented_query(tokenize(query, stopwords), algorithm, num_results, index, E)
+        yield label, [(index.docno(id), rank, score) for rank, (score, id) in enumerate(reversed(top_scores), 1)]
+
+
+def open_batch_index(lexicon, invlists, map, collection, stoplist=None, impacts=None, docstore=None, forward=None,
+                     positions=None, measured=False):
+    """
+    Opens the index shared by every query of a batch.
+
+    Called once in the main process, or once in each worker process of a pool.
+    The inverted lists are read through a PostingsCache so that terms repeated
+    across queries are only read once. When <measured>, the process keeps a Metrics
+    of its own, which also times the loading of the <map> and <lexicon>.
+
+    :param lexicon: an absolute path to a <lexicon> file
     :param invlists: an absolute path to a <invlists> file
-    :param map: a map dictionary
-    :param appended: a list of appended (term, )
-    :return:
+    :param map: an absolute path to a <map> file
+    :param collection: an absolute path to the <collection>
+    :param stoplist: an optional path to a <stoplist>
+    :param impacts: an optional absolute path to an <impacts> file
+    :param docstore: an optional absolute path to a <docstore> file, replacing the <collection>
+    :param forward: an optional absolute path to a <forward> index file
+    :param positions: an optional absolute path to a <positions> file
+    :param measured: whether the queries are measured by a Metrics
     """
-    ranker = BM25()  # BM25 instance with default constants
-    with open(invlists, 'rb') as invlists_file:
-        for q in query:  # one term at a time
-            term, s = q
-            byte_offset = int(lexicon[term])  # address of term
-            invlists_file.seek(byte_offset)  # move to address of term
-            document_frequency = unpack('I', invlists_file.read(4))[0]  #
-            for _ in repeat(None, document_frequency):  # iterate inverted list of term
-                docno, weight = map[str(unpack('I', invlists_file.read(4))[0])]  # get the docno
-                within_document_frequency = unpack('I', invlists_file.read(4))[0]  # get the within doc freq
-                if docno not in document_scores:  # create an accumulator for docno
-                    document_scores[docno] = 0
-                document_scores[docno] += ranker.score_aqe(s, within_document_frequency, weight)
+    global batch_index
+    metrics = Metrics() if measured else NULL_METRICS
+    with metrics.timer('load_lexicon'):
+        lexicon = load_lexicon(lexicon)
+    with metrics.timer('load_map'):
+        map = load_map(map)
+    invlists = InvertedFile(invlists)
+    if measured:
+        invlists = MeteredInvertedFile(invlists, metrics)
+    batch_index = (lexicon, PostingsCache(invlists), map, DocumentStore(docstore) if docstore else collection,
+                   stoplist, Collection(stoplist).stoplist, ImpactFile(impacts) if impacts else None,
+                   ForwardIndex(forward) if forward else None, PositionsFile(positions) if positions else None, metrics)
+
+
+def evaluate_topic(topic):
+    """
+    Evaluates a single query of a batch against the <batch_index>.
 
-    return document_scores
+    :param topic: a (label, query, algorithm, num_results, pruned, budget, expansion, E, pool) tuple
+    :return: a tuple of the label, a list of (docno, rank, score) tuples and the report of the Metrics of the query
+    """
+    label, query, algorithm, num_results, pruned, budget, expansion, E, pool = topic
+    lexicon, invlists, map, collection, stoplist, stopwords, impacts, forward, positions, metrics = batch_index
+    top_scores = run_query(tokenize(query, stopwords), algorithm, num_results, lexicon, invlists, map, collection,
+                           stoplist, pruned, impacts, budget, forward, expansion, E, pool,
+                           parse_operators(query, stopwords), positions, metrics)
+    report = metrics.report()
+    metrics.clear()
+    return label, [(map.docno(id), rank, score)
+                   for rank, (score, id) in enumerate(reversed(top_scores), 1)], report
+
+
+def run_batch(topics, algorithm, num_results, lexicon, invlists, map, collection, stoplist=None, workers=1,
+              pruned=False, impacts=None, budget=None, docstore=None, forward=None, expansion='full',
+              E=EXPANSION_TERMS, pool=POOL_SIZE, positions=None, metrics=NULL_METRICS, cache=None):
+    """
+    Yields the results of a list of queries evaluated against a single opened index.
+
+    With more than one worker, the queries are evaluated by a process pool in which
+    each worker opens the index once. The results are yielded in order of the queries.
+    The stages and counters of every query, measured in whichever process evaluated it,
+    are added to <metrics>.
+
+    With a ResultCache, the queries whose results are cached are not evaluated, and a query
+    repeated within the list is only looked up in the cache, and evaluated, once; its repeats
+    are served from the results of the first without counting as hits of the cache. The results
+    of every query evaluated are added to the cache as (docno, score) pairs in order of rank,
+    see <result_key>.
+
+    :param topics: a list of (label, query) tuples
+    :param algorithm: either "BM25" or "AQE"
+    :param num_results: the number of top-ranked documents returned for each query
+    :param lexicon: an absolute path to a <lexicon> file
+    :param invlists: an absolute path to a <invlists> file
+    :param map: an absolute path to a <map> file
+    :param collection: an absolute path to the <collection>
+    :param stoplist: an optional path to a <stoplist>
+    :param workers: the number of processes evaluating queries
+    :param pruned: whether BM25 skips the postings that cannot reach the top-ranked
+    :param impacts: an optional absolute path to an <impacts> file
+    :param budget: an optional maximum number of postings processed with <impacts>
+    :param docstore: an optional absolute path to a <docstore> file, replacing the <collection>
+    :param forward: an optional absolute path to a <forward> index file
+    :param expansion: the expansion mode of "AQE", one of "full", "rerank" or "fold"
+    :param E: the number of expansion terms of "AQE"
+    :param pool: the number of first-pass documents reranked by the "rerank" mode
+    :param positions: an optional absolute path to a <positions> file, required by phrase and proximity queries
+    :param metrics: a Metrics, measuring nothing by default
+    :param cache: an optional ResultCache
+    :return: a generator of (label, [(docno, rank, score), ...]) tuples
+    """
+    tasks = [(label, query, algorithm, num_results, pruned, budget, expansion, E, pool) for label, query in topics]
+    index = (lexicon, invlists, map, collection, stoplist, impacts, docstore, forward, positions, metrics.enabled)
+    keys = [None] * len(tasks)
+    if cache is not None:
+        stopwords = Collection(stoplist).stoplist
+        keys = [result_key(tokenize(query, stopwords), parse_operators(query, stopwords), algorithm, num_results,
+                           budget if impacts else None, expansion, E, pool) for _, query in topics]
+    evaluated = []  # the tasks evaluated
+    found = {}  # the results of each distinct query, by key, once found in the cache or evaluated
+    for task, key in zip(tasks, keys):
+        if key is None:
+            evaluated.append(task)
+        elif key not in found:
+            found[key] = cache.get(key)
+            if found[key] is None:
+                evaluated.append(task)
+
+    if workers > 1 and evaluated:
+        processes = Pool(workers, open_batch_index, index)
+        outputs = processes.imap(evaluate_topic, evaluated)
+    else:
+        processes = None
+        if evaluated:
+            open_batch_index(*index)
+        outputs = (evaluate_topic(task) for task in evaluated)
+    try:
+        for task, key in zip(tasks, keys):
+            if key is not None and found[key] is not None:  # cached, or evaluated for an earlier query of the list
+                results = found[key]
+            else:
+                label, documents, report = next(outputs)
+                metrics.merge(report)
+                if key is not None:
+                    found[key] = [[docno, score] for docno, _, score in documents]
+                    cache.put(key, found[key])
+                yield label, documents
+                continue
+            yield task[0], [(docno, rank, score) for rank, (docno, score) in enumerate(results, 1)]
+    finally:
+        if processes:
+            processes.close()
+            processes.join()
+
+
+def write_run(results, run_file, tag):
+    """
+    Writes results in the TREC run format "<label> Q0 <docno> <rank> <score> <tag>".
 
-def main():
+    :param results: an iterable of (label, [(docno, rank, score), ...]) tuples
+    :param run_file: a writable file
+    :param tag: the name of the run
     """
+    for label, documents in results:
+        for docno, rank, score in documents:
+            run_file.write("%s Q0 %s %d %.6f %s\n" % (label, docno, rank, score, tag))
+
+
+def run_search(args, parser, metrics=NULL_METRICS):
     """
-    # set up argument parser
-    parser = ArgumentParser(add_help=False)
-    parser.add_argument('-a', metavar="<algorithm>", required=True)
-    parser.add_argument('-c', metavar="<collection>", required=True)
-    parser.add_argument('-q', metavar="<query-label>", required=True)
-    parser.add_argument('-n', metavar='<num-results>', required=True)
-    parser.add_argument('-l', metavar='<lexicon>', required=True)
-    parser.add_argument('-i', metavar='<invlists>', required=True)
-    parser.add_argument('-m', metavar='<map>', required=True)
-    parser.add_argument('-s', metavar='<stoplist>', nargs=1)
-    parser.add_argument('query', metavar='<queryterm-1> [<queryterm-2> ... <queryterm-N>]', nargs='+')
-    args = parser.parse_args()
+    Runs the query, or the queries of the topics file, of the parsed arguments of <main>.
 
+    :param args: the parsed arguments
+    :param parser: the ArgumentParser, reporting invalid queries
+    :param metrics: a Metrics, measuring nothing by default
+    :return: the number of queries evaluated
+    """
     # begin timing
     start_time = time()
 
     # parse arguments
     algorithm = args.a
-    if algorithm not in ('BM25','AQE'):
-        exit("Unrecognized algorithm '" + args.a + "'. Recognized algorithms include 'BM25' and 'AQE'.")
-    query_label = args.q
     num_results = int(args.n)
-    map = load_map(args.m)
-    invlists = args.i
-    lexicon = load_lexicon(args.l)
     stoplist = args.s[0] if args.s else None
-    query = tokenize(' '.join(args.query), stoplist)
-
-    # print arguments (debug)
 
-    # print("Algorithm: %s" % args.a)
-    # print("Query: %s" % args.query)
-    # print("Processed Query: %s" % query)
-    # exit(0)
+    if args.S or args.H:
+        with metrics.timer('open_index'):
+            index = SegmentedIndex(args.S) if args.S else ShardedIndex(args.H, args.w, args.d)
+        kind = 'segmented' if args.S else 'sharded'
+        unsupported = "a %s index does not support phrase and proximity queries" % kind
+        with index:
+            stopwords = Collection(index.stoplist).stoplist
+            if args.t:
+                topics = read_topics(args.t)
+                if any(parse_operators(query, stopwords) for _, query in topics):
+                    parser.error(unsupported)
+                results = run_segmented_batch(topics, algorithm, num_results, index, args.E)
+                with metrics.timer('query'):
+                    if args.o:
+                        with open(args.o, 'w') as run_file:
+                            write_run(results, run_file, algorithm)
+                    else:
+                        write_run(results, stdout, algorithm)
+                stderr.write("Running time: %d ms for %d queries\n" % ((time() - start_time) * 1000, len(topics)))
+                return len(topics)
+            if parse_operators(' '.join(args.query), stopwords):
+                parser.error(unsupported)
+            query = tokenize(' '.join(args.query), stopwords)
+            with metrics.timer('query'):
+                top_scores = run_segmented_query(query, algorithm, num_results, index, args.E)
+            print_relevant_documents(args.q, top_scores, index)
+        print("\nRunning time: %d ms" % ((time() - start_time) * 1000))
+        return 1
+
+    cache = None
+    if args.C:
+        cache = ResultCache([args.l, args.i, args.m, args.c, stoplist, args.p, args.D, args.F, args.x], args.K, args.C)
+
+    if args.t:
+        topics = read_topics(args.t)
+        results = run_batch(topics, algorithm, num_results, args.l, args.i, args.m, args.c, stoplist, args.w, args.d,
+                            args.p, args.b, args.D, args.F, args.e, args.E, args.P, args.x, metrics, cache)
+        if args.o:
+            with open(args.o, 'w') as run_file:
+                write_run(results, run_file, algorithm)
+        else:
+            write_run(results, stdout, algorithm)
+        if cache:
+            write_cache(cache, metrics)
+        stderr.write("Running time: %d ms for %d queries\n" % ((time() - start_time) * 1000, len(topics)))
+        return len(topics)
 
-    # accumulate similarity scores
-
-    document_scores = accumulate_similarity_scores(query, lexicon, invlists, map)
-
-    #
-
-    top_scores = retrieve_top_ranked_documents(document_scores, num_results)
+    query_label = args.q
+    stopwords = Collection(stoplist).stoplist
+    query = tokenize(' '.join(args.query), stopwords)
+    operators = parse_operators(' '.join(args.query), stopwords)
+    if operators and not args.x:
+        parser.error("phrase and proximity queries require a positions file")
+    if cache:
+        key = result_key(query, operators, algorithm, num_results, args.b if args.p else None, args.e, args.E, args.P)
+        results = cache.get(key)
+        if results is not None:
+            with metrics.timer('output'):
+                print_results(query_label, results)
+            write_cache(cache, metrics)
+            print("\nRunning time: %d ms" % ((time() - start_time) * 1000))
+            return 1
+    with metrics.timer('load_map'):
+        map = load_map(args.m)
+    with metrics.timer('load_lexicon'):
+        lexicon = load_lexicon(args.l)
+    with metrics.timer('open_index'):
+        invlists = InvertedFile(args.i)
+        if metrics.enabled:
+            invlists = MeteredInvertedFile(invlists, metrics)
+        impacts = ImpactFile(args.p) if args.p else None
+        collection = DocumentStore(args.D) if args.D else args.c
+        forward = ForwardIndex(args.F) if args.F else None
+        positions = PositionsFile(args.x) if args.x else None
+
+    top_scores = run_query(query, algorithm, num_results, lexicon, invlists, map, collection, stoplist, args.d,
+                           impacts, args.b, forward, args.e, args.E, args.P, operators, positions, metrics)
+    with metrics.timer('output'):
+        print_relevant_documents(query_label, top_scores, map)
+    if cache:
+        cache.put(key, [[map.docno(id), score] for score, id in reversed(top_scores)])
+        write_cache(cache, metrics)
+
+    if impacts:
+        impacts.close()
+    if args.D:
+        collection.close()
+    if forward:
+        forward.close()
+    if positions:
+        positions.close()
+    invlists.close()
+    lexicon.close()
+    map.close()
+    print("\nRunning time: %d ms" % ((time() - start_time) * 1000))
+    return 1
 
-    if algorithm == "BM25":
-        print_relevant_documents(query_label, top_scores)
 
-    elif algorithm == "AQE":
+def write_cache(cache, metrics=NULL_METRICS):
+    """
+    Saves a ResultCache to its file, reporting its hits and misses to stderr and to a Metrics.
 
-        relevant_docnos = []
-        c = Collection(args.s[0]) if args.s else Collection()
-        for top in top_scores:
-            docno = top[1]
-            relevant_docnos.append(docno)
-            c.parse_document(args.c, docno)
+    :param cache: a ResultCache
+    :param metrics: a Metrics, measuring nothing by default
+    """
+    cache.save()
+    metrics.count('cache_hits', cache.hits)
+    metrics.count('cache_misses', cache.misses)
+    stderr.write("Result cache: %d hits, %d misses, %.1f%% hit rate, %d of %d entries\n" % (
+        cache.hits, cache.misses, 100 * cache.hit_rate(), len(cache.entries), cache.capacity))
 
-        term_candidates = get_term_candidates(query, c.documents)
 
-        top_E_terms = accumulate_term_selection_values(lexicon, invlists, map, term_candidates, len(top_scores), relevant_docnos)
+def write_metrics(file_path, metrics, algorithm, queries, seconds):
+    """
+    Writes the stages and counters of a Metrics as JSON.
 
-        additional_terms = []
-        for top in top_E_terms:
-            additional_terms.append((top[1], top[2]))
+    > {"algorithm": ..., "queries": ..., "seconds": ...,
+    >  "stages": {stage: {"seconds": ..., "calls": ...}}, "counters": {...}}
 
-        new = additional_similarity_scores(document_scores, additional_terms, lexicon, invlists, map)
+    :param file_path: a path to the JSON file, or "-" for stderr
+    :param metrics: a Metrics
+    :param algorithm: either "BM25" or "AQE"
+    :param queries: the number of queries evaluated
+    :param seconds: the total running time
+    """
+    report = dict({'algorithm': algorithm, 'queries': queries, 'seconds': seconds}, **metrics.report())
+    if file_path == '-':
+        dump(report, stderr, indent=2)
+        stderr.write('\n')
+    else:
+        with open(file_path, 'w') as f:
+            dump(report, f, indent=2)
 
-        top_scores = retrieve_top_ranked_documents(new, num_results)
-        print_relevant_documents(query_label, top_scores)
 
+def main():
+    """
+    <search.py> ranks the documents of an index for a query, or for every query of a topics file.
+
+    The optional "-t" argument is a path to a TREC topics file or query log, replacing "-q" and the query
+    The optional "-o" argument is a path for the TREC run file of "-t", written to stdout by default
+    The optional "-w" argument is the number of processes evaluating the queries of "-t"
+    The optional "-d" argument prunes BM25 dynamically with MaxScore, giving identical results
+    The optional "-p" argument is a path to an <impacts> file, ranking BM25 score-at-a-time by quantized scores
+    The optional "-b" argument is the maximum number of postings processed for a query with "-p"
+    The optional "-D" argument is a path to a <docstore>, from which AQE fetches documents instead of "-c"
+    The optional "-F" argument is a path to a <forward> index, from which AQE selects terms instead of "-c" or "-D"
+    The optional "-e" argument is the expansion mode of AQE, one of "full" (default), "rerank" or "fold"
+    The optional "-E" argument is the number of expansion terms of AQE, 25 by default
+    The optional "-P" argument is the number of first-pass documents reranked with "-e rerank", 1000 by default
+    The optional "-x" argument is a path to a <positions> file, required by phrase ("a b") and proximity ("a b"~k)
+    queries
+    The optional "-S" argument is the directory of a segmented index of <segments.py>, replacing "-l", "-i" and "-m",
+    where AQE expands queries as with "-e fold", and "-w", "-d", "-p", "-b", "-D", "-F", "-P", "-x", "-e rerank"
+    and phrase and proximity queries are not supported
+    The optional "-H" argument is the directory of a sharded index of <index.py>, replacing "-l", "-i" and "-m",
+    whose shards are searched by "-w" processes, and pruned by MaxScore with "-d", where AQE expands queries as with
+    "-e fold", and "-p", "-b", "-D", "-F", "-P", "-x", "-e rerank" and phrase and proximity queries are not supported
+    The optional "-j" argument is a path for a JSON report of the time of each stage and the counters, "-" for stderr
+    The optional "-J" argument is a path for the cProfile statistics of the search, read with <pstats>
+    The optional "-C" argument is a path to a JSON file caching the results of queries between runs, see <ResultCache>,
+    whose results are discarded once any file of the index changes
+    The optional "-K" argument is the number of queries whose results are cached with "-C", 1024 by default
+
+    Without "-j", the stages are not timed and nothing is counted.
+    """
+    # set up argument parser
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument('-a', metavar="<algorithm>", required=True)
+    parser.add_argument('-c', metavar="<collection>")
+    parser.add_argument('-q', metavar="<query-label>")
+    parser.add_argument('-n', metavar='<num-results>', required=True)
+    parser.add_argument('-l', metavar='<lexicon>')
+    parser.add_argument('-i', metavar='<invlists>')
+    parser.add_argument('-m', metavar='<map>')
+    parser.add_argument('-s', metavar='<stoplist>', nargs=1)
+    parser.add_argument('-t', metavar='<topics>')
+    parser.add_argument('-o', metavar='<run>')
+    parser.add_argument('-w', metavar='<workers>', type=int, default=1)
+    parser.add_argument('-d', action='store_true')
+    parser.add_argument('-p', metavar='<impacts>')
+    parser.add_argument('-b', metavar='<budget>', type=int)
+    parser.add_argument('-D', metavar='<docstore>')
+    parser.add_argument('-F', metavar='<forward>')
+    parser.add_argument('-e', metavar='<expansion>', choices=EXPANSION_MODES, default='full')
+    parser.add_argument('-E', metavar='<terms>', type=int, default=EXPANSION_TERMS)
+    parser.add_argument('-P', metavar='<pool>', type=int, default=POOL_SIZE)
+    parser.add_argument('-x', metavar='<positions>')
+    parser.add_argument('-S', metavar='<segments>')
+    parser.add_argument('-H', metavar='<shards>')
+    parser.add_argument('-j', metavar='<metrics>')
+    parser.add_argument('-J', metavar='<profile>')
+    parser.add_argument('-C', metavar='<cache>')
+    parser.add_argument('-K', metavar='<capacity>', type=int, default=CAPACITY)
+    parser.add_argument('query', metavar='<queryterm-1> [<queryterm-2> ... <queryterm-N>]', nargs='*')
+    args = parser.parse_args()
+    if not args.t and (args.q is None or not args.query):
+        parser.error("a query label and query terms are required without a topics file")
+    if not (args.S or args.H) and not (args.l and args.i and args.m):
+        parser.error("the arguments -l, -i and -m are required without a segmented or sharded index")
+    if args.C and (args.S or args.H):
+        parser.error("the result cache requires the arguments -l, -i and -m")
+    if args.S and (args.w > 1 or args.d or args.p or args.b is not None or args.D or args.F or args.x
+                   or args.e == 'rerank' or args.P != POOL_SIZE):
+        parser.error("a segmented index does not support the arguments -w, -d, -p, -b, -D, -F, -P, -x or -e rerank")
+    if args.H and (args.p or args.b is not None or args.D or args.F or args.x or args.e == 'rerank'
+                   or args.P != POOL_SIZE):
+        parser.error("a sharded index does not support the arguments -p, -b, -D, -F, -P, -x or -e rerank")
+    if args.a == 'AQE' and not (args.c or args.D or args.F or args.S or args.H):
+        parser.error("AQE requires a collection, a docstore or a forward index")
+    if args.a not in ('BM25', 'AQE'):
+        exit("Unrecognized algorithm '" + args.a + "'. Recognized algorithms include 'BM25' and 'AQE'.")
 
+    metrics = Metrics() if args.j else NULL_METRICS
+    start_time = perf_counter()
+    with profiled(args.J):
+        queries = run_search(args, parser, metrics)
+    if args.j:
+        write_metrics(args.j, metrics, args.a, queries, perf_counter() - start_time)
 
-    print("\nRunning time: %d ms" % ((time() - start_time) * 1000))
 
 if __name__ == "__main__":
     main()
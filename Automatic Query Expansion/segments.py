@@ -0,0 +1,485 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from bisect import bisect_right
+from collection import Collection, SPIMICollection
+from contextlib import contextmanager
+from docstore import DocumentStore
+from document_map import DocumentMap
+from fcntl import flock, LOCK_EX, LOCK_NB, LOCK_SH, LOCK_UN
+from inverted_file import InvertedFile
+from json import dump, load
+from lexicon import Lexicon
+from pruning import top_ranked
+from ranking import BM25
+from shutil import rmtree
+from subprocess import DEVNULL, Popen
+from sys import executable, stderr
+from tempfile import NamedTemporaryFile
+import numpy
+import os
+
+MANIFEST = 'manifest'
+LOCK = 'lock'  # held to read or replace the <manifest>
+MERGE_LOCK = 'merge.lock'  # held by the single process merging segments
+MERGE_FACTOR = 4  # the number of adjacent segments of a level merged into a segment of the next level
+DELETED_RATIO = 0.5  # the fraction of deleted documents at which a segment is rewritten on its own
+
+
+def read_manifest(directory):
+    """
+    Returns the <manifest> of a segmented index, or an empty manifest if there is none.
+
+    The <manifest> is a JSON object listing the live segments in order of their documents:
+
+    > {"stoplist": null, "next": 3, "segments": [{"name": "segment-000001", "documents": 100,
+    >  "average_length": 512.4, "level": 0, "deleted": [7]}, ...]}
+
+    Each segment is a directory holding the <map>, <lexicon>, <invlists> and <docstore> of its
+    documents, written like an index of <index.py> and never modified. The "deleted" list holds
+    the ids of the documents of the segment deleted since it was written, its tombstones.
+
+    :param directory: a path to the directory of a segmented index
+    :return: the manifest as a dictionary
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST), 'r') as f:
+            return load(f)
+    except FileNotFoundError:
+        return {'stoplist': None, 'next': 1, 'segments': []}
+
+
+def write_manifest(directory, manifest):
+    """
+    Replaces the <manifest> of a segmented index atomically.
+
+    :param directory: a path to the directory of a segmented index
+    :param manifest: the manifest as a dictionary, see <read_manifest>
+    """
+    with NamedTemporaryFile('w', dir=directory, delete=False) as f:
+        dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f.name, os.path.join(directory, MANIFEST))
+
+
+@contextmanager
+def locked(directory, name=LOCK, shared=False, blocking=True):
+    """
+    Holds a lock file of a segmented index, yielding whether it was acquired.
+
+    :param directory: a path to the directory of a segmented index
+    :param name: the name of the lock file
+    :param shared: whether other shared holders are allowed, e.g. to read the <manifest>
+    :param blocking: whether to wait for the lock, otherwise False is yielded if it is held
+    """
+    with open(os.path.join(directory, name), 'a') as f:
+        try:
+            flock(f, (LOCK_SH if shared else LOCK_EX) | (0 if blocking else LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            flock(f, LOCK_UN)
+
+
+def build_segment(directory, collection, stoplist=None, workers=1, budget=None):
+    """
+    Indexes a <collection> into the files of a new segment <directory>.
+
+    :param directory: a path to the new segment directory
+    :param collection: a path to a <collection> of TREC documents
+    :param stoplist: an optional path to a <stoplist>
+    :param workers: the number of processes used to parse the <collection>
+    :param budget: an optional memory budget in bytes, enabling single-pass (SPIMI) indexing
+    :return: a tuple of the number of documents and their average length
+    """
+    os.makedirs(directory)
+    if budget:
+        c = SPIMICollection(stoplist, budget, workers, directory)
+    else:
+        c = Collection(stoplist, workers, directory)
+    c.parse_collection(collection)
+    c.write_map_to_disk()
+    c.write_invlists_lexicon_to_disk()
+    return len(c.weights), c.average_length
+
+
+def reserve_segment(directory):
+    """
+    Returns the name of a new segment, unique within a segmented index.
+
+    :param directory: a path to the directory of a segmented index
+    :return: the name of the segment
+    """
+    with locked(directory):
+        manifest = read_manifest(directory)
+        name = 'segment-%06d' % manifest['next']
+        manifest['next'] += 1
+        write_manifest(directory, manifest)
+    return name
+
+
+def add_segment(directory, collection, stoplist=None, workers=1, budget=None):
+    """
+    Indexes a batch of TREC documents as a new segment of a segmented index.
+
+    Only the new documents are read and indexed. The segment is built under a temporary
+    name and then listed last in the <manifest>, so searches only ever see complete segments.
+    The stoplist of the first segment is kept for every segment of the index.
+
+    :param directory: a path to the directory of a segmented index, created if missing
+    :param collection: a path to a <collection> of TREC documents
+    :param stoplist: an optional path to a <stoplist>, used when the index is created
+    :param workers: the number of processes used to parse the <collection>
+    :param budget: an optional memory budget in bytes, enabling single-pass (SPIMI) indexing
+    :return: the name of the new segment
+    """
+    os.makedirs(directory, exist_ok=True)
+    with locked(directory):
+        manifest = read_manifest(directory)
+        if not manifest['segments'] and not manifest.get('stoplist') and stoplist:
+            manifest['stoplist'] = os.path.abspath(stoplist)
+            write_manifest(directory, manifest)
+    name = reserve_segment(directory)
+    temporary = os.path.join(directory, name + '.tmp')
+    try:
+        documents, average_length = build_segment(temporary, collection, manifest['stoplist'], workers, budget)
+    except BaseException:
+        rmtree(temporary, ignore_errors=True)
+        raise
+    os.rename(temporary, os.path.join(directory, name))
+    with locked(directory):
+        manifest = read_manifest(directory)
+        manifest['segments'].append({'name': name, 'documents': documents, 'average_length': average_length,
+                                     'level': 0, 'deleted': []})
+        write_manifest(directory, manifest)
+    return name
+
+
+def delete_documents(directory, docnos):
+    """
+    Deletes documents from a segmented index by adding tombstones to the <manifest>.
+
+    The segments themselves are not modified; the deleted documents are skipped by searches
+    and dropped when their segment is next merged.
+
+    :param directory: a path to the directory of a segmented index
+    :param docnos: an iterable of docnos
+    :return: the number of documents deleted
+    """
+    docnos = set(docnos)
+    count = 0
+    with locked(directory):
+        manifest = read_manifest(directory)
+        for segment in manifest['segments']:
+            deleted = set(segment['deleted'])
+            with DocumentMap(os.path.join(directory, segment['name'], 'map')) as map:
+                for id in range(1, len(map) + 1):
+                    if id not in deleted and map.docno(id) in docnos:
+                        deleted.add(id)
+                        count += 1
+            segment['deleted'] = sorted(deleted)
+        write_manifest(directory, manifest)
+    return count
+
+
+def select_merge(segments):
+    """
+    Returns the segments that should be merged next by the tiered merge policy.
+
+    Segments are written at level 0, and a run of <MERGE_FACTOR> adjacent segments of the
+    same level is merged into a single segment of the next level, so every document is
+    re-indexed once per level and the number of segments grows logarithmically. Only adjacent
+    segments are merged, which keeps the documents of the index in the order they were added.
+    A segment with at least <DELETED_RATIO> of its documents deleted is rewritten on its own.
+
+    :param segments: the list of segments of the <manifest>
+    :return: a list of the indexes of adjacent segments, or None if nothing should be merged
+    """
+    for index, segment in enumerate(segments):
+        if len(segment['deleted']) >= DELETED_RATIO * segment['documents']:
+            return [index]
+    start = 0
+    for index in range(1, len(segments) + 1):
+        if index == len(segments) or segments[index]['level'] != segments[start]['level']:
+            if index - start >= MERGE_FACTOR:
+                return list(range(start, start + MERGE_FACTOR))
+            start = index
+    return None
+
+
+def write_document(stream, docno, text):
+    """
+    Writes a document in the TREC format read by <parse_documents>.
+
+    :param stream: a writable text stream
+    :param docno: the docno of the document
+    :param text: the text of the document, as parsed by <parse_documents>
+    """
+    stream.write('<DOC>\n<DOCNO> %s </DOCNO>\n<TEXT>\n%s</TEXT>\n</DOC>\n' % (docno, text))
+
+
+def merge_once(directory, workers=1, budget=None):
+    """
+    Performs the next merge selected by <select_merge>.
+
+    The live documents of the merged segments are written back out in the TREC format from
+    their <docstore> and <map> files, and indexed again as a single new segment, which drops
+    their tombstones. The new segment replaces the merged segments in the <manifest>, where
+    documents deleted while the merge ran are carried over as tombstones of the new segment.
+    The directories of the merged segments are removed once no search can be opening them.
+
+    :param directory: a path to the directory of a segmented index
+    :param workers: the number of processes used to parse the documents
+    :param budget: an optional memory budget in bytes, enabling single-pass (SPIMI) indexing
+    :return: True if segments were merged, otherwise False
+    """
+    with locked(directory, shared=True):
+        manifest = read_manifest(directory)
+    selected = select_merge(manifest['segments'])
+    if selected is None:
+        return False
+    sources = [manifest['segments'][index] for index in selected]
+    level = max(segment['level'] for segment in sources) + (len(sources) > 1)
+
+    renumbered = {}  # the id in the new segment of each live document, by segment name and id
+    live = 0
+    with NamedTemporaryFile('w', suffix='.trec', dir=directory) as stream:
+        for segment in sources:
+            path = os.path.join(directory, segment['name'])
+            deleted = set(segment['deleted'])
+            ids = renumbered[segment['name']] = {}
+            map_path, docstore_path = os.path.join(path, 'map'), os.path.join(path, 'docstore')
+            with DocumentMap(map_path) as map, DocumentStore(docstore_path) as docstore:
+                for id in range(1, len(map) + 1):
+                    if id not in deleted:
+                        write_document(stream, map.docno(id), docstore.text(id))
+                        live += 1
+                        ids[id] = live
+        stream.flush()
+        name = reserve_segment(directory) if live else None
+        if live:
+            temporary = os.path.join(directory, name + '.tmp')
+            try:
+                documents, average_length = build_segment(temporary, stream.name, manifest['stoplist'], workers, budget)
+            except BaseException:
+                rmtree(temporary, ignore_errors=True)
+                raise
+            os.rename(temporary, os.path.join(directory, name))
+
+    with locked(directory):
+        manifest = read_manifest(directory)
+        names = [segment['name'] for segment in manifest['segments']]
+        first = names.index(sources[0]['name'])
+        merged = manifest['segments'][first:first + len(sources)]
+        if [segment['name'] for segment in merged] != [segment['name'] for segment in sources]:
+            raise RuntimeError("The merged segments of '%s' were modified by another process." % directory)
+        replacement = []
+        if live:
+            deleted = [renumbered[segment['name']][id] for segment in merged for id in segment['deleted']
+                       if id in renumbered[segment['name']]]  # deleted while the merge ran
+            replacement.append({'name': name, 'documents': documents, 'average_length': average_length,
+                                'level': level, 'deleted': sorted(deleted)})
+        manifest['segments'][first:first + len(sources)] = replacement
+        write_manifest(directory, manifest)
+        for segment in sources:
+            rmtree(os.path.join(directory, segment['name']), ignore_errors=True)
+    return True
+
+
+def merge_segments(directory, workers=1, budget=None):
+    """
+    Merges segments until the tiered merge policy selects no more.
+
+    Only one process merges an index at a time; if another process is already merging,
+    this returns immediately, as that process also merges the segments added meanwhile.
+
+    :param directory: a path to the directory of a segmented index
+    :param workers: the number of processes used to parse the documents
+    :param budget: an optional memory budget in bytes, enabling single-pass (SPIMI) indexing
+    :return: the number of merges performed
+    """
+    count = 0
+    with locked(directory, MERGE_LOCK, blocking=False) as acquired:
+        if acquired:
+            while merge_once(directory, workers, budget):
+                count += 1
+    return count
+
+
+def merge_in_background(directory):
+    """
+    Starts a detached process running <merge_segments> on a segmented index.
+
+    :param directory: a path to the directory of a segmented index
+    """
+    Popen([executable, os.path.abspath(__file__), '-d', directory, '-m'], stdin=DEVNULL, stdout=DEVNULL,
+          stderr=DEVNULL, start_new_session=True)
+
+
+class SegmentedIndex:
+
+    def __init__(self, directory):
+        """
+        Searches every live segment of a segmented index as a single index.
+
+        The segments listed in the <manifest> are opened while holding its lock, so a merge
+        cannot remove them meanwhile. Documents have a global id, the id within their segment
+        following the documents of the preceding segments.
+
+        Scores use the statistics of the whole index: the number of documents and document
+        frequency of a term are summed over the segments, deleted documents included until they
+        are merged away, and the <document_weight> of every document is rescaled from the average
+        length of its segment to the average length of the index.
+
+        :param directory: a path to the directory of a segmented index
+        """
+        with locked(directory, shared=True):
+            manifest = read_manifest(directory)
+            self.stoplist = manifest['stoplist']
+            self.segments = []  # (first global id - 1, lexicon, invlists, map, docstore, deleted)
+            for segment in manifest['segments']:
+                path = os.path.join(directory, segment['name'])
+                first = sum(s['documents'] for s in manifest['segments'][:len(self.segments)])
+                self.segments.append((first, Lexicon(os.path.join(path, 'lexicon')),
+                                      InvertedFile(os.path.join(path, 'invlists')),
+                                      DocumentMap(os.path.join(path, 'map')),
+                                      DocumentStore(os.path.join(path, 'docstore')),
+                                      numpy.array(segment['deleted'], numpy.int64)))
+        self.ranker = BM25()
+        self.count = sum(segment['documents'] for segment in manifest['segments'])
+        self.deleted = sum(len(segment['deleted']) for segment in manifest['segments'])
+        average_length = (sum(segment['documents'] * segment['average_length'] for segment in manifest['segments'])
+                          / max(self.count, 1))
+        base = self.ranker.k * (1 - self.ranker.b)  # the <document_weight> of a document of length 0
+        self.weights = [base + (map.weights.astype(numpy.float64) - base) * (segment['average_length'] / average_length)
+                        for (_, _, _, map, _, _), segment in zip(self.segments, manifest['segments'])]
+        self.firsts = [first for first, _, _, _, _, _ in self.segments]
+
+    def df(self, term):
+        """
+        Returns the number of documents of the index containing a term.
+
+        :param term: a term
+        :return: the document frequency summed over the segments
+        """
+        return sum(entry.df for entry in (lexicon.get(term) for _, lexicon, _, _, _, _ in self.segments) if entry)
+
+    def search(self, query, k):
+        """
+        Returns the top-k live documents for a weighted query.
+
+        Each segment is scored exhaustively, as its bounds are not valid under the statistics
+        of the index, and the top-k of every segment are ranked together.
+
+        :param query: a list of (term, weight) tuples, where a weight of None is the BM25 IDF of the term
+        :param k: the number of top-ranked documents that should be returned
+        :return: a list of (score, id) tuples with ascending scores, with global ids
+        """
+        weighted = [(term, self.ranker.idf_term_weight(self.count, self.df(term)) if weight is None else weight)
+                    for term, weight in query]
+        ids, scores = [], []
+        for (first, lexicon, invlists, map, _, deleted), weights in zip(self.segments, self.weights):
+            accumulators = numpy.zeros(len(map) + 1)  # indexed by id, so that ids need no offset
+            found = numpy.zeros(len(map) + 1, bool)
+            for term, weight in weighted:  # sums in order of query term
+                entry = lexicon.get(term)
+                if entry:
+                    term_ids, frequencies = invlists.postings(entry.offset)  # inverted list of term
+                    accumulators[term_ids] += weight * self.ranker.tf_term_weight(frequencies, weights[term_ids - 1])
+                    found[term_ids] = True
+            found[deleted] = False
+            candidates = numpy.flatnonzero(found)
+            for score, id in top_ranked(candidates, accumulators[candidates], k):
+                ids.append(first + id)
+                scores.append(score)
+        return top_ranked(numpy.array(ids, numpy.int64), numpy.array(scores, numpy.float64), k)
+
+    def locate(self, id):
+        """
+        Returns the segment of a document and its id within the segment.
+
+        :param id: the global id of a document
+        :return: a tuple of the segment and the id of the document within it
+        """
+        segment = self.segments[bisect_right(self.firsts, id - 1) - 1]
+        return segment, id - segment[0]
+
+    def docno(self, id):
+        """
+        Returns the docno of a document.
+
+        :param id: the global id of a document
+        :return: the docno of the document
+        """
+        (_, _, _, map, _, _), local = self.locate(id)
+        return map.docno(local)
+
+    def text(self, id):
+        """
+        Returns the text of a document from the <docstore> of its segment.
+
+        :param id: the global id of a document
+        :return: the text of the document
+        """
+        (_, _, _, _, docstore, _), local = self.locate(id)
+        return docstore.text(local)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        for _, lexicon, invlists, map, docstore, _ in self.segments:
+            lexicon.close()
+            invlists.close()
+            map.close()
+            docstore.close()
+        self.segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main():
+    """
+    <segments.py> maintains a segmented index in the directory given by "-d".
+
+    The optional "-a" argument is a path to a <collection> of new documents, indexed as a new segment
+    The optional "-r" argument is one or more docnos of documents to delete
+    The optional "-m" argument merges segments by the tiered merge policy before returning
+    The optional "-s" argument requires a path to a <stoplist>, used when the index is created
+    The optional "-b" argument is a memory budget in megabytes, enabling single-pass (SPIMI) indexing
+    The optional "-w" argument is a number of worker processes used to parse the documents
+    Without "-m", segments are merged by a background process after "-a" or "-r".
+    """
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument('-d', metavar='<directory>', required=True)
+    parser.add_argument('-a', metavar='<collection>')
+    parser.add_argument('-r', metavar='<docno>', nargs='+')
+    parser.add_argument('-m', action='store_true')
+    parser.add_argument('-s', metavar='<stopfile>', nargs=1)
+    parser.add_argument('-b', metavar='<budget>', type=int)
+    parser.add_argument('-w', '--workers', metavar='<workers>', type=int, default=1)
+    args = parser.parse_args()
+    if not (args.a or args.r or args.m):
+        parser.error("one of -a, -r or -m is required")
+
+    budget = args.b * 1024 * 1024 if args.b else None
+    if args.a:
+        stderr.write("Added %s\n" % add_segment(args.d, args.a, args.s[0] if args.s else None, args.workers, budget))
+    if args.r:
+        stderr.write("Deleted %d documents\n" % delete_documents(args.d, args.r))
+    if args.m:
+        stderr.write("Performed %d merges\n" % merge_segments(args.d, args.workers, budget))
+    else:
+        merge_in_background(args.d)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from asyncio import get_running_loop, run, start_server, start_unix_server
+from cache import ResultCache
+from collection import Collection
+from concurrent.futures import ThreadPoolExecutor
+from docstore import DocumentStore
+from forward import ForwardIndex
+from positions import PositionsFile
+from inverted_file import InvertedFile
+from json import dumps, loads
+from search import (EXPANSION_MODES, EXPANSION_TERMS, POOL_SIZE, load_lexicon, load_map, parse_operators, result_key,
+                    run_query)
+from sys import stderr
+from time import time
+from tokenizer import tokenize
+
+
+class QueryServer:
+
+    def __init__(self, lexicon, invlists, map, collection=None, stoplist=None, threads=4, docstore=None, forward=None,
+                 positions=None, cache=0):
+        """
+        Serves BM25 and AQE queries against an index that stays resident between queries.
+
+        The <lexicon>, <invlists> and <map> files are opened once and shared by every request.
+        Clients send one JSON request per line and receive one JSON response per line:
+
+        > {"a": "BM25", "q": "401", "n": 10, "query": "white house"}
+        > {"q": "401", "results": [["LA010189-0001", 1, 5.214], ...], "latency_ms": 3.1}
+
+        The keys of a request match the arguments of <search.py>. Queries are scored in
+        a thread pool so that the event loop keeps accepting requests from other clients.
+
+        With a <cache>, the results of the most recent queries are kept in a ResultCache, so a
+        repeated query is answered without being scored, and its response has "cached" set.
+        The request {"stats": true} is answered with the statistics of the cache.
+
+        :param lexicon: a path to a <lexicon> file
+        :param invlists: a path to an <invlists> file
+        :param map: a path to a <map> file
+        :param collection: a path to the <collection> used for relevance feedback
+        :param stoplist: an optional path to a <stoplist>
+        :param threads: the number of queries that may be scored at the same time
+        :param docstore: an optional path to a <docstore> used for relevance feedback instead of the <collection>
+        :param forward: an optional path to a <forward> index used to select expansion terms
+        :param positions: an optional path to a <positions> file used by phrase and proximity queries
+        :param cache: the number of queries whose results are cached, 0 to cache nothing
+        """
+        self.lexicon = load_lexicon(lexicon)
+        self.invlists = InvertedFile(invlists)
+        self.map = load_map(map)
+        self.docstore = DocumentStore(docstore) if docstore else None
+        self.collection = self.docstore or collection
+        self.forward = ForwardIndex(forward) if forward else None
+        self.positions = PositionsFile(positions) if positions else None
+        self.stoplist_file = stoplist
+        self.stoplist = Collection(stoplist).stoplist
+        self.executor = ThreadPoolExecutor(threads)
+        self.cache = None
+        if cache:
+            file_paths = [lexicon, invlists, map, collection, stoplist, docstore, forward, positions]
+            self.cache = ResultCache(file_paths, cache)
+
+    def search(self, request):
+        """
+        Evaluates a single request.
+
+        :param request: a dictionary with the keys "a", "q", "n" and "query", and optionally "e", "E" and "P"
+        :return: a response dictionary
+        """
+        start_time = time()
+        if request.get('stats'):
+            return {'q': request.get('q'), 'cache': self.cache.report() if self.cache else None}
+        algorithm = request.get('a', 'BM25')
+        if algorithm not in ('BM25', 'AQE'):
+            raise ValueError("Unrecognized algorithm '" + algorithm + "'. "
+                             "Recognized algorithms include 'BM25' and 'AQE'.")
+        expansion = request.get('e', 'full')
+        if expansion not in EXPANSION_MODES:
+            raise ValueError("Unrecognized expansion mode '" + expansion + "'. Recognized modes include " +
+                             ", ".join("'%s'" % mode for mode in EXPANSION_MODES) + ".")
+        query = request['query']
+        if not isinstance(query, str):
+            query = ' '.join(query)
+        terms = tokenize(query, self.stoplist)
+        operators = parse_operators(query, self.stoplist)
+        num_results = int(request['n'])
+        E, pool = int(request.get('E', EXPANSION_TERMS)), int(request.get('P', POOL_SIZE))
+        key = result_key(terms, operators, algorithm, num_results, None, expansion, E, pool)
+        ranked = self.cache.get(key) if self.cache else None
+        cached = ranked is not None
+        if not cached:
+            top_scores = run_query(terms, algorithm, num_results, self.lexicon, self.invlists, self.map,
+                                   self.collection, self.stoplist_file, forward=self.forward, expansion=expansion, E=E,
+                                   pool=pool, operators=operators, positions=self.positions)
+            ranked = [[self.map.docno(id), score] for score, id in reversed(top_scores)]
+            if self.cache:
+                self.cache.put(key, ranked)
+        results = [[docno, rank, round(score, 3)] for rank, (docno, score) in enumerate(ranked, 1)]
+        response = {'q': request.get('q'), 'results': results, 'latency_ms': (time() - start_time) * 1000}
+        if self.cache:
+            response['cached'] = cached
+        return response
+
+    async def handle(self, reader, writer):
+        """
+        Answers the requests of a single client until it disconnects.
+
+        :param reader: the StreamReader of the connection
+        :param writer: the StreamWriter of the connection
+        """
+        loop = get_running_loop()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            start_time = time()
+            request = {}
+            try:
+                request = loads(line)
+                response = await loop.run_in_executor(self.executor, self.search, request)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                response = {'q': request.get('q') if isinstance(request, dict) else None, 'error': str(e)}
+            response['latency_ms'] = (time() - start_time) * 1000  # includes the time queued for a thread
+            writer.write(dumps(response).encode('utf-8') + b'\n')
+            await writer.drain()
+            stderr.write("%s %s %.3f ms\n" % (response.get('q'), 'error' if 'error' in response else 'ok',
+                                              response['latency_ms']))
+        writer.close()
+
+    async def serve(self, path=None, host='127.0.0.1', port=None):
+        """
+        Listens on a Unix socket at <path>, or on a TCP <port> of <host>, until cancelled.
+
+        :param path: a path for a Unix socket
+        :param host: the host to listen on with TCP
+        :param port: the port to listen on with TCP
+        """
+        if path:
+            server = await start_unix_server(self.handle, path)
+        else:
+            server = await start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown()
+        self.invlists.close()
+        self.lexicon.close()
+        self.map.close()
+        if self.docstore:
+            self.docstore.close()
+        if self.forward:
+            self.forward.close()
+        if self.positions:
+            self.positions.close()
+
+
+def main():
+    """
+    <server.py> requires the index files used by <search.py>, and either a socket path or a port.
+
+    The "-c" argument is a path to the <collection>, "-D" a path to a <docstore> or "-F" a path to a <forward> index,
+    for AQE
+    The optional "-s" argument requires a path to a <stoplist>
+    The optional "-x" argument is a path to a <positions> file, required by phrase ("a b") and proximity ("a b"~k)
+    queries
+    The optional "-u" argument is a path for a Unix socket
+    The optional "-p" argument is a TCP port, used if "-u" is not given
+    The optional "-H" argument is the host to listen on with TCP
+    The optional "-t" argument is the number of queries scored at the same time
+    The optional "-C" argument is the number of queries whose results are cached, none by default
+    """
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument('-c', metavar="<collection>")
+    parser.add_argument('-D', metavar='<docstore>')
+    parser.add_argument('-F', metavar='<forward>')
+    parser.add_argument('-l', metavar='<lexicon>', required=True)
+    parser.add_argument('-i', metavar='<invlists>', required=True)
+    parser.add_argument('-m', metavar='<map>', required=True)
+    parser.add_argument('-s', metavar='<stoplist>', nargs=1)
+    parser.add_argument('-x', metavar='<positions>')
+    parser.add_argument('-u', metavar='<socket>')
+    parser.add_argument('-p', metavar='<port>', type=int, default=8080)
+    parser.add_argument('-H', metavar='<host>', default='127.0.0.1')
+    parser.add_argument('-t', metavar='<threads>', type=int, default=4)
+    parser.add_argument('-C', metavar='<capacity>', type=int, default=0)
+    args = parser.parse_args()
+
+    server = QueryServer(args.l, args.i, args.m, args.c, args.s[0] if args.s else None, args.t, args.D, args.F,
+                         args.x, args.C)
+    try:
+        run(server.serve(args.u, args.H, args.p))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
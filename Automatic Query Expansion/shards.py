@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+
+from bisect import bisect_right
+from collection import Collection, SPIMICollection
+from docstore import DocumentStore
+from document_map import DocumentMap
+from heapq import merge
+from inverted_file import InvertedFile
+from itertools import islice
+from json import dump, load
+from lexicon import Lexicon
+from multiprocessing import Pipe, Pool, Process
+from pruning import maxscore, top_ranked
+from ranking import BM25
+from trec import split_collection
+import numpy
+import os
+
+MANIFEST = 'shards'
+CHUNKS_PER_SHARD = 16  # the number of chunks of <split_collection> balanced across the shards
+shards = None  # the shards of a sharded index, opened by each worker process of a ShardedIndex
+
+
+def partition_collection(collection, count):
+    """
+    Splits a <collection> into contiguous partitions of roughly equal size at "<DOC>" boundaries.
+
+    The <collection> is split into small chunks by <split_collection>, and each chunk is given to
+    the partition its first byte falls in, so a partition may only be empty when a few documents
+    hold most of the <collection>. Empty partitions are dropped.
+
+    :param collection: a path to a <collection>
+    :param count: the number of partitions
+    :return: a list of (start, end) tuples of byte-offsets
+    """
+    size = os.path.getsize(collection)
+    partitions = [None] * count
+    for start, end, _ in split_collection(collection, max(1, size // (CHUNKS_PER_SHARD * count))):
+        index = min(count - 1, start * count // max(size, 1))
+        partitions[index] = (partitions[index][0] if partitions[index] else start, end)
+    return [partition for partition in partitions if partition]
+
+
+def build_shard(connection, directory, collection, chunk, stoplist=None, budget=None):
+    """
+    Indexes one partition of a <collection> into the files of a shard <directory> in a worker process.
+
+    The documents of the partition are parsed, and their number and combined length are sent to
+    <build_shards>, which replies with the average document length of the whole <collection>. The
+    <map> is then written with that average, so every <document_weight> is the one of an index of
+    the whole <collection>, followed by the <lexicon>, <invlists> and <forward> index.
+
+    :param connection: the end of a Pipe to the process running <build_shards>
+    :param directory: a path to the new shard directory
+    :param collection: a path to a <collection>
+    :param chunk: a (start, end) tuple of the byte-offsets of the partition
+    :param stoplist: an optional path to a <stoplist>
+    :param budget: an optional memory budget in bytes, enabling single-pass (SPIMI) indexing
+    """
+    os.makedirs(directory)
+    c = SPIMICollection(stoplist, budget, directory=directory) if budget else Collection(stoplist, directory=directory)
+    c.parse_collection(collection, chunk)
+    connection.send(c.document_statistics())
+    c.write_map_to_disk(connection.recv())
+    c.write_invlists_lexicon_to_disk()
+    c.write_forward_index_to_disk()
+    connection.send(True)
+    connection.close()
+
+
+def build_shards(directory, collection, count, stoplist=None, budget=None):
+    """
+    Indexes a <collection> as a sharded index of <count> document-partitioned shards.
+
+    Each shard indexes a contiguous partition of the <collection> in a process of its own, see
+    <build_shard>, and is a directory holding the <map>, <lexicon>, <invlists>, <docstore> and
+    <forward> index of its documents, written like an index of <index.py>. Every shard is parsed
+    before any is written, as the <document_weight> of a document depends on the average length
+    of every document. The shards are listed in the <shards> manifest, a JSON object:
+
+    > {"stoplist": null, "documents": 2000, "average_length": 512.4,
+    >  "shards": [{"name": "shard-001", "documents": 1000}, ...]}
+
+    :param directory: a path to the directory of the sharded index, created if missing
+    :param collection: a path to a <collection>
+    :param count: the number of shards
+    :param stoplist: an optional path to a <stoplist>
+    :param budget: an optional memory budget in bytes of each shard, enabling single-pass (SPIMI) indexing
+    :return: the manifest as a dictionary
+    """
+    stoplist = os.path.abspath(stoplist) if stoplist else None
+    os.makedirs(directory, exist_ok=True)
+    workers = []  # (name, process, connection)
+    try:
+        for number, chunk in enumerate(partition_collection(collection, count), 1):
+            name = 'shard-%03d' % number
+            connection, child = Pipe()
+            process = Process(target=build_shard, args=(child, os.path.join(directory, name), collection, chunk,
+                                                        stoplist, budget))
+            process.start()
+            child.close()
+            workers.append((name, process, connection))
+
+        if not workers:
+            raise ValueError("The collection has no documents.")
+        statistics = [receive(name, connection) for name, _, connection in workers]
+        documents = sum(shard_documents for shard_documents, _ in statistics)
+        average_length = sum(length for _, length in statistics) / documents
+        for _, _, connection in workers:
+            connection.send(average_length)
+        for name, process, connection in workers:
+            receive(name, connection)
+            process.join()
+    finally:
+        for _, process, connection in workers:
+            connection.close()
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+    manifest = {'stoplist': stoplist, 'documents': documents, 'average_length': average_length,
+                'shards': [{'name': name, 'documents': shard_documents}
+                           for (name, _, _), (shard_documents, _) in zip(workers, statistics)]}
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        dump(manifest, f)
+    return manifest
+
+
+def receive(name, connection):
+    """
+    Returns the next message of a process building a shard.
+
+    :param name: the name of the shard
+    :param connection: the end of a Pipe to the process
+    :return: the message
+    """
+    try:
+        return connection.recv()
+    except EOFError:
+        raise RuntimeError("The process building '%s' exited without completing it." % name)
+
+
+def open_shards(directory):
+    """
+    Opens the <lexicon>, <invlists> and <map> of every shard of a sharded index for <search_shard>.
+
+    :param directory: a path to the directory of a sharded index
+    """
+    global shards
+    with open(os.path.join(directory, MANIFEST), 'r') as f:
+        manifest = load(f)
+    shards = []
+    for shard in manifest['shards']:
+        path = os.path.join(directory, shard['name'])
+        shards.append((Lexicon(os.path.join(path, 'lexicon')), InvertedFile(os.path.join(path, 'invlists')),
+                       DocumentMap(os.path.join(path, 'map'))))
+
+
+def search_shard(task):
+    """
+    Returns the top-k documents of one shard of <shards> for a weighted query in a worker process.
+
+    :param task: a tuple of the index of the shard in <shards>, a list of (term, weight) tuples, k and whether to
+    prune with MaxScore
+    :return: a list of (score, id) tuples with ascending scores, with the ids of the shard
+    """
+    index, query, k, pruned = task
+    return rank_shard(shards[index], query, k, pruned)
+
+
+def rank_shard(shard, query, k, pruned=False):
+    """
+    Returns the top-k documents of one shard for a weighted query.
+
+    The weights are computed by the coordinator from the statistics of the whole index, and the
+    <document_weight> of every document already is, so the scores are those of a single index.
+    A document scores the sum of <weight> * <tf_term_weight> over the query terms, in order of term.
+
+    :param shard: a tuple of the Lexicon, InvertedFile and DocumentMap of the shard
+    :param query: a list of (term, weight) tuples
+    :param k: the number of top-ranked documents that should be returned
+    :param pruned: whether to rank by MaxScore, giving identical results
+    :return: a list of (score, id) tuples with ascending scores, with the ids of the shard
+    """
+    lexicon, invlists, map = shard
+    if pruned:
+        return maxscore(query, k, lexicon, invlists, map)
+    ranker = BM25()
+    document_scores = numpy.zeros(len(map) + 1)  # indexed by id, so that ids need no offset
+    found = numpy.zeros(len(map) + 1, bool)
+    for term, weight in query:
+        entry = lexicon.get(term)
+        if entry:
+            ids, frequencies = invlists.postings(entry.offset)  # inverted list of term
+            weights = map.weights[ids - 1].astype(numpy.float64)
+            document_scores[ids] += weight * ranker.tf_term_weight(frequencies, weights)
+            found[ids] = True
+    candidates = numpy.flatnonzero(found)
+    return top_ranked(candidates, document_scores[candidates], k)
+
+
+class ShardedIndex:
+
+    def __init__(self, directory, workers=1, pruned=False):
+        """
+        Searches the shards of a sharded index of <build_shards> as a single index.
+
+        Every query is fanned out to the shards, each returning its own top-k, see <search_shard>,
+        and the lists are merged into the top-k of the index. With more than one worker, the shards
+        are searched concurrently by a process pool whose processes each open every shard.
+
+        Documents have a global id, the id within their shard following the documents of the
+        preceding shards, which is the id of the document in an index of the whole <collection>.
+
+        :param directory: a path to the directory of a sharded index
+        :param workers: the number of processes searching the shards
+        :param pruned: whether each shard is ranked by MaxScore, giving identical results
+        """
+        with open(os.path.join(directory, MANIFEST), 'r') as f:
+            manifest = load(f)
+        self.stoplist = manifest['stoplist']
+        self.count = manifest['documents']
+        self.pruned = pruned
+        self.ranker = BM25()
+        self.firsts = []  # the global id preceding the first document of each shard
+        self.shards = []  # (lexicon, invlists, map, docstore) of each shard
+        for shard in manifest['shards']:
+            path = os.path.join(directory, shard['name'])
+            self.firsts.append(sum(s['documents'] for s in manifest['shards'][:len(self.firsts)]))
+            self.shards.append((Lexicon(os.path.join(path, 'lexicon')), InvertedFile(os.path.join(path, 'invlists')),
+                                DocumentMap(os.path.join(path, 'map')), DocumentStore(os.path.join(path, 'docstore'))))
+        self.pool = None
+        if workers > 1 and len(self.shards) > 1:
+            self.pool = Pool(min(workers, len(self.shards)), open_shards, (directory,))
+
+    def df(self, term):
+        """
+        Returns the number of documents of the index containing a term.
+
+        :param term: a term
+        :return: the document frequency summed over the shards
+        """
+        return sum(entry.df for entry in (lexicon.get(term) for lexicon, _, _, _ in self.shards) if entry)
+
+    def search(self, query, k):
+        """
+        Returns the top-k documents for a weighted query.
+
+        The IDF weights are computed from the number of documents of the index and the document
+        frequency of each term summed over the shards. The top-k of every shard are merged in
+        order of descending score and ascending id, the order of <top_ranked>.
+
+        :param query: a list of (term, weight) tuples, where a weight of None is the BM25 IDF of the term
+        :param k: the number of top-ranked documents that should be returned
+        :return: a list of (score, id) tuples with ascending scores, with global ids
+        """
+        weighted = [(term, self.ranker.idf_term_weight(self.count, self.df(term)) if weight is None else weight)
+                    for term, weight in query]
+        if self.pool:
+            tasks = [(index, weighted, k, self.pruned) for index in range(len(self.shards))]
+            results = self.pool.map(search_shard, tasks)
+        else:
+            results = [rank_shard(shard[:3], weighted, k, self.pruned) for shard in self.shards]
+        ranked = [[(score, first + id) for score, id in reversed(top_scores)]
+                  for first, top_scores in zip(self.firsts, results)]
+        top_scores = list(islice(merge(*ranked, key=lambda top: (-top[0], top[1])), k))
+        top_scores.reverse()
+        return top_scores
+
+    def locate(self, id):
+        """
+        Returns the index of the shard of a document and its id within the shard.
+
+        :param id: the global id of a document
+        :return: a tuple of the index of the shard and the id of the document within it
+        """
+        index = bisect_right(self.firsts, id - 1) - 1
+        return index, id - self.firsts[index]
+
+    def docno(self, id):
+        """
+        Returns the docno of a document.
+
+        :param id: the global id of a document
+        :return: the docno of the document
+        """
+        index, local = self.locate(id)
+        return self.shards[index][2].docno(local)
+
+    def text(self, id):
+        """
+        Returns the text of a document from the <docstore> of its shard.
+
+        :param id: the global id of a document
+        :return: the text of the document
+        """
+        index, local = self.locate(id)
+        return self.shards[index][3].text(local)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        if self.pool:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        for lexicon, invlists, map, docstore in self.shards:
+            lexicon.close()
+            invlists.close()
+            map.close()
+            docstore.close()
+        self.shards = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+from collections import Counter
+from heapq import merge
+from itertools import groupby
+from operator import itemgetter
+from os import fdopen, remove
+from pickle import dump, load, HIGHEST_PROTOCOL
+from tempfile import mkstemp
+
+TERM_OVERHEAD = 160  # approximate bytes for a new dictionary entry, its key and its list
+POSTING_OVERHEAD = 72  # approximate bytes for an "(id, frequency)" tuple and its list slot
+
+
+class SPIMIIndexer:
+
+    def __init__(self, budget, directory=None):
+        """
+        Builds inverted lists in a single pass using a bounded amount of memory.
+
+        Postings are accumulated in a dictionary until their estimated size reaches
+        the <budget>. The dictionary is then sorted by term and flushed to a temporary
+        "run" file. Once every document has been added, the runs are combined with a
+        k-way merge so that only one term from each run is held in memory at a time.
+
+        :param budget: the memory budget for accumulated postings measured in bytes
+        :param directory: an optional directory for the temporary run files
+        """
+        self.budget = budget
+        self.directory = directory
+        self.postings = {}
+        self.size = 0
+        self.runs = []
+
+    def add_document(self, id, terms):
+        """
+        Adds the postings of a document, flushing a run if the budget is reached.
+
+        The documents must be added in ascending order of <id>.
+
+        :param id: the identifier of the document
+        :param terms: a list of terms in the document
+        """
+        for term, frequency in Counter(terms).items():
+            if term in self.postings:
+                self.postings[term].append((id, frequency))
+            else:
+                self.postings[term] = [(id, frequency)]
+                self.size += TERM_OVERHEAD + len(term)
+            self.size += POSTING_OVERHEAD
+        if self.size >= self.budget:
+            self.flush()
+
+    def add_postings(self, postings):
+        """
+        Adds a dictionary of partial postings, flushing a run if the budget is reached.
+
+        The partial postings must follow those already added in order of <id>,
+        e.g. the postings of one chunk of a <collection> built by a worker.
+
+        :param postings: a dictionary with "term" as a key and a list of (id, frequency) as a value
+        """
+        for term, term_postings in postings.items():
+            if term in self.postings:
+                self.postings[term].extend(term_postings)
+            else:
+                self.postings[term] = term_postings
+                self.size += TERM_OVERHEAD + len(term)
+            self.size += POSTING_OVERHEAD * len(term_postings)
+        if self.size >= self.budget:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the accumulated postings to a run file in order of term.
+
+        Each entry of a run file is a pickled "(term, [(id, frequency), ...])" tuple.
+        """
+        if not self.postings:
+            return
+        handle, path = mkstemp(prefix='run', dir=self.directory)
+        with fdopen(handle, 'wb') as run_file:
+            for term in sorted(self.postings):
+                dump((term, self.postings[term]), run_file, HIGHEST_PROTOCOL)
+        self.runs.append(path)
+        self.postings = {}
+        self.size = 0
+
+    @staticmethod
+    def read_run(path):
+        """
+        Yields the "(term, postings)" entries of a run file in order.
+
+        :param path: a path to a run file
+        """
+        with open(path, 'rb') as run_file:
+            while True:
+                try:
+                    yield load(run_file)
+                except EOFError:
+                    return
+
+    def merge_runs(self):
+        """
+        Yields "(term, [(id, frequency), ...])" tuples in order of term.
+
+        The postings still held in memory take part in the merge as the final run,
+        so a collection that fits within the budget is never written to disk.
+        Runs are flushed in ascending order of <id> and <merge> is stable,
+        hence concatenating the postings of a term keeps them sorted by <id>.
+        The run files are removed once the merge is complete.
+        """
+        runs = [self.read_run(path) for path in self.runs]
+        runs.append(iter(sorted(self.postings.items())))
+        try:
+            for term, entries in groupby(merge(*runs, key=itemgetter(0)), key=itemgetter(0)):
+                postings = []
+                for _, run_postings in entries:
+                    postings.extend(run_postings)
+                yield term, postings
+        finally:
+            for path in self.runs:
+                remove(path)
+            self.runs = []
+            self.postings = {}
+            self.size = 0
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import pytest
+from random import Random
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NAMES = sorted(name[:-3] for name in os.listdir(DIRECTORY) if name.endswith('.py'))
+
+# The modules of each program import each other by name, and both programs have modules of the
+# same name, so the modules of this directory are imported up front and restored before each test.
+for name in NAMES:
+    sys.modules.pop(name, None)
+sys.path.insert(0, DIRECTORY)
+MODULES = {name: __import__(name) for name in NAMES}
+
+from collection import Collection  # noqa: E402
+from docstore import DocumentStore  # noqa: E402
+from document_map import DocumentMap  # noqa: E402
+from forward import ForwardIndex  # noqa: E402
+from impacts import ImpactFile  # noqa: E402
+from inverted_file import InvertedFile  # noqa: E402
+from lexicon import Lexicon  # noqa: E402
+from positions import PositionsFile  # noqa: E402
+
+READERS = {'map': DocumentMap, 'lexicon': Lexicon, 'invlists': InvertedFile, 'docstore': DocumentStore,
+           'forward': ForwardIndex, 'impacts': ImpactFile, 'positions': PositionsFile}  # the files of an index
+
+
+def restore_modules():
+    """
+    Restores the modules of this directory, which the tests of the other program replace.
+    """
+    sys.path[:] = [DIRECTORY] + [path for path in sys.path if path != DIRECTORY]
+    sys.modules.update(MODULES)
+
+
+def pytest_collectstart(collector):
+    """
+    Restores the modules of this directory before a test module of this directory is imported.
+    """
+    restore_modules()
+
+
+@pytest.fixture(autouse=True)
+def modules():
+    """
+    Restores the modules of this directory before each test.
+    """
+    restore_modules()
+
+
+def write_collection(file_path, documents, first=1, vocabulary=400, length=80, seed=0):
+    """
+    Writes a synthetic <collection> of TREC documents with words drawn from a Zipfian distribution.
+
+    :param file_path: a path to the <collection> written
+    :param documents: the number of documents
+    :param first: the number of the docno of the first document
+    :param vocabulary: the number of distinct words
+    :param length: the mean number of words of a document
+    :param seed: the seed of the random number generator
+    """
+    random = Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = [''.join(random.choice(letters) for _ in range(random.randint(2, 7))) for _ in range(vocabulary)]
+    weights = [1.0 / rank for rank in range(1, vocabulary + 1)]
+    with open(file_path, 'w') as f:
+        for number in range(first, first + documents):
+            tokens = random.choices(words, weights, k=random.randint(1, 2 * length))
+            text = '\n'.join(' '.join(tokens[start:start + 12]) for start in range(0, len(tokens), 12))
+            f.write('<DOC>\n<DOCNO> DOC-%05d </DOCNO>\n<TEXT>\n%s\n</TEXT>\n</DOC>\n' % (number, text.capitalize()))
+
+
+def build_index(directory, collection, stoplist=None, build=Collection):
+    """
+    Writes every file of an index of a <collection> to <directory>, like <index.py> with "-i 8 -p".
+
+    :return: a dictionary of the path to each file of the index by name
+    """
+    os.makedirs(directory, exist_ok=True)
+    c = build(stoplist, directory=directory)
+    c.parse_collection(collection)
+    c.write_map_to_disk()
+    c.write_invlists_lexicon_to_disk()
+    c.write_forward_index_to_disk()
+    c.write_impacts_to_disk(8)
+    c.write_positions_to_disk()
+    return {name: os.path.join(directory, name) for name in READERS}
+
+
+@pytest.fixture(scope='session')
+def collection(tmp_path_factory):
+    """
+    Returns a path to a synthetic <collection> of 300 documents.
+    """
+    file_path = str(tmp_path_factory.mktemp('collection') / 'collection')
+    write_collection(file_path, 300)
+    return file_path
+
+
+@pytest.fixture(scope='session')
+def index(tmp_path_factory, collection):
+    """
+    Returns the paths to the files of an index of the <collection>, by name.
+    """
+    return build_index(str(tmp_path_factory.mktemp('index')), collection)
+
+
+@pytest.fixture
+def opened(index):
+    """
+    Returns the files of the <index>, opened by their readers, by name.
+    """
+    files = {name: READERS[name](file_path) for name, file_path in index.items()}
+    yield files
+    for f in files.values():
+        f.close()
+
+
+@pytest.fixture
+def collection_writer():
+    """
+    Returns <write_collection>, for the tests writing a <collection> of their own.
+    """
+    return write_collection
+
+
+@pytest.fixture
+def index_builder():
+    """
+    Returns <build_index>, for the tests building an index of their own.
+    """
+    return build_index
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+from cache import CHECK_INTERVAL, ResultCache, index_generation
+import os
+
+
+def expire(cache):
+    """
+    Lets the next lookup of a ResultCache check the files of the index again.
+    """
+    cache.checked -= CHECK_INTERVAL
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResultCache([], capacity=2)
+    cache.put('a', [['DOC-1', 1.0]])
+    cache.put('b', [['DOC-2', 2.0]])
+    assert cache.get('a') == [['DOC-1', 1.0]]
+    cache.put('c', [])
+    assert cache.get('b') is None
+    assert cache.get('c') == [] and cache.get('a') is not None
+    assert cache.report() == {'entries': 2, 'capacity': 2, 'hits': 3, 'misses': 1, 'hit_rate': 0.75,
+                              'evictions': 1, 'invalidations': 0}
+    disabled = ResultCache([], capacity=0)
+    disabled.put('a', [])
+    assert disabled.get('a') is None
+
+
+def test_invalidated_when_a_file_changes(tmp_path):
+    (tmp_path / 'lexicon').write_bytes(b'lexicon')
+    (tmp_path / 'invlists').write_bytes(b'invlists')
+    cache = ResultCache([str(tmp_path / 'lexicon'), str(tmp_path / 'invlists'), None])
+    cache.put('a', [])
+    expire(cache)
+    assert cache.get('a') == []  # nothing changed
+
+    cache.put('b', [])
+    assert os.stat(tmp_path / 'invlists').st_mtime_ns != 10 ** 9
+    os.utime(tmp_path / 'invlists', ns=(10 ** 9, 10 ** 9))
+    assert cache.get('a') == []  # not checked again within the interval
+    expire(cache)
+    assert cache.get('a') is None and cache.get('b') is None
+    assert cache.invalidations == 1
+
+    cache.put('a', [])
+    os.remove(tmp_path / 'lexicon')
+    expire(cache)
+    assert cache.get('a') is None
+    assert cache.invalidations == 2
+    assert [size for _, size, _ in index_generation(cache.file_paths)] == [len(b'invlists'), None]
+
+
+def test_persisted_for_the_same_generation(tmp_path):
+    (tmp_path / 'map').write_bytes(b'map')
+    file_paths = [str(tmp_path / 'map')]
+    cache = ResultCache(file_paths, file_path=str(tmp_path / 'cache.json'))
+    for key in 'abc':
+        cache.put(key, [[key, 1.0]])
+    cache.get('a')
+    cache.save()
+
+    loaded = ResultCache(file_paths, capacity=2, file_path=str(tmp_path / 'cache.json'))
+    assert list(loaded.entries) == ['c', 'a']  # the most recently used, in order
+
+    (tmp_path / 'map').write_bytes(b'another map')
+    stale = ResultCache(file_paths, file_path=str(tmp_path / 'cache.json'))
+    assert not stale.entries and stale.invalidations == 1
+
+    (tmp_path / 'cache.json').write_text('not json')
+    assert not ResultCache(file_paths, file_path=str(tmp_path / 'cache.json')).entries
+    assert not ResultCache(file_paths, file_path=str(tmp_path / 'missing.json')).entries
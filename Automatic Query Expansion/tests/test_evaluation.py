@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+from evaluation import average_precision, evaluate, main, ndcg, precision, read_qrels, read_run
+from math import log2
+import pytest
+import sys
+
+RANKING = ['a', 'b', 'c', 'd', 'e']
+JUDGEMENTS = {'a': 1, 'b': 0, 'c': 2, 'f': 1, 'x': 0}  # a and c are retrieved, f is not
+
+
+def test_average_precision():
+    assert average_precision(RANKING, JUDGEMENTS) == pytest.approx((1 / 1 + 2 / 3) / 3)
+    assert average_precision(['c', 'a', 'f'], JUDGEMENTS) == pytest.approx(1.0)
+    assert average_precision(['b', 'd'], JUDGEMENTS) == 0.0
+    assert average_precision([], JUDGEMENTS) == 0.0
+    assert average_precision(RANKING, {'a': 0, 'b': -1}) == 0.0
+
+
+def test_precision():
+    assert precision(RANKING, JUDGEMENTS) == pytest.approx(0.2)
+    assert precision(RANKING, JUDGEMENTS, 2) == pytest.approx(0.5)
+    assert precision(RANKING, JUDGEMENTS, 3) == pytest.approx(2 / 3)
+    assert precision([], JUDGEMENTS) == 0.0
+
+
+def test_ndcg():
+    ideal = 2 / log2(2) + 1 / log2(3) + 1 / log2(4)
+    assert ndcg(RANKING, JUDGEMENTS) == pytest.approx((1 / log2(2) + 2 / log2(4)) / ideal)
+    assert ndcg(['c'], JUDGEMENTS) == pytest.approx(1.0)  # the ideal ranking is cut at the same depth
+    assert ndcg(['b', 'c'], JUDGEMENTS) == pytest.approx((2 / log2(3)) / (2 / log2(2) + 1 / log2(3)))
+    assert ndcg(['c', 'a', 'f'], JUDGEMENTS) == pytest.approx(1.0)
+    assert ndcg(['y', 'a'], {'y': -1, 'a': 1}) == pytest.approx((1 / log2(3)) / 1)
+    assert ndcg([], JUDGEMENTS) == 0.0
+    assert ndcg(RANKING, {'a': 0}) == 0.0
+
+
+def test_evaluate_counts_unranked_topics_as_empty():
+    qrels = {'1': JUDGEMENTS, '2': {'g': 1}, '3': {'x': 0}}  # topic 3 has no relevant document and is skipped
+    result = evaluate({'1': RANKING, '4': ['a']}, qrels)
+    assert result['topics'] == 2
+    assert result['MAP'] == pytest.approx(average_precision(RANKING, JUDGEMENTS) / 2)
+    assert result['P@10'] == pytest.approx(0.1)
+    assert result['NDCG'] == pytest.approx(ndcg(RANKING, JUDGEMENTS) / 2)
+    assert evaluate({'2': ['g']}, qrels) == pytest.approx({'MAP': 0.5, 'P@10': 0.05, 'NDCG': 0.5, 'topics': 2})
+    assert evaluate({'1': RANKING}, {}) == {'MAP': 0.0, 'P@10': 0.0, 'NDCG': 0.0, 'topics': 0}
+
+
+def test_main_scores_a_run_file(tmp_path, monkeypatch, capsys):
+    (tmp_path / 'qrels').write_text('1 0 a 1\n1 0 c 2\n1 0 f 1\n1 0 x 0\n2 0 g 1\n\n')
+    (tmp_path / 'run').write_text(''.join('1 Q0 %s %d %.6f test\n' % (docno, rank, 1.0 / rank)
+                                          for rank, docno in reversed(list(enumerate(RANKING, 1)))))
+    assert read_qrels(str(tmp_path / 'qrels')) == {'1': {'a': 1, 'c': 2, 'f': 1, 'x': 0}, '2': {'g': 1}}
+    assert read_run(str(tmp_path / 'run')) == {'1': RANKING}
+    monkeypatch.setattr(sys, 'argv', ['evaluation.py', str(tmp_path / 'qrels'), str(tmp_path / 'run')])
+    main()
+    result = evaluate({'1': RANKING}, read_qrels(str(tmp_path / 'qrels')))
+    assert capsys.readouterr().out == 'MAP %.4f\nP@10 %.4f\nNDCG %.4f\ntopics 2\n' % (
+        result['MAP'], result['P@10'], result['NDCG'])
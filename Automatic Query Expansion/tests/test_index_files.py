@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+from collection import Collection, SPIMICollection, tokenize
+from collections import Counter
+from docstore import DocumentStore, DocumentStoreWriter
+from document_map import DocumentMap, DocumentMapWriter
+from forward import ForwardIndex, ForwardIndexWriter
+from inverted_file import InvertedFile
+from lexicon import Lexicon
+from pathlib import Path
+from ranking import BM25
+from trec import read_documents
+import numpy
+import pytest
+
+
+def read_postings(index):
+    """
+    Reads the inverted list of each term of an index.
+
+    :return: a dictionary of "[(id, token_frequency), ...]" by term
+    """
+    postings = {}
+    with Lexicon(index['lexicon']) as lexicon, InvertedFile(index['invlists']) as invlists:
+        for term, entry in lexicon.items():
+            ids, frequencies = invlists.postings(entry.offset)
+            postings[term] = list(zip(ids.tolist(), frequencies.tolist()))
+            assert (entry.df, entry.cf) == (len(ids), frequencies.sum())
+    return postings
+
+
+def read_files(index):
+    return {name: Path(file_path).read_bytes() for name, file_path in index.items()}
+
+
+def test_document_map(tmp_path):
+    entries = [(id, 'DOC-%d' % id, 0.5 + id / 7) for id in range(1, 101)] + [(101, 'ünïcode', 2.0)]
+    with DocumentMapWriter(str(tmp_path / 'map')) as writer:
+        for entry in entries:
+            writer.add(*entry)
+        with pytest.raises(ValueError):
+            writer.add(103, 'DOC-103', 1.0)
+    with DocumentMap(str(tmp_path / 'map')) as map:
+        assert len(map) == len(entries)
+        assert [map.docno(id) for id, _, _ in entries] == [docno for _, docno, _ in entries]
+        assert map.weights.tolist() == numpy.array([weight for _, _, weight in entries], numpy.float32).tolist()
+        assert map[50] == ('DOC-50', map.weights[49])
+
+
+def test_docstore(tmp_path):
+    texts = ['text of document %d ' % id * (id % 13) for id in range(1, 501)] + ['', 'ünïcode']
+    with DocumentStoreWriter(str(tmp_path / 'docstore'), block_size=1024) as writer:
+        for id, text in enumerate(texts, 1):
+            writer.add(id, text)
+        with pytest.raises(ValueError):
+            writer.add(1, 'again')
+    with DocumentStore(str(tmp_path / 'docstore'), capacity=2) as docstore:
+        assert len(docstore) == len(texts)
+        assert [docstore.text(id) for id in range(len(texts), 0, -1)] == texts[::-1]
+        assert len(docstore.blocks) == 2
+
+
+def test_forward_index(tmp_path):
+    vectors = [[(term_id, term_id % 4 + 1) for term_id in range(id % 5, 300, id)] for id in range(1, 60)] + [[]]
+    with ForwardIndexWriter(str(tmp_path / 'forward')) as writer:
+        for id, vector in enumerate(vectors, 1):
+            writer.add(id, vector)
+        with pytest.raises(ValueError):
+            writer.add(len(vectors) + 2, [])
+    with ForwardIndex(str(tmp_path / 'forward')) as forward:
+        assert len(forward) == len(vectors)
+        for id, vector in enumerate(vectors, 1):
+            term_ids, frequencies = forward.vector(id)
+            assert list(zip(term_ids.tolist(), frequencies.tolist())) == vector
+
+
+def test_index_matches_collection(collection, index):
+    documents = list(read_documents(collection))
+    expected = {}
+    lengths = []
+    for id, docno, text in documents:
+        terms = tokenize(text)
+        lengths.append(sum(len(term) for term in terms))
+        for term, frequency in Counter(terms).items():
+            expected.setdefault(term, []).append((id, frequency))
+    assert read_postings(index) == expected
+    weights = [BM25().document_weight(length, sum(lengths) / len(lengths)) for length in lengths]
+    with DocumentMap(index['map']) as map:
+        assert [map.docno(id) for id, _, _ in documents] == [docno for _, docno, _ in documents]
+        assert map.weights.tolist() == pytest.approx(weights)
+    with DocumentStore(index['docstore']) as docstore:
+        assert [docstore.text(id) for id, _, _ in documents] == [text for _, _, text in documents]
+    ranks = dict((term, rank) for rank, term in enumerate(sorted(expected)))
+    with ForwardIndex(index['forward']) as forward:
+        for id, _, text in documents:
+            term_ids, frequencies = forward.vector(id)
+            vector = sorted((ranks[term], frequency) for term, frequency in Counter(tokenize(text)).items())
+            assert list(zip(term_ids.tolist(), frequencies.tolist())) == vector
+
+
+def test_spimi_matches_serial(tmp_path, collection, index, index_builder):
+    spimi = index_builder(str(tmp_path / 'spimi'), collection,
+                          build=lambda stoplist, directory: SPIMICollection(stoplist, 32 * 1024, directory=directory))
+    assert read_files(spimi) == read_files(index)
+
+
+def test_workers_match_serial(tmp_path, collection, index, index_builder):
+    workers = index_builder(str(tmp_path / 'workers'), collection,
+                            build=lambda stoplist, directory: Collection(stoplist, 3, directory))
+    assert read_files(workers) == read_files(index)
+    spimi = index_builder(str(tmp_path / 'spimi_workers'), collection,
+                          build=lambda stoplist, directory: SPIMICollection(stoplist, 32 * 1024, 2, directory))
+    assert read_files(spimi) == read_files(index)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+from json import load
+from metrics import Metrics, MeteredInvertedFile, NULL_METRICS, profiled
+from pstats import Stats
+from search import main, run_query
+import sys
+
+
+def test_metrics_accumulate_and_merge():
+    metrics = Metrics()
+    metrics.add_time('first_pass', 0.5)
+    metrics.add_time('ranking', 0.25)
+    metrics.add_time('first_pass', 1.0, calls=2)
+    metrics.count('seeks')
+    metrics.count('seeks', 4)
+    with metrics.timer('output'):
+        pass
+    report = metrics.report()
+    assert list(report['stages']) == ['first_pass', 'ranking', 'output']
+    assert report['stages']['first_pass'] == {'seconds': 1.5, 'calls': 3}
+    assert report['stages']['output']['calls'] == 1 and report['stages']['output']['seconds'] >= 0
+    assert report['counters'] == {'seeks': 5}
+    merged = Metrics()
+    merged.count('accumulators', 7)
+    merged.merge(report)
+    merged.merge(report)
+    assert merged.report()['stages']['first_pass'] == {'seconds': 3.0, 'calls': 6}
+    assert merged.report()['counters'] == {'accumulators': 7, 'seeks': 10}
+    metrics.clear()
+    assert metrics.report() == {'stages': {}, 'counters': {}}
+
+
+def test_null_metrics_measure_nothing():
+    with NULL_METRICS.timer('first_pass'):
+        NULL_METRICS.count('seeks')
+        NULL_METRICS.add_time('ranking', 1.0)
+    NULL_METRICS.merge({'stages': {'ranking': {'seconds': 1.0, 'calls': 1}}, 'counters': {'seeks': 1}})
+    assert not NULL_METRICS.enabled
+    assert NULL_METRICS.report() == {'stages': {}, 'counters': {}}
+
+
+def test_metered_inverted_file_counts_reads(opened):
+    metrics = Metrics()
+    invlists = MeteredInvertedFile(opened['invlists'], metrics)
+    entries = [entry for _, entry in opened['lexicon'].items()][:3]
+    for entry in entries:
+        ids, frequencies = invlists.postings(entry.offset)
+        expected_ids, expected_frequencies = opened['invlists'].postings(entry.offset)
+        assert ids.tolist() == expected_ids.tolist() and frequencies.tolist() == expected_frequencies.tolist()
+    postings = sum(entry.df for entry in entries)
+    assert metrics.report()['counters'] == {'seeks': 3, 'postings_decoded': postings, 'bytes_read': 12 + 8 * postings}
+    assert metrics.report()['stages']['postings']['calls'] == 3
+
+
+def test_measured_query_matches_unmeasured(opened, collection):
+    query = [term for term, _ in opened['lexicon'].items()][20:23]
+    files = (opened['lexicon'], opened['invlists'], opened['map'], collection)
+    for algorithm in ('BM25', 'AQE'):
+        metrics = Metrics()
+        metered = MeteredInvertedFile(opened['invlists'], metrics)
+        expected = run_query(query, algorithm, 10, *files)
+        assert run_query(query, algorithm, 10, files[0], metered, *files[2:], metrics=metrics) == expected
+        report = metrics.report()
+        assert {'first_pass', 'ranking', 'postings'} <= set(report['stages'])
+        assert report['counters']['accumulators'] > 0
+        if algorithm == 'AQE':
+            assert {'term_selection', 'feedback', 'second_pass'} <= set(report['stages'])
+            assert report['counters']['feedback_documents'] == 10
+
+
+def test_main_writes_a_metrics_report(tmp_path, monkeypatch, capsys, index, opened, collection):
+    terms = [term for term, _ in opened['lexicon'].items()]
+    (tmp_path / 'queries').write_text('1 %s\n2 %s\n' % (terms[3], ' '.join(terms[50:52])))
+    monkeypatch.setattr(sys, 'argv', ['search.py', '-a', 'BM25', '-c', collection, '-n', '5', '-l', index['lexicon'],
+                                      '-i', index['invlists'], '-m', index['map'], '-t', str(tmp_path / 'queries'),
+                                      '-o', str(tmp_path / 'run'), '-j', str(tmp_path / 'metrics.json'),
+                                      '-J', str(tmp_path / 'profile')])
+    main()
+    with open(tmp_path / 'metrics.json') as f:
+        report = load(f)
+    assert (report['algorithm'], report['queries']) == ('BM25', 2)
+    assert report['stages']['first_pass']['calls'] == 2
+    assert report['counters']['seeks'] == 3
+    assert Stats(str(tmp_path / 'profile')).total_calls > 0
+
+
+def test_profiled_without_a_file():
+    with profiled() as profiler:
+        assert profiler is None
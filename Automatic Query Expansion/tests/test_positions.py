@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+from collection import Collection, tokenize
+from docstore import DocumentStore
+from pathlib import Path
+from positions import PositionsFile, PositionsWriter, match_positions, write_positions
+from search import parse_operators, run_batch, run_query
+import numpy
+import pytest
+
+
+def test_positions_round_trip(tmp_path):
+    frequencies = numpy.array([3, 1, 2])
+    positions = [4, 9, 30, 0, 7, 8]  # the positions of each posting in ascending order
+    gaps = [4, 5, 21, 0, 7, 1]
+    with PositionsWriter(str(tmp_path / 'positions')) as writer:
+        writer.add(0, gaps)
+        writer.add(1, [])
+        with pytest.raises(ValueError):
+            writer.add(3, [1])
+    with PositionsFile(str(tmp_path / 'positions')) as f:
+        assert len(f) == 2
+        assert f.positions(0, frequencies).tolist() == positions
+        assert f.positions(1, numpy.zeros(0, numpy.int64)).tolist() == []
+
+
+def documents(term_count, seed=0):
+    """
+    Yields random (first, terms, lengths) chunks of documents for <write_positions>.
+    """
+    random = numpy.random.default_rng(seed)
+    first = 1
+    for _ in range(20):
+        lengths = random.integers(0, 60, random.integers(1, 10))
+        yield first, random.integers(0, term_count, int(lengths.sum())), lengths
+        first += len(lengths)
+
+
+@pytest.mark.parametrize('budget', [48, 1000, 50000])
+def test_budget_does_not_change_the_file(tmp_path, budget):
+    write_positions(str(tmp_path / 'expected'), 40, documents(40))
+    write_positions(str(tmp_path / 'budgeted'), 40, documents(40), budget)
+    assert Path(tmp_path / 'budgeted').read_bytes() == Path(tmp_path / 'expected').read_bytes()
+
+
+class BudgetedCollection(Collection):
+
+    def write_positions_to_disk(self, budget=None):
+        """
+        Writes the <positions> file with a budget of 1 KB, so that every few documents are spilled to a run.
+        """
+        super().write_positions_to_disk(1024)
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_budgeted_index_matches(tmp_path, index, collection, index_builder, workers):
+    budgeted = index_builder(str(tmp_path), collection,
+                             build=lambda stoplist, directory: BudgetedCollection(stoplist, workers, directory))
+    assert Path(budgeted['positions']).read_bytes() == Path(index['positions']).read_bytes()
+
+
+def brute_force(query, window, texts):
+    """
+    Returns the ids of the documents in which the terms of a query occur as a phrase, or within a window.
+    """
+    matched = []
+    for id, terms in texts.items():
+        starts = range(len(terms))
+        if window is None:
+            found = any(terms[start:start + len(query)] == query for start in starts)
+        else:
+            found = any(all(term in terms[start:start + window + 1] for term in query) for start in starts)
+        if found:
+            matched.append(id)
+    return matched
+
+
+@pytest.fixture(scope='module')
+def texts(index):
+    """
+    Returns the terms of every document of the <index> by id.
+    """
+    with DocumentStore(index['docstore']) as docstore:
+        return {id: tokenize(docstore.text(id)) for id in range(1, len(docstore) + 1)}
+
+
+def test_match_positions(opened, texts):
+    lexicon, invlists = opened['lexicon'], opened['invlists']
+    bigrams = sorted(set((terms[0], terms[1]) for terms in texts.values() if len(terms) > 1))
+    queries = [list(bigram) for bigram in bigrams[::len(bigrams) // 8]]
+    queries += [texts[1][:3], texts[2][4:8], [texts[3][0], 'missingterm'], [texts[5][0]]]
+    for query in queries:
+        for window in (None, 1, 3, 10):
+            expected = brute_force(query, window, texts)
+            assert match_positions(query, window, lexicon, invlists, opened['positions']).tolist() == expected
+
+
+def test_parse_operators():
+    assert parse_operators('white house') == []
+    assert parse_operators('"White House" press') == [(['white', 'house'], None)]
+    assert parse_operators('"press secretary"~5 "on-campus" "" "the"', {'the'}) == [(['press', 'secretary'], 5),
+                                                                                  (['on', 'campus'], None)]
+
+
+def test_operators_restrict_results(index, opened, collection, texts):
+    queries = ['"%s %s"' % tuple(texts[1][:2]), '%s "%s %s"~5' % tuple(texts[2][5:8]), '"%s %s"' % tuple(texts[3][:2])]
+    for query in queries:
+        operators = parse_operators(query)
+        matched = None  # the documents matching every operator
+        for terms, window in operators:
+            ids = match_positions(terms, window, opened['lexicon'], opened['invlists'], opened['positions'])
+            matched = set(ids.tolist()) if matched is None else matched & set(ids.tolist())
+        for algorithm in ('BM25', 'AQE'):
+            top_scores = run_query(tokenize(query), algorithm, 10, opened['lexicon'], opened['invlists'], opened['map'],
+                                   collection, operators=operators, positions=opened['positions'])
+            assert top_scores and set(id for _, id in top_scores) <= matched
+            files = (index['lexicon'], index['invlists'], index['map'], collection)
+            [(_, results)] = run_batch([('1', query)], algorithm, 10, *files, positions=index['positions'])
+            assert results == [(opened['map'].docno(id), rank, score)
+                               for rank, (score, id) in enumerate(reversed(top_scores), 1)]
+    with pytest.raises(ValueError):
+        run_query(['a'], 'BM25', 10, opened['lexicon'], opened['invlists'], opened['map'], collection,
+                  operators=[(['a', 'b'], None)])
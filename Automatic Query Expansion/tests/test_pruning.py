@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+from impacts import score_at_a_time
+from pruning import maxscore, top_ranked
+from ranking import BM25
+from search import accumulate_similarity_scores, retrieve_top_ranked_documents, run_batch, run_query
+import numpy
+import pytest
+
+
+def queries(lexicon, count=12, seed=0):
+    """
+    Returns random queries of common, rare and missing terms of a <lexicon>.
+    """
+    random = numpy.random.default_rng(seed)
+    terms = [term for term, _ in lexicon.items()]
+    return [[str(term) for term in random.choice(terms, length)] + ['missingterm'] * (index % 4 == 0)
+            for index, length in enumerate(random.integers(1, 6, count))]
+
+
+def exhaustive(query, k, lexicon, invlists, map):
+    """
+    Ranks every document containing a term of a weighted query, summing the scores in order of query term.
+    """
+    ranker = BM25()
+    scores = numpy.zeros(len(map) + 1)
+    found = numpy.zeros(len(map) + 1, bool)
+    for term, weight in query:
+        entry = lexicon.get(term)
+        if entry:
+            ids, frequencies = invlists.postings(entry.offset)
+            weight = ranker.idf_term_weight(len(map), entry.df) if weight is None else weight
+            scores[ids] += weight * ranker.tf_term_weight(frequencies, map.weights[ids - 1].astype(numpy.float64))
+            found[ids] = True
+    ids = numpy.flatnonzero(found)
+    return top_ranked(ids, scores[ids], k)
+
+
+def test_bm25_decomposes_into_idf_and_tf():
+    ranker = BM25()
+    assert ranker.idf_term_weight(1000, 10) == pytest.approx(numpy.log(990.5 / 10.5))
+    assert ranker.tf_term_weight(3, 1.5) == pytest.approx(2.2 * 3 / 4.5)
+    assert ranker.score(1000, 10, 3, 1.5) == pytest.approx(numpy.log(990.5 / 10.5) * 2.2 * 3 / 4.5)
+    assert ranker.idf_term_weight(1000, 600) < 0
+
+
+def test_top_ranked():
+    ids = numpy.array([1, 2, 3, 4, 5, 6])
+    scores = numpy.array([0.5, 2.0, 0.5, 1.0, 2.0, 0.5])
+    assert top_ranked(ids, scores, 3) == [(1.0, 4), (2.0, 5), (2.0, 2)]
+    assert top_ranked(ids, scores, 4) == [(0.5, 1), (1.0, 4), (2.0, 5), (2.0, 2)]
+    assert top_ranked(ids, scores, 10) == [(0.5, 6), (0.5, 3), (0.5, 1), (1.0, 4), (2.0, 5), (2.0, 2)]
+    assert top_ranked(ids, scores, 0) == []
+
+
+def test_lexicon_holds_maximum_scores(opened):
+    ranker = BM25()
+    for term, entry in opened['lexicon'].items():
+        ids, frequencies = opened['invlists'].postings(entry.offset)
+        scores = ranker.tf_term_weight(frequencies, opened['map'].weights[ids - 1].astype(numpy.float64))
+        assert entry.max_score == pytest.approx(scores.max())
+
+
+@pytest.mark.parametrize('k', [1, 10, 100])
+def test_maxscore_matches_exhaustive_ranking(opened, k):
+    lexicon, invlists, map = opened['lexicon'], opened['invlists'], opened['map']
+    for query in queries(lexicon):
+        expected = retrieve_top_ranked_documents(accumulate_similarity_scores(query, lexicon, invlists, map), k)
+        assert maxscore([(term, None) for term in query], k, lexicon, invlists, map) == expected, query
+
+
+def test_weighted_maxscore_matches_exhaustive_ranking(opened):
+    lexicon, invlists, map = opened['lexicon'], opened['invlists'], opened['map']
+    random = numpy.random.default_rng(1)
+    for query in queries(lexicon, seed=1):
+        weighted = [(term, None if index == 0 else float(random.uniform(-0.5, 2))) for index, term in enumerate(query)]
+        for k in (1, 10):
+            assert maxscore(weighted, k, lexicon, invlists, map) == exhaustive(weighted, k, lexicon, invlists, map)
+
+
+def test_pruned_queries_match_exhaustive_queries(opened, collection):
+    lexicon, invlists, map = opened['lexicon'], opened['invlists'], opened['map']
+    for query in queries(lexicon, seed=3):
+        expected = run_query(query, 'BM25', 10, lexicon, invlists, map, collection)
+        assert run_query(query, 'BM25', 10, lexicon, invlists, map, collection, pruned=True) == expected
+
+
+def test_impact_ordering(opened):
+    lexicon, invlists, map, impacts = opened['lexicon'], opened['invlists'], opened['map'], opened['impacts']
+    ranker = BM25()
+    for rank, (term, entry) in enumerate(lexicon.items()):
+        segments = impacts.segments(rank)
+        assert [impact for impact, _ in segments] == sorted(set(impact for impact, _ in segments), reverse=True)
+        assert all(0 < impact < 256 for impact, _ in segments)
+        for _, ids in segments:
+            assert (numpy.diff(ids.astype(numpy.int64)) > 0).all()
+        ids, frequencies = invlists.postings(entry.offset)
+        scores = ranker.score(len(map), entry.df, frequencies, map.weights[ids - 1].astype(numpy.float64))
+        expected = numpy.minimum(numpy.ceil(scores[scores > 0] / impacts.quantum), 255)
+        assert sorted(id for _, segment_ids in segments for id in segment_ids.tolist()) == ids[scores > 0].tolist()
+        found = {id: impact for impact, segment_ids in segments for id in segment_ids.tolist()}
+        assert [found[id] for id in ids[scores > 0].tolist()] == expected.tolist()
+
+
+@pytest.mark.parametrize('k', [1, 10, 100])
+def test_score_at_a_time_matches_exhaustive_impacts(opened, k):
+    lexicon, impacts, map = opened['lexicon'], opened['impacts'], opened['map']
+    for query in queries(lexicon, seed=2):
+        accumulators = numpy.zeros(len(map) + 1, numpy.int64)
+        for term in query:
+            found = lexicon.find(term)
+            for impact, ids in impacts.segments(found[0]) if found else []:
+                accumulators[ids] += impact
+        ids = numpy.flatnonzero(accumulators)
+        expected = [(score * impacts.quantum, id) for score, id in top_ranked(ids, accumulators[ids], k)]
+        assert score_at_a_time(query, k, lexicon, impacts, len(map)) == expected, query
+
+
+def test_score_at_a_time_budget(opened):
+    lexicon, impacts, map = opened['lexicon'], opened['impacts'], opened['map']
+    query = [term for term, entry in sorted(lexicon.items(), key=lambda item: -item[1].df)[:40:8]]
+    exact = score_at_a_time(query, 10, lexicon, impacts, len(map))
+    assert score_at_a_time(query, 10, lexicon, impacts, len(map), 10 ** 9) == exact
+    partial = score_at_a_time(query, 10, lexicon, impacts, len(map), 1)
+    assert 0 < len(partial) <= 10 and partial != exact
+
+
+def test_batch_ranks_by_impacts(index, opened, collection):
+    lexicon, map = opened['lexicon'], opened['map']
+    topics = [(str(number), ' '.join(query)) for number, query in enumerate(queries(lexicon, 4, seed=4))]
+    files = (index['lexicon'], index['invlists'], index['map'], collection)
+    for label, results in run_batch(topics, 'BM25', 10, *files, impacts=index['impacts'], budget=5000):
+        top_scores = score_at_a_time(topics[int(label)][1].split(), 10, lexicon, opened['impacts'], len(map), 5000)
+        assert results == [(map.docno(id), rank, score) for rank, (score, id) in enumerate(reversed(top_scores), 1)]
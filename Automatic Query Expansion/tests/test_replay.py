@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+from json import load
+from replay import main, parse_configuration, replay, summarize
+from search import run_batch
+import pytest
+import sys
+
+
+def test_parse_configuration():
+    assert parse_configuration('BM25') == {'algorithm': 'BM25', 'pruned': False, 'budget': None, 'expansion': 'full',
+                                           'E': 25, 'pool': 1000, 'cache': 0}
+    assert parse_configuration('BM25:d,b=1000') == dict(parse_configuration('BM25'), pruned=True, budget=1000)
+    assert parse_configuration('AQE:e=rerank,E=10,P=50') == {'algorithm': 'AQE', 'pruned': False, 'budget': None,
+                                                             'expansion': 'rerank', 'E': 10, 'pool': 50, 'cache': 0}
+    assert parse_configuration('BM25:C=64') == dict(parse_configuration('BM25'), cache=64)
+    assert parse_configuration('AQE:') == parse_configuration('AQE')
+    for configuration in ('TFIDF', 'bm25', 'BM25:x', 'BM25:d=1', 'AQE:e=wide', 'AQE:E=ten', 'AQE:P=-1', 'BM25:b',
+                          'BM25:C'):
+        with pytest.raises(ValueError):
+            parse_configuration(configuration)
+
+
+def test_summarize():
+    summary = summarize([0.004, 0.001, 0.003, 0.002], 2.0)
+    assert (summary['queries'], summary['seconds'], summary['throughput']) == (4, 2.0, 2.0)
+    assert summary['latency_ms'] == pytest.approx({'mean': 2.5, 'max': 4.0, 'p50': 2.5, 'p95': 3.85, 'p99': 3.97})
+    assert summarize([0.01], 0.5)['latency_ms'] == pytest.approx({'mean': 10, 'max': 10, 'p50': 10, 'p95': 10,
+                                                                  'p99': 10})
+
+
+def topics_of(opened):
+    """
+    Returns a few (label, query) tuples of the terms of the <lexicon>.
+    """
+    terms = [term for term, _ in opened['lexicon'].items()]
+    return [(str(number), ' '.join(terms[start:start + 2])) for number, start in enumerate((0, 30, 60, 90), 1)]
+
+
+@pytest.mark.parametrize('configuration', ['BM25', 'BM25:d', 'AQE:e=fold,E=10', 'BM25:C=64', 'AQE:e=fold,E=10,C=64'])
+def test_replay_matches_run_batch(index, opened, collection, configuration):
+    topics = topics_of(opened)
+    options = parse_configuration(configuration)
+    files = (index['lexicon'], index['invlists'], index['map'], collection)
+    expected = {label: [docno for docno, _, _ in documents]
+                for label, documents in run_batch(topics, options['algorithm'], 10, *files, pruned=options['pruned'],
+                                                  expansion=options['expansion'], E=options['E'])}
+    for concurrency, rounds in ((1, 1), (2, 3)):
+        rankings, latencies, elapsed, cached = replay(topics, options, 10, files + (None,) * 5 + (False,), concurrency,
+                                                      rounds)
+        assert rankings == expected
+        assert len(latencies) == len(topics) * rounds and all(latency > 0 for latency in latencies)
+        assert elapsed > 0
+        if options['cache'] and rounds > 1:
+            assert cached >= len(topics) * (rounds - concurrency)  # each worker evaluates a query at most once
+        else:
+            assert cached == 0
+
+
+def test_replay_caches_the_results_of_each_worker(index, opened, collection):
+    topics = topics_of(opened)
+    files = (index['lexicon'], index['invlists'], index['map'], collection) + (None,) * 5 + (False,)
+    _, _, _, cached = replay(topics + topics[:1], parse_configuration('BM25:C=64'), 10, files, 1, 3)
+    assert cached == 1 + 2 * (len(topics) + 1)  # the repeat of the first round, and every query of later rounds
+    _, _, _, cached = replay(topics, parse_configuration('BM25:C=1'), 10, files, 1, 2)
+    assert cached == 0  # every query evicts the results of the previous one
+
+
+def test_main_writes_a_report(tmp_path, monkeypatch, capsys, index, opened, collection):
+    topics = topics_of(opened)
+    (tmp_path / 'queries').write_text(''.join('%s %s\n' % topic for topic in topics))
+    first = run_batch(topics[:1], 'BM25', 10, index['lexicon'], index['invlists'], index['map'], collection)
+    (tmp_path / 'qrels').write_text(''.join('1 0 %s 1\n' % docno for docno, _, _ in next(first)[1][:2]))
+    monkeypatch.setattr(sys, 'argv', ['replay.py', '-t', str(tmp_path / 'queries'), '-n', '10', '-c', collection,
+                                      '-l', index['lexicon'], '-i', index['invlists'], '-m', index['map'],
+                                      '-Q', str(tmp_path / 'qrels'), '-r', '2', '-o', str(tmp_path / 'report'),
+                                      'BM25', 'AQE:e=fold,C=16'])
+    main()
+    lines = capsys.readouterr().out.split('\n')
+    assert lines[0].startswith('BM25 ') and lines[1].startswith('AQE:e=fold,C=16 ')
+    assert 'cached' not in lines[0] and ' cached 4 ' in lines[1]
+    with open(tmp_path / 'report') as f:
+        report = load(f)
+    assert (report['topics'], report['num_results'], report['rounds']) == (4, 10, 2)
+    bm25, aqe = report['configurations']
+    assert (bm25['configuration'], bm25['queries']) == ('BM25', 8)
+    assert bm25['effectiveness'] == pytest.approx({'MAP': 1.0, 'P@10': 0.2, 'NDCG': 1.0, 'topics': 1})
+    assert aqe['effectiveness']['topics'] == 1 and aqe['cached'] == 4
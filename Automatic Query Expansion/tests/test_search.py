@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+from cache import ResultCache
+from collection import tokenize
+from inverted_file import PostingsCache
+from io import StringIO
+from ranking import BM25
+from search import (main, parse_operators, rank_expansion_terms, result_key, retrieve_top_ranked_documents, run_batch,
+                    run_query, write_run)
+import numpy
+import pytest
+import sys
+
+
+def exhaustive_scores(query, opened):
+    """
+    Scores every document containing a query term with BM25, one posting at a time.
+    """
+    scores = {}
+    for term in query:
+        entry = opened['lexicon'].get(term)
+        if entry:
+            ids, frequencies = opened['invlists'].postings(entry.offset)
+            for id, frequency in zip(ids.tolist(), frequencies.tolist()):
+                score = BM25().score(len(opened['map']), entry.df, frequency, opened['map'].weight(id))
+                scores[id] = scores.get(id, 0) + score
+    return scores
+
+
+def test_retrieve_top_ranked_documents():
+    scores = numpy.array([0.5, 3.0, 1.5, numpy.nan, 2.0, -0.1])  # document 4 contains no query term
+    assert retrieve_top_ranked_documents(scores, 3) == [(1.5, 3), (2.0, 5), (3.0, 2)]
+    assert retrieve_top_ranked_documents(scores, 10) == [(-0.1, 6), (0.5, 1), (1.5, 3), (2.0, 5), (3.0, 2)]
+    assert retrieve_top_ranked_documents(numpy.full(3, numpy.nan), 3) == []
+
+
+def test_bm25_matches_exhaustive_scores(opened, collection):
+    terms = [term for term, _ in opened['lexicon'].items()]
+    for query in ([terms[0]], terms[10:13], [terms[5], 'missingterm'], ['missingterm']):
+        scores = exhaustive_scores(query, opened)
+        top_scores = run_query(query, 'BM25', 10, opened['lexicon'], opened['invlists'], opened['map'], collection)
+        assert [score for score, _ in top_scores] == pytest.approx(sorted(scores.values())[-10:])
+        assert all(scores[id] == pytest.approx(score) for score, id in top_scores)
+
+
+def test_aqe_reranks_the_feedback_documents(opened, collection):
+    query = [term for term, _ in opened['lexicon'].items()][20:22]
+    bm25 = run_query(query, 'BM25', 10, opened['lexicon'], opened['invlists'], opened['map'], collection)
+    aqe = run_query(query, 'AQE', 10, opened['lexicon'], opened['invlists'], opened['map'], collection)
+    assert len(aqe) == len(bm25) == 10
+    assert aqe == sorted(aqe)
+    assert set(id for _, id in bm25) & set(id for _, id in aqe)
+
+
+def test_main_prints_ranked_docnos(monkeypatch, capsys, index, opened, collection):
+    query = [term for term, _ in opened['lexicon'].items()][10:13]
+    top_scores = run_query(query, 'BM25', 5, opened['lexicon'], opened['invlists'], opened['map'], collection)
+    monkeypatch.setattr(sys, 'argv', ['search.py', '-a', 'BM25', '-c', collection, '-q', '401', '-n', '5',
+                                      '-l', index['lexicon'], '-i', index['invlists'], '-m', index['map']] + query)
+    main()
+    lines = capsys.readouterr().out.split('\n')
+    assert lines[:5] == ['401 %s %d %.3f' % (opened['map'].docno(id), rank, score)
+                         for rank, (score, id) in enumerate(reversed(top_scores), 1)]
+    assert tokenize(' '.join(query).upper()) == query
+
+
+def single_results(query, algorithm, opened, collection):
+    """
+    Returns the results of a single query as (docno, rank, score) tuples.
+    """
+    top_scores = run_query(tokenize(query), algorithm, 10, opened['lexicon'], opened['invlists'], opened['map'],
+                           collection)
+    return [(opened['map'].docno(id), rank, score) for rank, (score, id) in enumerate(reversed(top_scores), 1)]
+
+
+@pytest.mark.parametrize('algorithm', ['BM25', 'AQE'])
+def test_batch_matches_single_queries(index, opened, collection, algorithm):
+    terms = [term for term, _ in opened['lexicon'].items()]
+    queries = [' '.join(terms[start:start + 3]) for start in (0, 40, 80)] + ['missingterm']
+    topics = [(str(number), query) for number, query in enumerate(queries + queries[:2], 1)]
+    expected = [(label, single_results(query, algorithm, opened, collection)) for label, query in topics]
+    files = (index['lexicon'], index['invlists'], index['map'], collection)
+    assert list(run_batch(topics, algorithm, 10, *files)) == expected
+    assert list(run_batch(topics, algorithm, 10, *files, workers=2)) == expected
+    assert list(run_batch(topics, algorithm, 10, *files, docstore=index['docstore'])) == expected
+    assert list(run_batch(topics, algorithm, 10, *files, workers=2, docstore=index['docstore'])) == expected
+    assert list(run_batch(topics, algorithm, 10, *files, forward=index['forward'])) == expected
+
+
+def test_write_run():
+    run_file = StringIO()
+    write_run([('401', [('DOC-1', 1, 2.5), ('DOC-7', 2, 1.25)]), ('402', [])], run_file, 'bm25')
+    assert run_file.getvalue() == '401 Q0 DOC-1 1 2.500000 bm25\n401 Q0 DOC-7 2 1.250000 bm25\n'
+
+
+def test_main_writes_a_run_file(tmp_path, monkeypatch, index, opened, collection):
+    terms = [term for term, _ in opened['lexicon'].items()]
+    (tmp_path / 'queries').write_text('1 %s\n2 %s\n' % (terms[3], ' '.join(terms[50:52])))
+    monkeypatch.setattr(sys, 'argv', ['search.py', '-a', 'BM25', '-c', collection, '-n', '5', '-l', index['lexicon'],
+                                      '-i', index['invlists'], '-m', index['map'], '-t', str(tmp_path / 'queries'),
+                                      '-o', str(tmp_path / 'run')])
+    main()
+    expected = StringIO()
+    write_run([('1', single_results(terms[3], 'BM25', opened, collection)[:5]),
+               ('2', single_results(' '.join(terms[50:52]), 'BM25', opened, collection)[:5])], expected, 'BM25')
+    assert (tmp_path / 'run').read_text() == expected.getvalue()
+
+
+def test_postings_cache_evicts_the_least_recently_used_list(opened):
+    entries = [entry for _, entry in opened['lexicon'].items()][:3]
+    cache = PostingsCache(opened['invlists'], capacity=2)
+    for entry in (entries[0], entries[1], entries[0], entries[2]):
+        ids, _ = cache.postings(entry.offset)
+        assert ids.tolist() == opened['invlists'].postings(entry.offset)[0].tolist()
+    assert list(cache.lists) == [entries[0].offset, entries[2].offset]
+    assert cache.postings(entries[0].offset) is cache.lists[entries[0].offset]
+
+
+def test_rank_expansion_terms():
+    statistics = [('a', 10, 2), ('b', 50, 1), ('c', 5, 1)]  # (term, f_t, r_t) with N = 100 and R = 2
+    # a: tsv = 0.1^2 * 2! / (2! 0!) = 0.01 and rsj = 0.3 * log((2.5 * 90.5) / (8.5 * 0.5))
+    # c: tsv = 0.05 * 2! / (1! 1!) = 0.1 and rsj = 0.3 * log((1.5 * 94.5) / (4.5 * 1.5)) = 0.3 * log(21)
+    # b: tsv = 0.5 * 2! / (1! 1!) = 1.0 and rsj = 0.3 * log((1.5 * 49.5) / (49.5 * 1.5)) = 0
+    assert rank_expansion_terms(statistics, 100, 2, 2) == [(-0.1, 'c', pytest.approx(0.3 * numpy.log(21))),
+                                                           (pytest.approx(-0.01), 'a', pytest.approx(1.1924165))]
+    assert [term for _, term, _ in rank_expansion_terms(statistics, 100, 2, 5)] == ['b', 'c', 'a']
+    assert rank_expansion_terms(statistics, 100, 2, 0) == []
+
+
+@pytest.mark.parametrize('E', [0, 5, 25])
+def test_expansion_modes(index, opened, collection, E):
+    terms = [term for term, _ in opened['lexicon'].items()]
+    topics = [(str(number), ' '.join(terms[start:start + 2])) for number, start in enumerate((0, 25, 70, 140))]
+    files = (index['lexicon'], index['invlists'], index['map'], collection)
+    full = list(run_batch(topics, 'AQE', 10, *files, E=E))
+    assert list(run_batch(topics, 'AQE', 10, *files, expansion='fold', E=E)) == full
+    assert list(run_batch(topics, 'AQE', 10, *files, expansion='fold', E=E, pruned=True)) == full
+    rerank = list(run_batch(topics, 'AQE', 10, *files, expansion='rerank', E=E, pool=len(opened['map'])))
+    assert [(label, [(docno, rank) for docno, rank, _ in results]) for label, results in rerank] == \
+        [(label, [(docno, rank) for docno, rank, _ in results]) for label, results in full]
+    bm25 = list(run_batch(topics, 'BM25', 10, *files))
+    for (_, results), (_, pool) in zip(run_batch(topics, 'AQE', 10, *files, expansion='rerank', E=E, pool=10), bm25):
+        assert set(docno for docno, _, _ in results) == set(docno for docno, _, _ in pool)  # only the pool is reranked
+    if E == 0:
+        assert full == bm25
+
+
+def test_cache_gives_identical_results(tmp_path, index, opened, collection):
+    terms = [term for term, _ in opened['lexicon'].items()]
+    queries = [' '.join(terms[start:start + 2]) for start in (0, 30, 60, 90)] + ['missingterm']
+    topics = [(str(number), query) for number, query in enumerate(queries + queries[:2], 1)]
+    files = (index['lexicon'], index['invlists'], index['map'], collection)
+    expected = list(run_batch(topics, 'AQE', 10, *files))
+    cache = ResultCache(index.values(), file_path=str(tmp_path / 'cache.json'))
+    assert list(run_batch(topics, 'AQE', 10, *files, cache=cache)) == expected
+    assert (cache.hits, cache.misses, len(cache.entries)) == (0, len(queries), len(queries))
+    cache.save()
+
+    cache = ResultCache(index.values(), file_path=str(tmp_path / 'cache.json'))
+    assert list(run_batch(topics, 'AQE', 10, *files, cache=cache)) == expected
+    assert (cache.hits, cache.misses) == (len(queries), 0)
+    assert list(run_batch(topics, 'AQE', 10, *files, cache=cache, E=5)) != expected  # a different key
+    assert list(run_batch(topics, 'BM25', 10, *files, cache=cache)) == list(run_batch(topics, 'BM25', 10, *files))
+
+
+def test_result_key():
+    query, operators = tokenize('White House'), parse_operators('"white house"~3')
+    assert result_key(query, [], 'BM25', 10) == result_key(tokenize('white, house!'), [], 'BM25', 10)
+    assert result_key(query, [], 'BM25', 10) != result_key(query[::-1], [], 'BM25', 10)
+    assert result_key(query, [], 'BM25', 10) != result_key(query, operators, 'BM25', 10)
+    assert result_key(query, [], 'BM25', 10) != result_key(query, [], 'BM25', 20)
+    assert result_key(query, [], 'AQE', 10, expansion='rerank') != result_key(query, [], 'AQE', 10, expansion='rerank',
+                                                                              pool=50)
+    assert result_key(query, [], 'BM25', 10, pool=50) == result_key(query, [], 'BM25', 10)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+from document_map import DocumentMap
+from inverted_file import InvertedFile
+from lexicon import Lexicon
+from pruning import maxscore
+from search import main, run_query, run_segmented_batch, run_segmented_query
+from segments import SegmentedIndex, add_segment, delete_documents, merge_segments, read_manifest
+import os
+import pytest
+import sys
+
+
+@pytest.fixture
+def batches(tmp_path, collection_writer):
+    """
+    Returns the paths to six <collection> files of 40 documents each, numbered in order.
+    """
+    paths = []
+    for number in range(6):
+        paths.append(str(tmp_path / ('batch-%d' % number)))
+        collection_writer(paths[-1], 40, first=40 * number + 1, seed=number)
+    return paths
+
+
+def single_index(directory, paths, index_builder, deleted=()):
+    """
+    Returns the Lexicon, InvertedFile and DocumentMap of a single index of the documents of several
+    <collection> files, leaving out the <deleted> docnos.
+    """
+    os.makedirs(directory)
+    collection = os.path.join(directory, 'collection')
+    with open(collection, 'w') as f:
+        for path in paths:
+            with open(path) as batch:
+                f.writelines(document + '</DOC>\n' for document in batch.read().split('</DOC>\n')[:-1]
+                             if not any(docno in document for docno in deleted))
+    index = index_builder(directory, collection)
+    return Lexicon(index['lexicon']), InvertedFile(index['invlists']), DocumentMap(index['map'])
+
+
+def queries(single):
+    """
+    Returns queries of three terms spread over the <lexicon> of a single index.
+    """
+    terms = [term for term, _ in single[0].items()]
+    return [terms[index::53][:3] for index in range(12)]
+
+
+def assert_same_ranking(segmented, single, k=10):
+    """
+    Asserts that a SegmentedIndex ranks the documents like a single index, with scores equal up to rounding.
+    """
+    lexicon, invlists, map = single
+    for query in queries(single):
+        weighted = [(term, None) for term in query]
+        ranked = segmented.search(weighted, k)
+        expected = maxscore(weighted, k, lexicon, invlists, map)
+        assert [segmented.docno(id) for _, id in ranked] == [map.docno(id) for _, id in expected], query
+        assert [score for score, _ in ranked] == pytest.approx([score for score, _ in expected], rel=1e-5)
+
+
+def test_matches_single_index(tmp_path, batches, index_builder):
+    directory = str(tmp_path / 'segmented')
+    for path in batches:
+        add_segment(directory, path)
+    assert len(read_manifest(directory)['segments']) == 6
+    single = single_index(str(tmp_path / 'single'), batches, index_builder)
+    with SegmentedIndex(directory) as segmented:
+        assert len(segmented) == 240
+        assert segmented.docno(41) == 'DOC-00041'
+        assert_same_ranking(segmented, single)
+
+    assert merge_segments(directory) == 1  # the first four segments
+    manifest = read_manifest(directory)
+    segments = [(segment['documents'], segment['level']) for segment in manifest['segments']]
+    assert segments == [(160, 1), (40, 0), (40, 0)]
+    names = [segment['name'] for segment in manifest['segments']]
+    assert sorted(name for name in os.listdir(directory) if name.startswith('segment-')) == sorted(names)
+    with SegmentedIndex(directory) as segmented:
+        assert segmented.docno(41) == 'DOC-00041'
+        assert_same_ranking(segmented, single)
+
+
+def test_tombstones(tmp_path, batches, index_builder):
+    directory = str(tmp_path / 'segmented')
+    for path in batches[:4]:
+        add_segment(directory, path)
+    deleted = ['DOC-%05d' % number for number in (2, 3, 45, 100, 101, 102, 160)]
+    assert delete_documents(directory, deleted + ['DOC-99999']) == len(deleted)
+    assert delete_documents(directory, deleted) == 0
+    manifest = read_manifest(directory)
+    assert [segment['deleted'] for segment in manifest['segments']] == [[2, 3], [5], [20, 21, 22], [40]]
+
+    live = single_index(str(tmp_path / 'live'), batches[:4], index_builder, deleted)
+    with SegmentedIndex(directory) as segmented:
+        for query in queries(live):
+            ranked = segmented.search([(term, None) for term in query], 1000)
+            assert ranked and not set(segmented.docno(id) for _, id in ranked) & set(deleted)
+
+    assert merge_segments(directory) == 1
+    manifest = read_manifest(directory)
+    segments = [(segment['documents'], segment['deleted']) for segment in manifest['segments']]
+    assert segments == [(160 - len(deleted), [])]
+    with SegmentedIndex(directory) as segmented:
+        assert_same_ranking(segmented, live)
+
+
+def test_expansion_matches_single_index(tmp_path, batches, index_builder):
+    directory = str(tmp_path / 'segmented')
+    for path in batches[:3]:
+        add_segment(directory, path)
+    single = single_index(str(tmp_path / 'single'), batches[:3], index_builder)
+    lexicon, invlists, map = single
+    collection = str(tmp_path / 'single' / 'collection')
+    topics = [(str(number), ' '.join(query)) for number, query in enumerate(queries(single))]
+    with SegmentedIndex(directory) as segmented:
+        for label, results in run_segmented_batch(topics, 'AQE', 10, segmented, 10):
+            query = topics[int(label)][1].split()
+            expected = run_query(query, 'AQE', 10, lexicon, invlists, map, collection, expansion='fold', E=10)
+            assert [docno for docno, _, _ in results] == [map.docno(id) for _, id in reversed(expected)], query
+
+
+@pytest.fixture
+def segmented(tmp_path, batches):
+    """
+    Returns the directory of a segmented index of the first two <batches>.
+    """
+    directory = str(tmp_path / 'segmented')
+    for path in batches[:2]:
+        add_segment(directory, path)
+    return directory
+
+
+def test_main_searches_a_segmented_index(monkeypatch, capsys, segmented):
+    with SegmentedIndex(segmented) as index:
+        query = [term for term, _ in index.segments[0][1].items()][10:12]
+        top_scores = run_segmented_query(query, 'AQE', 5, index)
+        expected = ['401 %s %d %.3f' % (index.docno(id), rank, score)
+                    for rank, (score, id) in enumerate(reversed(top_scores), 1)]
+    monkeypatch.setattr(sys, 'argv', ['search.py', '-a', 'AQE', '-q', '401', '-n', '5', '-S', segmented] + query)
+    main()
+    assert capsys.readouterr().out.split('\n')[:5] == expected
+
+
+@pytest.mark.parametrize('options', [['-w', '2'], ['-d'], ['-p', 'impacts'], ['-b', '100'], ['-D', 'docstore'],
+                                     ['-F', 'forward'], ['-x', 'positions'], ['-e', 'rerank'], ['-P', '50'],
+                                     ['"white house"'], ['"white house"~3']])
+def test_main_rejects_unsupported_options(monkeypatch, capsys, segmented, options):
+    arguments = ['search.py', '-a', 'AQE', '-q', '401', '-n', '5', '-S', segmented]
+    monkeypatch.setattr(sys, 'argv', arguments + options + ['white', 'house'])
+    with pytest.raises(SystemExit):
+        main()
+    assert 'does not support' in capsys.readouterr().err
+
+
+def test_main_rejects_operators_in_topics(tmp_path, monkeypatch, capsys, segmented):
+    (tmp_path / 'queries').write_text('1 white house\n2 "white house" washington\n')
+    monkeypatch.setattr(sys, 'argv', ['search.py', '-a', 'BM25', '-n', '5', '-S', segmented,
+                                      '-t', str(tmp_path / 'queries')])
+    with pytest.raises(SystemExit):
+        main()
+    assert 'does not support phrase and proximity queries' in capsys.readouterr().err
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+from asyncio import CancelledError, new_event_loop
+from client import main
+from docstore import DocumentStore
+from json import dumps, loads
+from search import parse_operators, run_query
+from server import QueryServer
+from socket import socket, AF_UNIX
+from threading import Thread
+from tokenizer import tokenize
+from time import sleep
+import pytest
+import sys
+
+
+@pytest.fixture
+def server(index, collection):
+    server = QueryServer(index['lexicon'], index['invlists'], index['map'], collection, threads=2)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def socket_path(tmp_path, server):
+    """
+    Runs the <server> on a Unix socket in a background thread, returning the path of the socket.
+    """
+    async def serve():
+        try:
+            await server.serve(path)
+        except CancelledError:
+            pass
+
+    path = str(tmp_path / 'socket')
+    loop = new_event_loop()
+    task = loop.create_task(serve())
+    thread = Thread(target=loop.run_until_complete, args=(task,))
+    thread.start()
+    while not (tmp_path / 'socket').exists():
+        sleep(0.01)
+    yield path
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join()
+    loop.close()
+
+
+def test_search_matches_run_query(server, opened, collection):
+    terms = [term for term, _ in opened['lexicon'].items()][10:13]
+    for algorithm in ('BM25', 'AQE'):
+        top_scores = run_query(terms, algorithm, 7, opened['lexicon'], opened['invlists'], opened['map'], collection)
+        response = server.search({'a': algorithm, 'q': '401', 'n': 7, 'query': ' '.join(terms).upper()})
+        assert response['q'] == '401'
+        assert response['results'] == [[opened['map'].docno(id), rank, round(score, 3)]
+                                       for rank, (score, id) in enumerate(reversed(top_scores), 1)]
+        assert server.search({'a': algorithm, 'q': '401', 'n': 7, 'query': terms})['results'] == response['results']
+    with pytest.raises(ValueError):
+        server.search({'a': 'TFIDF', 'query': 'a', 'n': 1})
+
+
+def test_search_passes_the_expansion_options(server, opened, collection):
+    terms = [term for term, _ in opened['lexicon'].items()][40:42]
+    top_scores = run_query(terms, 'AQE', 5, opened['lexicon'], opened['invlists'], opened['map'], collection,
+                           expansion='rerank', E=3, pool=20)
+    response = server.search({'a': 'AQE', 'n': 5, 'query': terms, 'e': 'rerank', 'E': 3, 'P': 20})
+    assert [docno for docno, _, _ in response['results']] == [opened['map'].docno(id) for _, id in reversed(top_scores)]
+    with pytest.raises(ValueError):
+        server.search({'a': 'AQE', 'n': 5, 'query': terms, 'e': 'expand'})
+
+
+@pytest.mark.parametrize('option', ['docstore', 'forward'])
+def test_search_with_a_docstore_or_forward_index(server, index, collection, option):
+    terms = [term for term, _ in server.lexicon.items()][30:33]
+    other = QueryServer(index['lexicon'], index['invlists'], index['map'], collection, **{option: index[option]})
+    try:
+        request = {'a': 'AQE', 'q': '401', 'n': 10, 'query': ' '.join(terms)}
+        assert other.search(request)['results'] == server.search(request)['results']
+    finally:
+        other.close()
+
+
+def test_phrase_queries_with_a_positions_file(server, index, opened, collection):
+    with DocumentStore(index['docstore']) as docstore:
+        terms = tokenize(docstore.text(50))[3:5]
+    query = '"%s %s" %s' % (terms[0], terms[1], terms[0])
+    top_scores = run_query(tokenize(query), 'BM25', 10, opened['lexicon'], opened['invlists'], opened['map'],
+                           collection, operators=parse_operators(query), positions=opened['positions'])
+    other = QueryServer(index['lexicon'], index['invlists'], index['map'], collection, positions=index['positions'])
+    try:
+        response = other.search({'a': 'BM25', 'n': 10, 'query': query})
+        assert [docno for docno, _, _ in response['results']] == [opened['map'].docno(id)
+                                                                  for _, id in reversed(top_scores)]
+        assert opened['map'].docno(50) in [docno for docno, _, _ in response['results']]
+    finally:
+        other.close()
+    with pytest.raises(ValueError):
+        server.search({'a': 'BM25', 'n': 10, 'query': query})
+
+
+def test_cached_responses(index, opened, collection):
+    terms = [term for term, _ in opened['lexicon'].items()][10:13]
+    server = QueryServer(index['lexicon'], index['invlists'], index['map'], collection, cache=2)
+    try:
+        request = {'a': 'AQE', 'q': '401', 'n': 7, 'query': ' '.join(terms)}
+        first = server.search(request)
+        second = server.search(dict(request, q='402', query=' '.join(terms).upper()))
+        assert (first['cached'], second['cached']) == (False, True)
+        assert (second['q'], second['results']) == ('402', first['results'])
+        assert server.search(dict(request, E=5))['cached'] is False
+        assert server.search({'q': '403', 'stats': True}) == {'q': '403', 'cache': {
+            'entries': 2, 'capacity': 2, 'hits': 1, 'misses': 2, 'hit_rate': 1 / 3, 'evictions': 0,
+            'invalidations': 0}}
+    finally:
+        server.close()
+
+
+def test_requests_over_a_socket(socket_path, server):
+    terms = [term for term, _ in server.lexicon.items()][10:13]
+    requests = [{'a': 'BM25', 'q': '1', 'n': 3, 'query': ' '.join(terms)},
+                {'a': 'TFIDF', 'q': '2', 'n': 3, 'query': 'a'}, {'q': '3'}, 'not a request']
+    with socket(AF_UNIX) as connection, connection.makefile('rwb') as stream:
+        connection.connect(socket_path)
+        for request in requests:
+            stream.write(dumps(request).encode('utf-8') + b'\n')
+        stream.write(b'{not json\n')
+        stream.flush()
+        responses = [loads(stream.readline()) for _ in range(len(requests) + 1)]
+    assert responses[0]['results'] == server.search(requests[0])['results']
+    assert [response['q'] for response in responses] == ['1', '2', '3', None, None]
+    assert all('error' in response for response in responses[1:])
+    assert all(response['latency_ms'] >= 0 for response in responses)
+
+
+def test_client_prints_results(monkeypatch, capsys, socket_path, server):
+    terms = [term for term, _ in server.lexicon.items()][10:13]
+    results = server.search({'a': 'BM25', 'q': '401', 'n': 4, 'query': ' '.join(terms)})['results']
+    monkeypatch.setattr(sys, 'argv', ['client.py', '-a', 'BM25', '-q', '401', '-n', '4', '-u', socket_path] + terms)
+    main()
+    lines = capsys.readouterr().out.split('\n')
+    assert lines[:4] == ['401 %s %d %.3f' % (docno, rank, score) for docno, rank, score in results]
+    assert lines[5].startswith('Latency: ')
+
+
+def test_client_rejects_a_non_integer_count(monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['client.py', '-a', 'BM25', '-q', '401', '-n', 'ten', 'cat'])
+    with pytest.raises(SystemExit):
+        main()
+    assert "invalid int value: 'ten'" in capsys.readouterr().err
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+from pruning import maxscore
+from search import main, run_segmented_query
+from shards import ShardedIndex, build_shards, partition_collection
+import json
+import os
+import pytest
+import sys
+
+
+@pytest.fixture(scope='module')
+def sharded(tmp_path_factory, collection):
+    directory = str(tmp_path_factory.mktemp('sharded'))
+    build_shards(directory, collection, 3)
+    return directory
+
+
+def test_partition_collection(collection):
+    size = os.path.getsize(collection)
+    for count in (1, 3, 7):
+        partitions = partition_collection(collection, count)
+        assert len(partitions) == count
+        assert partitions[0][0] == 0 and partitions[-1][1] == size
+        assert all(end == start for (_, end), (start, _) in zip(partitions, partitions[1:]))
+        with open(collection, 'rb') as f:
+            for start, _ in partitions:
+                f.seek(start)
+                assert f.read(5) == b'<DOC>'
+
+
+def test_manifest(sharded, opened):
+    with open(os.path.join(sharded, 'shards')) as f:
+        manifest = json.load(f)
+    assert [shard['name'] for shard in manifest['shards']] == ['shard-001', 'shard-002', 'shard-003']
+    assert sum(shard['documents'] for shard in manifest['shards']) == manifest['documents'] == len(opened['map'])
+
+
+@pytest.mark.parametrize('workers, pruned', [(1, False), (1, True), (2, False)])
+def test_matches_single_index(sharded, opened, workers, pruned):
+    lexicon, invlists, map = opened['lexicon'], opened['invlists'], opened['map']
+    terms = [term for term, _ in lexicon.items()]
+    queries = [terms[index::97][:4] for index in range(10)] + [[terms[5], 'missingterm']]
+    with ShardedIndex(sharded, workers, pruned) as index:
+        assert len(index) == len(map)
+        assert [index.docno(id) for id in range(1, len(map) + 1)] == [map.docno(id) for id in range(1, len(map) + 1)]
+        assert index.text(17) == opened['docstore'].text(17)
+        for query in queries:
+            assert index.df(query[0]) == lexicon[query[0]].df
+            for k in (1, 10, 1000):
+                weighted = [(term, None) for term in query]
+                assert index.search(weighted, k) == maxscore(weighted, k, lexicon, invlists, map), query
+        weighted = [(queries[0][0], 1.5), (queries[1][0], -0.2), (queries[2][0], None)]
+        assert index.search(weighted, 10) == maxscore(weighted, 10, lexicon, invlists, map)
+        assert len(run_segmented_query(queries[0], 'AQE', 10, index)) == 10
+
+
+def test_budget_does_not_change_the_shards(tmp_path, sharded, collection):
+    build_shards(str(tmp_path), collection, 3, budget=32 * 1024)
+    for shard in ('shard-001', 'shard-002', 'shard-003'):
+        for name in ('map', 'lexicon', 'invlists', 'docstore', 'forward'):
+            with open(os.path.join(sharded, shard, name), 'rb') as expected, open(tmp_path / shard / name, 'rb') as f:
+                assert f.read() == expected.read(), (shard, name)
+
+
+@pytest.mark.parametrize('options', [[], ['-w', '2', '-d']])
+def test_main_searches_a_sharded_index(monkeypatch, capsys, sharded, opened, options):
+    query = [term for term, _ in opened['lexicon'].items()][10:12]
+    with ShardedIndex(sharded) as index:
+        top_scores = run_segmented_query(query, 'AQE', 5, index)
+        expected = ['401 %s %d %.3f' % (index.docno(id), rank, score)
+                    for rank, (score, id) in enumerate(reversed(top_scores), 1)]
+    arguments = ['search.py', '-a', 'AQE', '-q', '401', '-n', '5', '-H', sharded]
+    monkeypatch.setattr(sys, 'argv', arguments + options + query)
+    main()
+    assert capsys.readouterr().out.split('\n')[:5] == expected
+
+
+@pytest.mark.parametrize('options', [['-p', 'impacts'], ['-b', '100'], ['-D', 'docstore'], ['-F', 'forward'],
+                                     ['-x', 'positions'], ['-e', 'rerank'], ['-P', '50'], ['"white house"'],
+                                     ['"white house"~3']])
+def test_main_rejects_unsupported_options(monkeypatch, capsys, sharded, options):
+    arguments = ['search.py', '-a', 'AQE', '-q', '401', '-n', '5', '-H', sharded]
+    monkeypatch.setattr(sys, 'argv', arguments + options + ['white', 'house'])
+    with pytest.raises(SystemExit):
+        main()
+    assert 'a sharded index does not support' in capsys.readouterr().err
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+from topics import read_topics
+
+TOPICS = '''<top>
+<num> Number: 401
+<title> foreign minorities, Germany
+
+<desc> Description:
+What language and cultural differences
+impede the integration of foreign minorities in Germany?
+
+<narr> Narrative:
+A relevant document will focus on the causes.
+</top>
+
+
+<top>
+<num> Number: 402
+<title> behavioral genetics
+<desc> Description:
+What is happening in the field of behavioral genetics?
+</top>
+'''
+
+
+def read(file_path, field='title'):
+    """
+    Returns the topics of a file with the whitespace of each query normalized, as it is ignored by the tokenizer.
+    """
+    return [(label, ' '.join(query.split())) for label, query in read_topics(file_path, field)]
+
+
+def test_reads_title_by_default(tmp_path):
+    (tmp_path / 'topics').write_text(TOPICS)
+    assert read(str(tmp_path / 'topics')) == [('401', 'foreign minorities, Germany'), ('402', 'behavioral genetics')]
+
+
+def test_reads_fields_spanning_lines(tmp_path):
+    (tmp_path / 'topics').write_text(TOPICS)
+    assert read(str(tmp_path / 'topics'), 'desc') == [
+        ('401', 'What language and cultural differences impede the integration of foreign minorities in Germany?'),
+        ('402', 'What is happening in the field of behavioral genetics?'),
+    ]
+    assert read(str(tmp_path / 'topics'), 'narr') == [('401', 'A relevant document will focus on the causes.'),
+                                                      ('402', '')]
+
+
+def test_reads_a_query_log(tmp_path):
+    (tmp_path / 'queries').write_text('1 white house\n2   press secretary \n\n3\nq4 a\n')
+    assert read_topics(str(tmp_path / 'queries')) == [('1', 'white house'), ('2', 'press secretary '), ('q4', 'a')]
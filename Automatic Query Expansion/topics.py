@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+
+def read_topics(file_path, field='title'):
+    """
+    Returns the queries of a topics file as a list of (label, query) tuples.
+
+    A TREC topics file is a sequence of "<top>" blocks:
+
+    > <top>
+    > <num> Number: 401
+    > <title> foreign minorities, Germany
+    > <desc> Description: ...
+    > </top>
+
+    The "<num>" of each topic is its label and the text of the chosen <field> is its query,
+    where a field may span several lines until the next tag. A file without "<top>" blocks
+    is instead read as a query log with one "<label> <queryterm-1> ... <queryterm-N>" per line.
+
+    :param file_path: a path to a topics file or query log
+    :param field: the field used as the query, one of "title", "desc" or "narr"
+    :return: a list of (label, query) tuples in order of appearance
+    """
+    with open(file_path, 'r') as f:
+        lines = f.read().splitlines()
+    if not any(line.strip() == '<top>' for line in lines):
+        return [tuple(line.split(None, 1)) for line in lines if len(line.split(None, 1)) == 2]
+
+    topics = []
+    label = None
+    fields = {}
+    current = None
+    for line in lines:
+        stripped = line.strip()
+        if stripped == '<top>':
+            label, fields, current = None, {}, None
+        elif stripped == '</top>':
+            topics.append((label, ' '.join(fields.get(field, []))))
+        elif stripped.startswith('<num>'):
+            label = stripped[5:].replace('Number:', '').strip()
+            current = None
+        elif stripped.startswith('<') and '>' in stripped:
+            current = stripped[1:stripped.index('>')]
+            text = stripped[stripped.index('>') + 1:].replace('Description:', '').replace('Narrative:', '')
+            fields[current] = [text.strip()]
+        elif current:
+            fields[current].append(stripped)
+    return topics
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+from io import BytesIO, TextIOWrapper
+
+CHUNK_SIZE = 16 * 1024 * 1024  # the largest chunk handed to a single worker, measured in bytes
+
+
+def parse_documents(lines, docnos=None, id=0):
+    """
+    Yields the documents found in an iterable of lines one at a time as (id, docno, text) tuples.
+
+    > begin <appending> if line equals "<TEXT>" or "<HEADLINE>"
+    > stop <appending> if line equals "</TEXT>" or "</HEADLINE>"
+    > buffers the line if <appending> and not a tag ELSE
+    > assigns <docno> if it encounters a <DOCNO></DOCNO> tag ELSE
+    > resets the buffer if line equals "<DOC>"
+    > joins the buffer into <text> if line equals "</DOC>" and increments <id>
+
+    Lines are buffered in a list and joined once per document rather than
+    concatenated, and only the current document is held in memory.
+    The <id> counts every document in the lines, including skipped ones.
+
+    :param lines: an iterable of lines from a <collection>
+    :param docnos: an optional set of docnos, other documents are skipped without buffering
+    :param id: the <id> of the document preceding the first document in the lines
+    :return: a generator of (id, docno, text) tuples
+    """
+    docno = ''
+    buffer = []
+    appending = False
+    wanted = True
+    for line in lines:
+        if line == '<TEXT>\n' or line == '<HEADLINE>\n':
+            appending = wanted
+        elif line == '</TEXT>\n' or line == '</HEADLINE>\n':
+            appending = False
+        elif appending and not line.startswith('<'):
+            buffer.append(line)
+        elif line.startswith('<DOCNO>'):
+            docno = line[8:-10]  # captures the string between the "DOCNO" tags without white spaces
+            wanted = docnos is None or docno in docnos
+        elif line == '<DOC>\n':
+            buffer = []
+        elif line == '</DOC>\n':
+            id += 1
+            if wanted:
+                yield id, docno, ''.join(buffer)
+
+
+def read_documents(sourcefile, docnos=None):
+    """
+    Yields the documents of a <collection> one at a time as (id, docno, text) tuples.
+
+    :param sourcefile: a path to a <collection>
+    :param docnos: an optional set of docnos, other documents are skipped without buffering
+    :return: a generator of (id, docno, text) tuples
+    """
+    with open(sourcefile, 'r') as f:
+        for document in parse_documents(f, docnos):
+            yield document
+
+
+def split_collection(sourcefile, chunk_size=CHUNK_SIZE):
+    """
+    Splits a <collection> into chunks of roughly <chunk_size> bytes at "<DOC>" boundaries.
+
+    Each chunk is extended past <chunk_size> until the next "<DOC>" line so that
+    no document spans two chunks. The documents of each chunk are counted so that
+    every chunk can be assigned the <id> of the document preceding it.
+
+    :param sourcefile: a path to a <collection>
+    :param chunk_size: the approximate size of a chunk measured in bytes
+    :return: a list of (start, end, id) tuples of byte-offsets and the preceding <id>
+    """
+    chunks = []
+    id = 0
+    with open(sourcefile, 'rb') as f:
+        start = 0
+        data = f.read(chunk_size)
+        while data:
+            data += f.readline()  # completes the final line of the chunk
+            while True:
+                line = f.readline()
+                if not line or line == b'<DOC>\n':
+                    break
+                data += line
+            end = start + len(data)
+            chunks.append((start, end, id))
+            id += data.count(b'\n</DOC>\n') + data.startswith(b'</DOC>\n')
+            f.seek(end)
+            start = end
+            data = f.read(chunk_size)
+    return chunks
+
+
+def read_chunk(sourcefile, start, end):
+    """
+    Returns the lines of a chunk of a <collection> as a text stream.
+
+    :param sourcefile: a path to a <collection>
+    :param start: the byte-offset of the first line in the chunk
+    :param end: the byte-offset following the last line in the chunk
+    :return: a text stream over the chunk
+    """
+    with open(sourcefile, 'rb') as f:
+        f.seek(start)
+        return TextIOWrapper(BytesIO(f.read(end - start)))
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from collection import Collection, Document
+from json import dump, load
+from multiprocessing import Pool
+from os import chdir, getcwd, path
+from platform import python_version
+from resource import getrusage, RUSAGE_SELF
+from string import ascii_lowercase
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from trec import read_documents
+import numpy
+
+SCALES = (1000, 10000, 50000)  # the numbers of documents of the collections benchmarked by default
+VOCABULARY = 50000
+EXPONENT = 1.1  # the exponent <s> of the Zipfian distribution, where the word of rank r is drawn with weight 1 / r^s
+LENGTH = 250  # the mean number of words in the text of a document
+HEADLINE = 8
+LINE = 15  # the number of words in a line of text
+STAGES = ('parse', 'tokenize', 'postings', 'write_raw', 'write_vbyte')
+
+
+def generate_vocabulary(size, random):
+    """
+    Returns a list of distinct random lowercase words, shorter words first.
+
+    :param size: the number of words
+    :param random: a numpy random Generator
+    :return: a list of words, where the word at index r has rank r + 1
+    """
+    words = set()
+    letters = numpy.array(list(ascii_lowercase))
+    while len(words) < size:
+        length = int(random.integers(2, 11))
+        words.add(''.join(letters[random.integers(0, 26, length)]))
+    return sorted(words, key=lambda word: (len(word), word))
+
+
+def generate_collection(file_path, documents, vocabulary=VOCABULARY, exponent=EXPONENT, length=LENGTH, seed=0):
+    """
+    Writes a synthetic <collection> in the TREC format of "latimes".
+
+    Every document has a <DOCNO>, a <HEADLINE> of capitalised words and a <TEXT> of lines of
+    words drawn from a Zipfian distribution over the vocabulary, with a Poisson number of words.
+    Some words are followed by punctuation, joined by a hyphen or given an apostrophe, so that
+    every rule of <tokenize> is exercised. The same arguments always write the same file.
+
+    :param file_path: a path to the <collection> written
+    :param documents: the number of documents
+    :param vocabulary: the number of distinct words
+    :param exponent: the exponent of the Zipfian distribution
+    :param length: the mean number of words in the text of a document
+    :param seed: the seed of the random number generator
+    """
+    random = numpy.random.default_rng(seed)
+    words = numpy.array(generate_vocabulary(vocabulary, random), object)
+    weights = 1.0 / numpy.arange(1, vocabulary + 1) ** exponent
+    cumulative = numpy.cumsum(weights / weights.sum())
+    suffixes = numpy.array(['', '', '', '', '', '', '', ',', '.', "'s"], object)
+    with open(file_path, 'w') as f:
+        for id in range(1, documents + 1):
+            count = HEADLINE + 1 + int(random.poisson(length))
+            tokens = words[numpy.minimum(numpy.searchsorted(cumulative, random.random(count)), vocabulary - 1)]
+            hyphens = HEADLINE + numpy.flatnonzero(random.random(count - HEADLINE) < 0.01)
+            tokens[hyphens] = tokens[hyphens] + '-' + tokens[hyphens - 1]
+            tokens[HEADLINE:] = tokens[HEADLINE:] + suffixes[random.integers(0, len(suffixes), count - HEADLINE)]
+            headline = ' '.join(word.capitalize() for word in tokens[:HEADLINE])
+            text = '\n'.join(' '.join(tokens[start:start + LINE]) for start in range(HEADLINE, count, LINE))
+            f.write('<DOC>\n<DOCNO> SYN%07d </DOCNO>\n<HEADLINE>\n<P>\n%s\n</P>\n</HEADLINE>\n'
+                    '<TEXT>\n<P>\n%s\n</P>\n</TEXT>\n</DOC>\n' % (id, headline, text))
+
+
+def benchmark_collection(sourcefile, stoplist=None):
+    """
+    Times each stage of indexing a <collection>, run in a fresh process by <run_benchmark>.
+
+    The stages run one after another over the whole <collection>, so each is timed on its own:
+    the documents are parsed into a list, the texts are tokenized, the postings are accumulated
+    by a Collection, and the raw and variable-byte <invlists> and <lexicon> are written to a
+    temporary directory. The peak resident set size is that of the whole process, which holds
+    the parsed documents and their terms at once, so it is an upper bound of a streaming build.
+
+    :param sourcefile: a path to a <collection>
+    :param stoplist: an optional path to a <stoplist>
+    :return: a dictionary of the measurements
+    """
+    sourcefile = path.abspath(sourcefile)
+    collection = Collection(None, stoplist)
+    seconds = {}
+
+    start = perf_counter()
+    documents = list(read_documents(sourcefile))
+    seconds['parse'] = perf_counter() - start
+
+    start = perf_counter()
+    terms = [collection.tokenize_text(text) for _, _, text in documents]
+    seconds['tokenize'] = perf_counter() - start
+
+    start = perf_counter()
+    for (id, docno, _), document_terms in zip(documents, terms):
+        collection.add_document(Document(id, docno, document_terms))
+    seconds['postings'] = perf_counter() - start
+
+    sizes = {}
+    directory = getcwd()
+    with TemporaryDirectory() as temporary:
+        chdir(temporary)
+        try:
+            for stage, write in (('write_raw', collection.write_invlists_lexicon_to_disk),
+                                 ('write_vbyte', collection.write_compressed_invlists_lexicon_to_disk)):
+                start = perf_counter()
+                write()
+                seconds[stage] = perf_counter() - start
+                sizes[stage] = (path.getsize('invlists'), path.getsize('lexicon'))
+        finally:
+            chdir(directory)
+
+    postings = sum(len(term_postings) for term_postings in collection.postings.values())
+    return {'documents': len(documents),
+            'bytes': path.getsize(sourcefile),
+            'tokens': sum(len(document_terms) for document_terms in terms),
+            'terms': len(collection.postings),
+            'postings': postings,
+            'seconds': seconds,
+            'invlists_bytes': {'raw': sizes['write_raw'][0], 'vbyte': sizes['write_vbyte'][0]},
+            'lexicon_bytes': sizes['write_raw'][1],
+            'peak_rss_megabytes': getrusage(RUSAGE_SELF).ru_maxrss / 1024}  # kilobytes on Linux
+
+
+def run_benchmark(sourcefile, stoplist=None, trials=1):
+    """
+    Benchmarks a <collection>, keeping the fastest time of each stage over a number of trials.
+
+    Every trial runs in its own process so that the peak resident set size of one trial
+    does not carry over to the next.
+
+    :param sourcefile: a path to a <collection>
+    :param stoplist: an optional path to a <stoplist>
+    :param trials: the number of times the <collection> is indexed
+    :return: a dictionary of the measurements and throughputs
+    """
+    runs = []
+    for _ in range(trials):
+        with Pool(1) as pool:
+            runs.append(pool.apply(benchmark_collection, (sourcefile, stoplist)))
+    result = runs[0]
+    result['seconds'] = {stage: min(run['seconds'][stage] for run in runs) for stage in STAGES}
+    result['peak_rss_megabytes'] = max(run['peak_rss_megabytes'] for run in runs)
+    result['stages'] = {stage: {'seconds': seconds,
+                                'documents_per_second': result['documents'] / seconds,
+                                'megabytes_per_second': result['bytes'] / 1048576 / seconds}
+                        for stage, seconds in result['seconds'].items()}
+    result['bytes_per_posting'] = {codec: size / result['postings'] for codec, size in result['invlists_bytes'].items()}
+    total = sum(result['seconds'].values())
+    result['total'] = {'seconds': total,
+                       'documents_per_second': result['documents'] / total,
+                       'megabytes_per_second': result['bytes'] / 1048576 / total}
+    del result['seconds']
+    return result
+
+
+def print_result(result, baseline=None):
+    """
+    Prints the measurements of a <collection>, and the change from a baseline of the same size.
+
+    :param result: a dictionary returned by <run_benchmark>
+    :param baseline: an optional dictionary of a previous run over the same number of documents
+    """
+    print('%d documents, %.1f MB, %d terms, %d postings, peak RSS %.1f MB'
+          % (result['documents'], result['bytes'] / 1048576, result['terms'], result['postings'],
+             result['peak_rss_megabytes']))
+    for stage in STAGES + ('total',):
+        measured = result['stages'][stage] if stage in result['stages'] else result['total']
+        line = '  %-12s %9.3f s %12.0f docs/s %9.2f MB/s' % (
+            stage, measured['seconds'], measured['documents_per_second'], measured['megabytes_per_second'])
+        if baseline:
+            previous = baseline['stages'][stage] if stage in baseline['stages'] else baseline['total']
+            line += '  %+7.1f%%' % (100 * (measured['seconds'] / previous['seconds'] - 1))
+        print(line)
+    print('  bytes/posting raw %.2f, vbyte %.2f'
+          % (result['bytes_per_posting']['raw'], result['bytes_per_posting']['vbyte']))
+
+
+def main():
+    """
+    <benchmark.py> measures indexing throughput and index size over synthetic <collection> files.
+
+    For every number of documents in "-d", a synthetic <collection> is generated with a Zipfian
+    vocabulary, see <generate_collection>, and each stage of indexing is timed: parsing,
+    tokenization, postings accumulation and both the raw and variable-byte writers. The
+    documents and megabytes per second of each stage, the peak resident set size and the bytes
+    per posting of both <invlists> formats are printed:
+
+    > [documents] documents, [size] MB, [terms] terms, [postings] postings, peak RSS [rss] MB
+    >   [stage] [seconds] s [documents_per_second] docs/s [megabytes_per_second] MB/s
+    >   ...
+    >   bytes/posting raw [raw], vbyte [vbyte]
+
+    The optional "-f" argument benchmarks an existing <collection> instead, e.g. "latimes"
+    The optional "-s" argument requires a path to a <stoplist>
+    The optional "-v", "-z", "-l" and "-r" arguments set the vocabulary size, Zipfian exponent, mean length and seed
+    The optional "-t" argument is the number of trials, keeping the fastest time of each stage
+    The optional "-o" argument writes the results to a JSON file
+    The optional "-c" argument compares the results with a JSON file written by "-o", printing
+    the change in time of each stage for the collections of the same number of documents
+    """
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument('-d', metavar='\b <documents>', type=int, nargs='+', default=list(SCALES))
+    parser.add_argument('-f', metavar='\b <collection>')
+    parser.add_argument('-s', metavar='\b <stopfile>')
+    parser.add_argument('-v', metavar='\b <vocabulary>', type=int, default=VOCABULARY)
+    parser.add_argument('-z', metavar='\b <exponent>', type=float, default=EXPONENT)
+    parser.add_argument('-l', metavar='\b <length>', type=int, default=LENGTH)
+    parser.add_argument('-r', metavar='\b <seed>', type=int, default=0)
+    parser.add_argument('-t', metavar='\b <trials>', type=int, default=1)
+    parser.add_argument('-o', metavar='\b <output>')
+    parser.add_argument('-c', metavar='\b <baseline>')
+    args = parser.parse_args()
+    if args.t < 1:
+        parser.error('The number of trials must be at least 1.')
+
+    baselines = {}
+    if args.c:
+        with open(args.c, 'r') as f:
+            baselines = {result['documents']: result for result in load(f)['results']}
+
+    results = []
+    if args.f:
+        results.append(run_benchmark(args.f, args.s, args.t))
+        print_result(results[-1], baselines.get(results[-1]['documents']))
+    else:
+        with TemporaryDirectory() as temporary:
+            for documents in args.d:
+                sourcefile = path.join(temporary, 'collection')
+                generate_collection(sourcefile, documents, args.v, args.z, args.l, args.r)
+                results.append(run_benchmark(sourcefile, args.s, args.t))
+                print_result(results[-1], baselines.get(documents))
+
+    if args.o:
+        parameters = {'collection': args.f, 'stoplist': args.s, 'trials': args.t}
+        if not args.f:
+            parameters.update(vocabulary=args.v, exponent=args.z, length=args.l, seed=args.r)
+        with open(args.o, 'w') as f:
+            dump({'python': python_version(), 'parameters': parameters, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+from argparse import ArgumentParser
+from codec import CODECS, write_header
+from inverted_file import InvertedFile
+from json import dump
+from lexicon import Lexicon
+from os import path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import numpy
+
+
+def read_lists(lexicon, invlists, step=1):
+    """
+    Returns the inverted lists of an index as lists of (id, token_frequency) tuples.
+
+    :param lexicon: a Lexicon
+    :param invlists: an InvertedFile
+    :param step: reads the inverted list of every <step>-th term in order of term
+    :return: a list of inverted lists
+    """
+    lists = []
+    for rank, (_, entry) in enumerate(lexicon.items()):
+        if rank % step == 0:
+            ids, frequencies = invlists.postings(entry.offset)
+            lists.append(list(zip(ids.tolist(), frequencies.tolist())))
+    return lists
+
+
+def write_lists(file_path, codec, encoded):
+    """
+    Writes an <invlists> file of inverted lists already encoded by a codec, behind the header naming it.
+
+    :param file_path: a path to the <invlists> file written
+    :param codec: a codec of <CODECS>
+    :param encoded: a list of encoded inverted lists
+    :return: the byte-offset of each inverted list in the file
+    """
+    offsets = []
+    with open(file_path, 'wb') as f:
+        write_header(f, codec)
+        for inverted_list in encoded:
+            offsets.append(f.tell())
+            f.write(inverted_list)
+    return offsets
+
+
+def decode_all(invlists, offsets):
+    """
+    Decodes every inverted list of an <invlists> file into arrays with <InvertedFile.postings>, as search does.
+
+    :param invlists: an InvertedFile
+    :param offsets: the byte-offset of each inverted list
+    :return: the number of postings decoded
+    """
+    decoded = 0
+    for offset in offsets:
+        ids, frequencies = invlists.postings(offset)
+        if not invlists.codec.blocked:  # the zero-copy views of a raw list are copied, as every other codec copies
+            ids, frequencies = ids.astype(numpy.int64), frequencies.astype(numpy.int64)
+        decoded += len(ids)
+    return decoded
+
+
+def benchmark_codec(codec, lists):
+    """
+    Encodes and decodes every inverted list with a codec, timing both.
+
+    The encoded lists are written to a temporary <invlists> file and decoded through an InvertedFile,
+    so the decoding timed is the one of <search.py>.
+
+    :param codec: a codec of <CODECS>
+    :param lists: a list of inverted lists of (id, token_frequency) tuples
+    :return: a dictionary of the measurements
+    """
+    start = perf_counter()
+    encoded = [codec.encode_postings(inverted_list) for inverted_list in lists]
+    encode_seconds = perf_counter() - start
+    size = sum(len(inverted_list) for inverted_list in encoded)
+
+    with TemporaryDirectory() as directory:
+        file_path = path.join(directory, 'invlists')
+        offsets = write_lists(file_path, codec, encoded)
+        with InvertedFile(file_path) as invlists:
+            start = perf_counter()
+            postings = decode_all(invlists, offsets)
+            decode_seconds = perf_counter() - start
+    return {'bytes': size,
+            'bytes_per_posting': size / postings,
+            'encode_seconds': encode_seconds,
+            'decode_seconds': decode_seconds,
+            'decoded_postings_per_second': postings / decode_seconds}
+
+
+def main():
+    """
+    <benchmark_codecs.py> compares the size and speed of every codec on the inverted lists of an index.
+
+    Every inverted list of the index, written with any codec, is encoded with each codec and then
+    decoded into arrays of ids and token frequencies, printing one line per codec:
+
+    > [codec] [megabytes] MB [bytes_per_posting] bytes/posting encode [seconds] s decode [seconds] s
+    >     [postings_per_second] postings/s
+
+    The optional "-c" argument is a list of the codecs compared, every codec of <CODECS> by default
+    The optional "-k" argument benchmarks the inverted list of every k-th term only, for large indexes
+    The optional "-o" argument writes the results to a JSON file
+    """
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument('-c', metavar='\b <codec>', nargs='+', choices=CODECS, default=list(CODECS))
+    parser.add_argument('-k', metavar='\b <step>', type=int, default=1)
+    parser.add_argument('-o', metavar='\b <output>')
+    parser.add_argument('lexicon', metavar='<lexicon>')
+    parser.add_argument('invlists', metavar='<invlists>')
+    args = parser.parse_args()
+
+    with Lexicon(args.lexicon) as lexicon, InvertedFile(args.invlists) as invlists:
+        lists = read_lists(lexicon, invlists, max(args.k, 1))
+    print("%d inverted lists, %d postings" % (len(lists), sum(len(inverted_list) for inverted_list in lists)))
+
+    results = {}
+    for name in args.c:
+        results[name] = result = benchmark_codec(CODECS[name], lists)
+        print("%-10s %8.2f MB %6.2f bytes/posting encode %7.3f s decode %7.3f s %12.0f postings/s" % (
+            name, result['bytes'] / 1048576, result['bytes_per_posting'], result['encode_seconds'],
+            result['decode_seconds'], result['decoded_postings_per_second']))
+
+    if args.o:
+        with open(args.o, 'w') as f:
+            dump({'lexicon': args.lexicon, 'invlists': args.invlists, 'step': args.k, 'codecs': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+from inverted_file import members
+from re import compile
+from tokenizer import tokenize
+import numpy
+
+token_regex = compile('[()]|[^\\s()]+')
+OPERATORS = ('AND', 'OR', 'NOT')
+
+
+def parse_query(query):
+    """
+    Parses a Boolean query into a tree of nested tuples.
+
+    Terms are combined with the operators "AND", "OR" and "NOT", in upper case, and parentheses.
+    "NOT" binds tighter than "AND", which binds tighter than "OR", and adjacent terms are joined
+    by an implicit "AND", so "cat dog OR NOT mouse" is "(cat AND dog) OR (NOT mouse)".
+    Each term is tokenized like the documents of the <collection>, see <tokenize>, and a term
+    holding several words matches all of them, so "On-Campus" is "on AND campus".
+
+    > ('term', "term") | ('and', [node, ...]) | ('or', [node, ...]) | ('not', node)
+
+    :param query: a string of terms, operators and parentheses
+    :return: the root node of the query
+    """
+    tokens = token_regex.findall(query)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def expression():
+        nonlocal position
+        children = [conjunction()]
+        while peek() == 'OR':
+            position += 1
+            children.append(conjunction())
+        return children[0] if len(children) == 1 else ('or', children)
+
+    def conjunction():
+        nonlocal position
+        children = [negation()]
+        while peek() not in (None, 'OR', ')'):
+            if peek() == 'AND':
+                position += 1
+            children.append(negation())
+        return children[0] if len(children) == 1 else ('and', children)
+
+    def negation():
+        nonlocal position
+        if peek() == 'NOT':
+            position += 1
+            return 'not', negation()
+        return primary()
+
+    def primary():
+        nonlocal position
+        token = peek()
+        if token is None or token in OPERATORS or token == ')':
+            found = "'%s'" % token if token else 'the end'
+            raise ValueError("Expected a term or '(' in the query but found %s." % found)
+        position += 1
+        if token == '(':
+            node = expression()
+            if peek() != ')':
+                raise ValueError("Expected ')' in the query.")
+            position += 1
+            return node
+        terms = tokenize(token)
+        if len(terms) > 1:
+            return 'and', [('term', term) for term in terms]
+        return 'term', terms[0] if terms else token
+
+    root = expression()
+    if position < len(tokens):
+        raise ValueError("Unexpected '%s' in the query." % tokens[position])
+    return root
+
+
+def union(arrays):
+    """
+    Returns the union of sorted arrays of ids.
+
+    :param arrays: a list of numpy arrays of ids in ascending order
+    :return: a numpy array of ids in ascending order
+    """
+    ids = numpy.sort(numpy.concatenate([array.astype(numpy.int64) for array in arrays] + [numpy.empty(0, numpy.int64)]))
+    return ids[numpy.diff(ids, prepend=-1) != 0]
+
+
+def evaluate(node, lexicon, invlists, universe):
+    """
+    Returns the ids of the documents matching a node of a Boolean query.
+
+    :param node: a node of <parse_query>
+    :param lexicon: a Lexicon
+    :param invlists: an InvertedFile
+    :param universe: a numpy array of every id of the collection in ascending order
+    :return: a numpy array of ids in ascending order
+    """
+    kind = node[0]
+    if kind == 'term':
+        entry = lexicon.get(node[1])
+        return invlists.inverted_list(entry.offset).ids().astype(numpy.int64) if entry else numpy.empty(0, numpy.int64)
+    if kind == 'or':
+        return union([evaluate(child, lexicon, invlists, universe) for child in node[1]])
+    if kind == 'not':
+        return universe[~members(evaluate(node[1], lexicon, invlists, universe), universe)]
+    return intersect(node[1], lexicon, invlists, universe)
+
+
+def intersect(children, lexicon, invlists, universe):
+    """
+    Returns the ids of the documents matching every child of an "AND" node.
+
+    The terms among the children are not decoded. Starting from the child with the fewest
+    documents, the rarest term, every other child only filters the remaining candidates:
+    a term by searching its skip table and decoding the blocks that could hold a candidate,
+    see <InvertedList.contains>. A "NOT" child removes candidates in the same way. The cost
+    is therefore close to the length of the shortest inverted list, however common the other
+    terms are.
+
+    :param children: a list of nodes of <parse_query>
+    :param lexicon: a Lexicon
+    :param invlists: an InvertedFile
+    :param universe: a numpy array of every id of the collection in ascending order
+    :return: a numpy array of ids in ascending order
+    """
+    positive, negative = [], []  # (size, inverted list or ids) of each child
+    for child in children:
+        kind, target = ('not', child[1]) if child[0] == 'not' else ('and', child)
+        if target[0] == 'term':
+            entry = lexicon.get(target[1])
+            if entry:
+                inverted_list = invlists.inverted_list(entry.offset)
+                operand = (len(inverted_list), inverted_list)
+            else:
+                operand = (0, numpy.empty(0, numpy.int64))
+        else:
+            ids = evaluate(target, lexicon, invlists, universe)
+            operand = (len(ids), ids)
+        (negative if kind == 'not' else positive).append(operand)
+
+    positive.sort(key=lambda operand: operand[0])  # the rarest first
+    if positive:
+        first = positive[0][1]
+        candidates = first if isinstance(first, numpy.ndarray) else first.ids().astype(numpy.int64)
+    else:
+        candidates = universe
+    for _, operand in positive[1:]:
+        candidates = candidates[contains(operand, candidates)]
+    for _, operand in negative:
+        candidates = candidates[~contains(operand, candidates)]
+    return candidates
+
+
+def contains(operand, candidates):
+    """
+    Returns which of a sorted array of ids are in an operand of <intersect>.
+
+    :param operand: an InvertedList, or a numpy array of ids in ascending order
+    :param candidates: a numpy array of ids in ascending order
+    :return: a numpy array of booleans aligned with <candidates>
+    """
+    if not len(candidates):
+        return numpy.zeros(0, bool)
+    if isinstance(operand, numpy.ndarray):
+        return members(operand, candidates)
+    return operand.contains(candidates)
+
+
+def run_query(query, lexicon, invlists, universe):
+    """
+    Returns the ids of the documents matching a Boolean query.
+
+    :param query: a string of terms, operators and parentheses, see <parse_query>
+    :param lexicon: a Lexicon
+    :param invlists: an InvertedFile
+    :param universe: a numpy array of every id of the collection in ascending order
+    :return: a numpy array of ids in ascending order
+    """
+    return evaluate(parse_query(query), lexicon, invlists, universe)
@@ -0,0 +1,470 @@
+#!/usr/bin/env python
+
+from abc import ABC, abstractmethod
+from compression import decode_from, decode_list, decode_postings, encode, encode_list, encode_skips, SKIP_INTERVAL
+from struct import Struct
+import numpy
+
+HEADER = Struct('<4s12s')  # magic, name of the codec padded with zero bytes
+MAGIC = b'INV1'
+# the (values, bits) of each Simple-8b selector
+SELECTORS = ((240, 0), (120, 0), (60, 1), (30, 2), (20, 3), (15, 4), (12, 5), (10, 6),
+             (8, 7), (7, 8), (6, 10), (5, 12), (4, 15), (3, 20), (2, 30), (1, 60))
+SELECTOR_COUNTS = numpy.array([count for count, _ in SELECTORS])
+EXCEPTIONS = 0.1  # the largest fraction of a PForDelta chunk stored as exceptions
+
+
+class RawCodec:
+
+    name = 'raw'
+    blocked = False
+
+    def encode_postings(self, postings):
+        """
+        Encodes an inverted list as a 32-bit document frequency followed by 32-bit "<id> <token_frequency>" pairs.
+
+        The pairs are read back as zero-copy views of the mapping, see <InvertedFile.postings>.
+
+        :param postings: a list of (id, token_frequency) tuples sorted by id
+        :return: the encoded inverted list
+        """
+        pairs = numpy.array(postings, '<u4').reshape(-1, 2)
+        return numpy.array([len(pairs)], '<u4').tobytes() + pairs.tobytes()
+
+
+class BlockCodec(ABC):
+
+    blocked = True
+
+    @abstractmethod
+    def encode(self, values):
+        """
+        Encodes a chunk of positive integers as a whole number of bytes.
+
+        :param values: a numpy array of positive integers
+        :return: the encoded chunk
+        """
+
+    @abstractmethod
+    def decode(self, buffer, position, count):
+        """
+        Decodes a chunk of <count> integers encoded by <encode>.
+
+        :param buffer: a bytes-like object
+        :param position: the index of the first byte of the chunk
+        :param count: the number of integers in the chunk
+        :return: a tuple of a numpy array of the integers and the index following the chunk
+        """
+
+    def encode_block(self, gaps, frequencies):
+        """
+        Encodes a block of postings as a chunk of <d-gap> values followed by a chunk of token frequencies.
+
+        :param gaps: a numpy array of the d-gaps of the block
+        :param frequencies: a numpy array of the token frequencies of the block
+        :return: the encoded block
+        """
+        return self.encode(gaps) + self.encode(frequencies)
+
+    def decode_blocks(self, buffer, counts):
+        """
+        Decodes consecutive blocks encoded by <encode_block>.
+
+        :param buffer: a bytes-like object holding whole blocks
+        :param counts: a numpy array of the number of postings of each block
+        :return: a tuple of numpy arrays of the d-gaps and token frequencies of every block
+        """
+        gaps, frequencies = [], []
+        position = 0
+        for count in counts.tolist():
+            block_gaps, position = self.decode(buffer, position, count)
+            block_frequencies, position = self.decode(buffer, position, count)
+            gaps.append(block_gaps)
+            frequencies.append(block_frequencies)
+        return numpy.concatenate(gaps), numpy.concatenate(frequencies)
+
+    def encode_postings(self, postings, interval=SKIP_INTERVAL):
+        """
+        Encodes an inverted list as a header, a skip table and blocks of <interval> postings.
+
+        The header is the variable-byte document frequency and byte length of the blocks. The skip
+        table holds the <id> of the last posting of each block and the byte-offset following the block,
+        as little-endian 32-bit pairs, see <encode_skips>. Each block is encoded on its own by
+        <encode_block>, continuing the <d-gap> values from the previous block, so it can be decoded alone.
+
+        :param postings: a list of (id, token_frequency) tuples sorted by id
+        :param interval: the number of postings in a block
+        :return: the encoded inverted list
+        """
+        pairs = numpy.array(postings, numpy.int64).reshape(-1, 2)
+        ids, frequencies = pairs[:, 0], pairs[:, 1]
+        gaps = numpy.diff(ids, prepend=0)
+        blocks = [self.encode_block(gaps[start:start + interval], frequencies[start:start + interval])
+                  for start in range(0, len(ids), interval)]
+        table = numpy.empty((len(blocks), 2), '<u4')
+        table[:, 0] = ids[numpy.minimum(numpy.arange(1, len(blocks) + 1) * interval, len(ids)) - 1]
+        table[:, 1] = numpy.cumsum([len(block) for block in blocks])
+        inverted_list = b''.join(blocks)
+        return encode(len(ids)) + encode(len(inverted_list)) + table.tobytes() + inverted_list
+
+    def decode_postings(self, buffer, df, interval=SKIP_INTERVAL):
+        """
+        Decodes the blocks of an inverted list encoded by <encode_postings>.
+
+        :param buffer: a bytes-like object holding every block of the inverted list
+        :param df: the document frequency of the inverted list
+        :param interval: the number of postings in a block
+        :return: a tuple of numpy arrays of document ids and token frequencies
+        """
+        counts = numpy.minimum(interval, df - numpy.arange(0, df, interval))
+        gaps, frequencies = self.decode_blocks(buffer, counts)
+        return numpy.cumsum(gaps), frequencies
+
+
+class VByteCodec(BlockCodec):
+
+    name = 'vbyte'
+
+    def encode(self, values):
+        return encode_list(values)
+
+    def decode(self, buffer, position, count):
+        return decode_values(buffer, position, count)
+
+    def encode_block(self, gaps, frequencies):
+        """
+        Encodes a block of postings as interleaved "<d-gap> <token_frequency>" variable-byte sequences.
+        """
+        return encode_list(numpy.column_stack((gaps, frequencies)).ravel())
+
+    def decode_blocks(self, buffer, counts):
+        """
+        Decodes consecutive blocks at once, as every integer is delimited by its "continuation bit".
+        """
+        values = decode_list(buffer)
+        return values[0::2], values[1::2]
+
+    def encode_postings(self, postings, interval=SKIP_INTERVAL):
+        """
+        Encodes an inverted list in a single pass, giving the same bytes as <BlockCodec.encode_postings>.
+        """
+        inverted_list, skips = encode_skips(postings, interval)
+        return encode(len(postings)) + encode(len(inverted_list)) + skips + inverted_list
+
+    def decode_postings(self, buffer, df, interval=SKIP_INTERVAL):
+        return decode_postings(buffer)
+
+
+class GammaCodec(BlockCodec):
+
+    name = 'gamma'
+
+    def encode(self, values):
+        """
+        Encodes each integer as its binary digits preceded by one "0" for each digit after the first.
+        """
+        return pack_bits(''.join('0' * (len(digits) - 1) + digits for digits in map('{:b}'.format, values.tolist())))
+
+    def decode(self, buffer, position, count):
+        bits = unpack_bits(buffer, position, 8 * count)  # a code of a 32-bit integer is at most 63 bits
+        values = []
+        start = 0
+        for _ in range(count):
+            first = bits.index('1', start)
+            end = 2 * first - start + 1
+            values.append(int(bits[first:end], 2))
+            start = end
+        return numpy.array(values, numpy.int64), position + -(-start // 8)
+
+
+class DeltaCodec(BlockCodec):
+
+    name = 'delta'
+
+    def encode(self, values):
+        """
+        Encodes each integer as the gamma code of its number of binary digits, followed by the digits after the first.
+        """
+        codes = []
+        for digits in map('{:b}'.format, values.tolist()):
+            length = '{:b}'.format(len(digits))
+            codes.append('0' * (len(length) - 1) + length + digits[1:])
+        return pack_bits(''.join(codes))
+
+    def decode(self, buffer, position, count):
+        bits = unpack_bits(buffer, position, 6 * count)  # a code of a 32-bit integer is at most 42 bits
+        values = []
+        start = 0
+        for _ in range(count):
+            first = bits.index('1', start)
+            end = 2 * first - start + 1
+            length = int(bits[first:end], 2)
+            values.append(int('1' + bits[end:end + length - 1], 2))
+            start = end + length - 1
+        return numpy.array(values, numpy.int64), position + -(-start // 8)
+
+
+class Simple8bCodec(BlockCodec):
+
+    name = 'simple8b'
+
+    def encode(self, values):
+        """
+        Packs the integers minus one into 64-bit words of a 4-bit selector and 60 bits of data.
+
+        Each word greedily takes the <SELECTORS> entry holding the most of the following integers,
+        where the first two selectors hold runs of 240 and 120 integers of one, e.g. token frequencies.
+        The last word of a chunk may be padded, and the padding is discarded by the decoder.
+        """
+        values = (values - 1).tolist()
+        words = []
+        position = 0
+        while position < len(values):
+            for selector, (count, bits) in enumerate(SELECTORS):
+                chunk = values[position:position + count]
+                if max(chunk) < 1 << bits:
+                    break
+            word = selector << 60
+            for index, value in enumerate(chunk):
+                word |= value << (index * bits)
+            words.append(word)
+            position += count
+        return numpy.array(words, '<u8').tobytes()
+
+    def decode(self, buffer, position, count):
+        words = numpy.frombuffer(buffer, '<u8', min(count, (len(buffer) - position) // 8), position)
+        totals = numpy.cumsum(SELECTOR_COUNTS[words >> numpy.uint64(60)])
+        used = int(numpy.searchsorted(totals, count)) + 1
+        return unpack_words(words[:used])[:count] + 1, position + 8 * used
+
+    def decode_blocks(self, buffer, counts):
+        """
+        Decodes every word of consecutive blocks at once, and then splits the integers into chunks.
+
+        Each chunk ends with the first word at which the integers of the chunk reach its count,
+        so the padding of the last word of every chunk is found from the running total of the words.
+        """
+        words = numpy.frombuffer(buffer, '<u8')
+        values = unpack_words(words) + 1
+        totals = numpy.cumsum(SELECTOR_COUNTS[words >> numpy.uint64(60)])
+        starts = []
+        total = 0
+        for count in numpy.repeat(counts, 2).tolist():  # the chunks of d-gaps and token frequencies of each block
+            starts.append(total)
+            total = int(totals[numpy.searchsorted(totals, total + count)])
+        starts = numpy.array(starts, numpy.int64)
+        return values[ranges(starts[0::2], counts)], values[ranges(starts[1::2], counts)]
+
+
+class PForDeltaCodec(BlockCodec):
+
+    name = 'pfordelta'
+
+    def encode(self, values):
+        """
+        Packs the integers minus one in the fewest bits <b> that hold all but a fraction <EXCEPTIONS> of them.
+
+        The chunk is the byte <b>, the variable-byte number of exceptions, the low <b> bits of every
+        integer packed together, and the positions of the exceptions and their bits above <b> as
+        variable-byte sequences, which the decoder patches into the unpacked integers.
+        """
+        values = values - 1
+        lengths = bit_lengths(values)
+        bits = int(numpy.sort(lengths)[int((len(values) - 1) * (1 - EXCEPTIONS))])
+        exceptions = numpy.flatnonzero(lengths > bits)
+        return (bytes([bits]) + encode(len(exceptions)) + pack_values(values & ((1 << bits) - 1), bits)
+                + encode_list(exceptions) + encode_list(values[exceptions] >> bits))
+
+    def decode(self, buffer, position, count):
+        bits = buffer[position]
+        exceptions, position = decode_from(buffer, position + 1)
+        values = unpack_values(buffer, position, count, bits)
+        position += -(-count * bits // 8)
+        if exceptions:
+            patches, position = decode_values(buffer, position, 2 * exceptions)
+            values[patches[:exceptions]] |= patches[exceptions:] << bits
+        return values + 1, position
+
+
+CODECS = {codec.name: codec for codec in (RawCodec(), VByteCodec(), GammaCodec(), DeltaCodec(), Simple8bCodec(),
+                                          PForDeltaCodec())}
+
+
+def get_codec(name):
+    """
+    Returns a codec of <CODECS> by name.
+
+    :param name: the name of a codec
+    :return: a codec
+    """
+    if name not in CODECS:
+        raise ValueError("Unrecognized codec '%s'. Recognized codecs include %s." % (name, ', '.join(CODECS)))
+    return CODECS[name]
+
+
+def write_header(invlists_file, codec):
+    """
+    Writes the header of an <invlists> file naming its codec.
+
+    :param invlists_file: a file opened for writing at its beginning
+    :param codec: a codec of <CODECS>
+    """
+    invlists_file.write(HEADER.pack(MAGIC, codec.name.encode('ascii')))
+
+
+def read_header(buffer):
+    """
+    Returns the codec named by the header of an <invlists> file.
+
+    :param buffer: a bytes-like object of the whole <invlists> file
+    :return: a codec of <CODECS>, or None if the file has no header
+    """
+    if len(buffer) < HEADER.size:
+        return None
+    magic, name = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        return None
+    return get_codec(name.rstrip(b'\0').decode('ascii'))
+
+
+def detect_codec(buffer):
+    """
+    Returns the codec of an <invlists> file written without a header, either "raw" or "vbyte".
+
+    Such a file was written before the header existed, as raw by <index.py> or as variable-byte by
+    <index_vb.py>. The first inverted list is read as variable-byte: its document frequency and byte
+    length must be followed by a skip table whose last byte-offset is that length. A raw list, which
+    begins with a 32-bit document frequency, is otherwise assumed.
+
+    :param buffer: a bytes-like object of the whole <invlists> file
+    :return: a codec of <CODECS>
+    """
+    head = bytes(buffer[:10])  # enough for two variable-byte integers of the sizes written
+    try:
+        document_frequency, position = decode_from(head, 0)
+        length, position = decode_from(head, position)
+    except IndexError:
+        return CODECS['raw']
+    blocks = -(-document_frequency // SKIP_INTERVAL)
+    if document_frequency and position + 8 * blocks + length <= len(buffer):
+        skips = numpy.frombuffer(buffer, '<u4', 2 * blocks, position)
+        if skips[-1] == length and numpy.all(numpy.diff(skips[0::2].astype(numpy.int64)) > 0):
+            return CODECS['vbyte']
+    return CODECS['raw']
+
+
+def decode_values(buffer, position, count):
+    """
+    Decodes <count> variable-byte sequences from a <buffer> starting at <position>.
+
+    :param buffer: a bytes-like object
+    :param position: the index of the first byte of the first integer
+    :param count: the number of integers
+    :return: a tuple of a numpy array of the integers and the index following the final byte of the last integer
+    """
+    window = numpy.frombuffer(buffer, numpy.uint8, min(5 * count, len(buffer) - position), position)
+    end = int(numpy.flatnonzero(window >= 128)[count - 1]) + 1
+    return decode_list(window[:end]), position + end
+
+
+def bit_lengths(values):
+    """
+    Returns the number of binary digits of every integer, 0 for zero.
+
+    :param values: a numpy array of non-negative integers
+    :return: a numpy array of the bit lengths
+    """
+    lengths = numpy.zeros(len(values), numpy.int64)
+    remaining = values.astype(numpy.int64)
+    while remaining.any():
+        lengths += remaining > 0
+        remaining >>= 1
+    return lengths
+
+
+def pack_values(values, bits):
+    """
+    Packs the low <bits> of every integer into consecutive bits, least significant first.
+
+    :param values: a numpy array of non-negative integers
+    :param bits: the number of bits of each integer
+    :return: the packed bytes, padded to a whole byte
+    """
+    if not bits:
+        return b''
+    digits = (values.astype(numpy.int64)[:, None] >> numpy.arange(bits)) & 1
+    return numpy.packbits(digits.astype(numpy.uint8).ravel(), bitorder='little').tobytes()
+
+
+def unpack_values(buffer, position, count, bits):
+    """
+    Unpacks <count> integers of <bits> each packed by <pack_values>.
+
+    :param buffer: a bytes-like object
+    :param position: the index of the first packed byte
+    :param count: the number of integers
+    :param bits: the number of bits of each integer
+    :return: a numpy array of the integers
+    """
+    if not bits:
+        return numpy.zeros(count, numpy.int64)
+    packed = numpy.frombuffer(buffer, numpy.uint8, -(-count * bits // 8), position)
+    digits = numpy.unpackbits(packed, bitorder='little')[:count * bits].reshape(count, bits)
+    return digits.astype(numpy.int64) @ (numpy.int64(1) << numpy.arange(bits, dtype=numpy.int64))
+
+
+def unpack_words(words):
+    """
+    Unpacks the integers of Simple-8b words, see <Simple8bCodec.encode>.
+
+    :param words: a numpy array of 64-bit words
+    :return: a numpy array of the packed integers, with the padding of every word
+    """
+    selectors = (words >> numpy.uint64(60)).astype(numpy.int64)
+    counts = SELECTOR_COUNTS[selectors]
+    starts = numpy.cumsum(counts) - counts
+    values = numpy.zeros(int(counts.sum()), numpy.int64)
+    for selector in numpy.flatnonzero(numpy.bincount(selectors, minlength=len(SELECTORS))[2:]) + 2:
+        count, bits = SELECTORS[selector]
+        rows = numpy.flatnonzero(selectors == selector)
+        shifts = numpy.arange(count, dtype=numpy.uint64) * numpy.uint64(bits)
+        unpacked = (words[rows, None] >> shifts) & numpy.uint64((1 << bits) - 1)
+        values[(starts[rows, None] + numpy.arange(count)).ravel()] = unpacked.ravel().astype(numpy.int64)
+    return values
+
+
+def ranges(starts, lengths):
+    """
+    Returns the indexes of consecutive ranges, e.g. starts [0, 10] and lengths [2, 3] give [0, 1, 10, 11, 12].
+
+    :param starts: a numpy array of the first index of each range
+    :param lengths: a numpy array of the length of each range
+    :return: a numpy array of indexes
+    """
+    lengths = numpy.asarray(lengths, numpy.int64)
+    offsets = numpy.cumsum(lengths) - lengths
+    return numpy.repeat(starts, lengths) + numpy.arange(int(lengths.sum())) - numpy.repeat(offsets, lengths)
+
+
+def pack_bits(bits):
+    """
+    Returns a string of binary digits as bytes, padded with zeros to a whole byte.
+
+    :param bits: a string of "0" and "1"
+    :return: the packed bytes
+    """
+    bits += '0' * (-len(bits) % 8)
+    return int(bits, 2).to_bytes(len(bits) // 8, 'big') if bits else b''
+
+
+def unpack_bits(buffer, position, limit):
+    """
+    Returns up to <limit> bytes of a <buffer> from <position> as a string of binary digits.
+
+    :param buffer: a bytes-like object
+    :param position: the index of the first byte
+    :param limit: the largest number of bytes read
+    :return: a string of "0" and "1"
+    """
+    chunk = bytes(buffer[position:position + limit])
+    return '{:0{}b}'.format(int.from_bytes(chunk, 'big'), 8 * len(chunk)) if chunk else ''
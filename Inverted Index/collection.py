@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 
 from collections import Counter
-from compression import encode
-from re import compile
-from struct import pack
+from codec import get_codec, write_header
+from lexicon import LexiconWriter
+from multiprocessing import Pool
+from spimi import SPIMIIndexer
+from tempfile import TemporaryFile
+from tokenizer import tokenize
+from trec import parse_documents, read_chunk, read_documents, split_collection, CHUNK_SIZE
 
 
 class Document:
@@ -21,91 +25,112 @@ class Document:
         self.terms = terms
 
 
+def index_chunk(chunk):
+    """
+    Accumulates the postings and <map> entries of one chunk of a <collection> in a worker process.
+
+    :param chunk: a (sourcefile, stoplist, start, end, id) tuple describing the chunk
+    :return: a tuple of the postings dictionary and the list of <map> entries of the chunk
+    """
+    sourcefile, stoplist, start, end, id = chunk
+    collection = Collection(None, stoplist)
+    for id, docno, text in parse_documents(read_chunk(sourcefile, start, end), id=id):
+        collection.add_document(Document(id, docno, collection.tokenize_text(text)))
+    return collection.postings, collection.map
+
+
 class Collection:
 
-    def __init__(self, sourcefile, stoplist=None):
+    def __init__(self, sourcefile, stoplist=None, workers=1):
         """
         Contains functions to index a <collection>.
 
-        :param sourcefile: a path to a <collection>
+        :param sourcefile: a path to a <collection>, or None to create an empty Collection
         :param stoplist: an optional path to a <stoplist>
+        :param workers: the number of processes used to parse the <collection>
         """
         if stoplist:
             with open(stoplist, 'r') as f:
                 self.stoplist = set(f.read().split('\n'))
         else:
             self.stoplist = {}
-        self.documents = []
-        self.parse_collection(sourcefile)
-
-    def tokenize_terms(self, words):
-        """
-        Converts a list of words into terms based on a set of rules.
-
-        > alphabetical words: is a term
-        > hyphenated words: each separated word is a term (e.g. "on-campus" = "on" and "campus")
-        > forward-slash words: each separated word is a term (e.g. "yes/no" = "yes" and "no")
-        > apostrophes = each separated word is a term (e.g. "can't" = "can" and "t")
-
-        The reasoning behind these decisions is to maintain the structure of the words.
-        This is so the index reflects what a typical user expects. For example in a search
-        function where the user wants to find occurrences of "campus", it is preferable to
-        recognize "on-campus" as a legitimate source of "campus".
-
-        :param words: a list of words before tokenization
-        :return terms: a list of words after tokenization
-        """
-        terms = []
-        for word in words:
-            if word.isalpha():
-                terms.append(word)
-            elif '-' in word:
-                terms.append(word.replace('-', ''))
-            elif '/' in word:
-                terms.extend(word.split('/'))
-            elif "'" in word:
-                apostrophes = word.split("'")
-                for a in apostrophes:
-                    if (len(a)) > 1:
-                        terms.append(a)
-        if self.stoplist:
-            terms = [t for t in terms if t not in self.stoplist]
-        return terms
+        self.stoplist_file = stoplist
+        self.sourcefile = sourcefile
+        self.workers = workers
+        self.postings = {}
+        self.map = []
+        if sourcefile:
+            self.parse_collection(sourcefile)
 
     def parse_collection(self, sourcefile):
         """
-        Iterates the <collection> one line at time to store important data.
+        Streams the <collection> one document at a time into the Collection.
 
-        > begin <appending> if line equals "<TEXT>" or "<HEADLINE>"
-        > stop <appending> if line equals "</TEXT>" or "</HEADLINE>"
-        > appends the line to <content> if <appending> and not a tag ELSE
-        > assigns <docno> if it encounters a <DOCNO></DOCNO> tag ELSE
-        > resets <content> if line equals "<DOC>"
-        > tokenizes <content> if line equals "</DOC>" and increments <id>
+        Each (id, docno, text) record from <read_documents> is tokenized and handed to
+        <add_document> before the next document is read, so parsing, tokenization and
+        postings accumulation form a single pipeline.
+
+        With more than one worker, the <collection> is split at "<DOC>" boundaries and
+        the chunks are indexed by a process pool. Each chunk knows the <id> preceding it,
+        so ids are globally consistent, and the partial postings are merged in order of
+        chunk so that the files written are identical to those of a serial build.
 
         :param sourcefile: a path to a <collection>
         """
-        with open(sourcefile, 'r') as f:
-            id = 0
-            docno = ''
-            content = ''
-            appending = False
-            term_regex = compile("[^a-zA-Z-/']")
-            for line in f:
-                if line == '<TEXT>\n' or line == '<HEADLINE>\n':
-                    appending = True
-                elif line == '</TEXT>\n' or line == '</HEADLINE>\n':
-                    appending = False
-                elif appending and not line.startswith(('<', '</')):
-                    content += line
-                elif line.startswith('<DOCNO>'):
-                    docno = line[8:-10]  # captures the string between the "DOCNO" tags without white spaces
-                elif line == '<DOC>\n':
-                    content = ''
-                elif line == '</DOC>\n':
-                    id += 1
-                    terms = self.tokenize_terms(term_regex.sub(' ', content).lower().split())
-                    self.documents.append(Document(id, docno, terms))
+        if self.workers > 1:
+            with open(sourcefile, 'rb') as f:
+                f.seek(0, 2)
+                chunk_size = min(CHUNK_SIZE, f.tell() // (4 * self.workers) + 1)  # several chunks per worker
+            chunks = [(sourcefile, self.stoplist_file, start, end, id)
+                      for start, end, id in split_collection(sourcefile, chunk_size)]
+            pool = Pool(self.workers)
+            try:
+                for postings, map_entries in pool.imap(index_chunk, chunks):
+                    self.add_postings(postings, map_entries)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for id, docno, text in read_documents(sourcefile):
+                self.add_document(Document(id, docno, self.tokenize_text(text)))
+
+    def tokenize_text(self, text):
+        """
+        Converts the text of a document into terms, see <tokenize>.
+
+        :param text: a string of text
+        :return: a list of terms after tokenization
+        """
+        return tokenize(text, self.stoplist)
+
+    def add_document(self, document):
+        """
+        Accumulates the postings and <map> entry of a parsed Document.
+
+        The Document itself is not retained.
+
+        :param document: a Document
+        """
+        for term, token_frequency in Counter(document.terms).items():  # tallies term occurrences in the Document
+            if term in self.postings:
+                self.postings[term].append((document.id, token_frequency))
+            else:
+                self.postings[term] = [(document.id, token_frequency)]
+        self.map.append((document.id, document.docno))
+
+    def add_postings(self, postings, map_entries):
+        """
+        Merges the partial postings and <map> entries of a chunk indexed by a worker.
+
+        :param postings: a dictionary with "term" as a key and a list of (id, token_frequency) as a value
+        :param map_entries: a list of (id, docno) tuples
+        """
+        for term, term_postings in postings.items():
+            if term in self.postings:
+                self.postings[term].extend(term_postings)
+            else:
+                self.postings[term] = term_postings
+        self.map.extend(map_entries)
 
     def write_map_to_disk(self):
         """
@@ -114,71 +139,118 @@ class Collection:
         The <map> file is line-separated, where each line consists of '<id> <docno>'.
         """
         with open('map', 'w') as f:
-            for document in self.documents:
-                f.write(str(document.id) + ' ' + document.docno + '\n')
+            for id, docno in self.map:
+                f.write(str(id) + ' ' + docno + '\n')
 
-    def create_postings(self):
+    def iterate_postings(self):
         """
-        Builds a dictionary for the term occurrence statistics of the Collection.
+        Yields the inverted list of each term in the Collection in order of term.
 
-        :return postings: a dictionary with "term" as a key and a list of Document "id" as a value
+        :return: a generator of ("term", [(id, token_frequency), ...]) tuples
         """
-        postings = {}
-        if self.documents:
-            for document in self.documents:
-                for term in document.terms:
-                    if term in postings:
-                        postings[term].append(document.id)
-                    else:
-                        postings[term] = [document.id]
-        return postings
+        for term in sorted(self.postings):
+            yield term, self.postings[term]
 
-    def write_invlists_lexicon_to_disk(self):
+    def write_invlists_lexicon_to_disk(self, codec='raw'):
         """
         Writes an <invlists> file and <lexicon> file to the current working directory.
 
-        <invlists> is a binary integer file (32-bit) composed of sequential inverted lists.
-        Each inverted list is preceded by a document frequency integer.
-        This is followed by an number of "<id> <token_frequency>" pairs equal to the document frequency.
-        <lexicon> is a key-value-pair where every "key" is "term" that is assigned a byte-offset from <tell>.
-        The order of terms/documents in <invlists> and <lexicon> are unordered because <postings> is unordered.
-        """
-        postings = self.create_postings()
-        with open('invlists', 'wb') as invlists_file, open('lexicon', 'w') as lexicon_file:
-            for term in postings.keys():
-                lexicon_file.write(term + ' ' + str(invlists_file.tell()) + '\n')  # gets the position of the file
-                term_occurrences = Counter(postings[term])  # tallies term occurences by document <id>
-                document_frequency = len(term_occurrences.keys())
-                invlists_file.write(str(pack('I', document_frequency)))
-                for document_id in term_occurrences.keys():
-                    invlists_file.write(pack('II', document_id, term_occurrences[document_id]))
+        <invlists> begins with a header naming the codec of its inverted lists, see <write_header>,
+        followed by sequential inverted lists, each encoded by <encode_postings> of the codec.
+        With the "raw" codec, each inverted list is a binary integer (32-bit) document frequency,
+        followed by an number of "<id> <token_frequency>" pairs equal to the document frequency.
+        <lexicon> is a binary file written by a LexiconWriter, where every term is assigned
+        a byte-offset from <tell>, its document frequency and its collection frequency.
+        The terms in <invlists> and <lexicon> are sorted.
+
+        :param codec: the name of a codec of <CODECS>
+        """
+        codec = get_codec(codec)
+        with open('invlists', 'wb') as invlists_file, LexiconWriter('lexicon') as lexicon_writer:
+            write_header(invlists_file, codec)
+            for term, term_occurrences in self.iterate_postings():
+                collection_frequency = sum(token_frequency for _, token_frequency in term_occurrences)
+                lexicon_writer.add(term, invlists_file.tell(), len(term_occurrences), collection_frequency)
+                invlists_file.write(codec.encode_postings(term_occurrences))
 
     def write_compressed_invlists_lexicon_to_disk(self):
         """
-        Writes an <invlists> file and <lexicon> file to the current working directory.
+        Writes a variable-byte encoded <invlists> file and <lexicon> file to the current working directory.
 
-        <invlists> is a binary integer file (32-bit) composed of sequential inverted lists.
-        Each inverted list is preceded by a document frequency integer.
-        This is followed by an number of "<id> <token_frequency>" pairs equal to the document frequency.
-        <lexicon> is a key-value-pair where every "key" is "term" that is assigned a byte-offset from <tell>.
-        The order of terms/documents in <invlists> and <lexicon> are unordered because <postings> is unordered.
-        """
-        postings = self.create_postings()
-        with open('invlists', 'wb') as invlists_file, open('lexicon', 'w') as lexicon_file:
-            for term in postings.keys():
-                lexicon_file.write(term + ' ' + str(invlists_file.tell()) + '\n')
-                term_occurrences = Counter(postings[term])
-                document_frequency = len(term_occurrences.keys())
-                invlists_file.write(encode(document_frequency))
-                for document_id in term_occurrences.keys():
-                    invlists_file.write(encode(document_id) + encode(term_occurrences[document_id]))
+        <invlists> is composed of sequential inverted lists of variable-byte integers.
+        Each inverted list begins with a header of the document frequency and the byte length of the list.
+        This is followed by a skip table of 32-bit "<id> <byte-offset>" pairs, one for every block of
+        <SKIP_INTERVAL> postings, and by "<d-gap> <token_frequency>" pairs equal to the document frequency,
+        where each <d-gap> is the difference between a document <id> and the previous <id> in the list.
+        The header allows a whole inverted list to be read and decoded from a single buffer, and the
+        skip table allows a single block to be decoded, see <encode_skips>.
+        """
+        self.write_invlists_lexicon_to_disk('vbyte')
 
     def print_terms(self):
         """
         Prints the terms in each document to standard output.
 
         The terms are printed in-order of appearance.
+        The Documents are not retained, so the <collection> is read a second time.
         """
-        for document in self.documents:
-            for term in document.terms:
+        for id, docno, text in read_documents(self.sourcefile):
+            for term in self.tokenize_text(text):
                 print(term)
+
+
+class SPIMICollection(Collection):
+
+    def __init__(self, sourcefile, stoplist=None, budget=64 * 1024 * 1024, workers=1):
+        """
+        Indexes a <collection> in a single pass without retaining its Documents.
+
+        Postings are handed to a SPIMIIndexer as each Document is parsed and the
+        <map> entries are spooled to a temporary file, so memory use is bounded
+        by the <budget> rather than by the size of the <collection>.
+
+        :param sourcefile: a path to a <collection>
+        :param stoplist: an optional path to a <stoplist>
+        :param budget: the memory budget for accumulated postings measured in bytes
+        :param workers: the number of processes used to parse the <collection>
+        """
+        self.indexer = SPIMIIndexer(budget)
+        self.map_spool = TemporaryFile('w+')
+        Collection.__init__(self, sourcefile, stoplist, workers)
+
+    def add_document(self, document):
+        """
+        Adds the postings of a Document to the SPIMIIndexer and spools its <map> entry.
+
+        :param document: a Document
+        """
+        self.indexer.add_document(document.id, document.terms)
+        self.map_spool.write(str(document.id) + ' ' + document.docno + '\n')
+
+    def add_postings(self, postings, map_entries):
+        """
+        Adds the partial postings of a chunk to the SPIMIIndexer and spools its <map> entries.
+
+        :param postings: a dictionary with "term" as a key and a list of (id, token_frequency) as a value
+        :param map_entries: a list of (id, docno) tuples
+        """
+        self.indexer.add_postings(postings)
+        for id, docno in map_entries:
+            self.map_spool.write(str(id) + ' ' + docno + '\n')
+
+    def write_map_to_disk(self):
+        """
+        Writes a <map> file to the current working directory from the spooled entries.
+        """
+        self.map_spool.seek(0)
+        with open('map', 'w') as f:
+            for line in self.map_spool:
+                f.write(line)
+
+    def iterate_postings(self):
+        """
+        Yields the inverted list of each term in order of term by merging the SPIMI runs.
+
+        :return: a generator of ("term", [(id, token_frequency), ...]) tuples
+        """
+        return self.indexer.merge_runs()
@@ -1,11 +1,13 @@
 #!/usr/bin/env python
 
-from struct import pack, unpack
+import numpy
+
+SKIP_INTERVAL = 128  # the number of postings between the skip entries of an inverted list
 
 
 def encode(integer):
     """
-    Encodes the
+    Encodes a single integer as a variable-byte sequence.
 
     Uses integer operations instead of bit shifts for efficiency. The integer "128"
     is equivalent to "1000 0000" and is used a mask. The algorithm focuses on adding
@@ -15,15 +17,15 @@ def encode(integer):
     :param integer: an integer
     :return: a variable-byte encoded integer
     """
-    bytes = []
+    bytes = bytearray()
     while True:
-        print(integer % 128)
-        bytes.insert(0, integer % 128)  # adds the byte-value to the front of the list
+        bytes.append(integer % 128)  # adds the byte-values in reverse order
         if integer < 128:  # we have already the final byte
             break
         integer = integer // 128  # next byte
-    bytes[-1] += 128  # add a "continuation bit" to the front of a byte
-    return pack('%dB' % len(bytes), *bytes)
+    bytes[0] += 128  # add a "continuation bit" to the front of the final byte
+    bytes.reverse()
+    return bytes
 
 
 def decode(filestream):
@@ -31,17 +33,146 @@ def decode(filestream):
     Decodes an integer from a <filestream> by reading bytes until a "continuation bit" is encountered.
 
     Build an integer by iterating adding byte-values using the opposite operation of <encode>.
-    The byte-values are unpacked one at a time until a "continuation" bit is reached.
+    Only used for the short headers of an inverted list, see <decode_list> for the lists themselves.
 
     :param filestream: a filestream
     :return: an integer decoded from the filestream
     """
     integer = 0
-    byte = unpack('B', filestream.read(1))[0]
     while True:
+        byte = filestream.read(1)[0]
+        if byte < 128:  # byte is missing the "continuation bit"
+            integer = 128 * integer + byte
+        else:  # any byte-value over 128 will have the "continuation bit"
+            return 128 * integer + (byte - 128)
+
+
+def decode_from(buffer, position):
+    """
+    Decodes an integer from a <buffer> starting at <position>.
+
+    :param buffer: a bytes-like object
+    :param position: the index of the first byte of the integer
+    :return: a tuple of the decoded integer and the index following its final byte
+    """
+    integer = 0
+    while True:
+        byte = buffer[position]
+        position += 1
         if byte < 128:  # byte is missing the "continuation bit"
             integer = 128 * integer + byte
-            byte = unpack('B', filestream.read(1))[0]  # read next byte
         else:  # any byte-value over 128 will have the "continuation bit"
-            integer = 128 * integer + (byte - 128)
-            return integer
+            return 128 * integer + (byte - 128), position
+
+
+def encode_list(integers):
+    """
+    Encodes a sequence of integers as consecutive variable-byte sequences in one pass.
+
+    The number of bytes needed by every integer is computed up front, giving the position
+    of each integer's final byte. The 7-bit groups are then written for all integers at once,
+    one group position at a time, from the least significant group backwards.
+
+    :param integers: a sequence of non-negative integers
+    :return: the variable-byte encoded integers
+    """
+    values = numpy.asarray(integers, dtype=numpy.uint64)
+    if not len(values):
+        return b''
+    lengths = encoded_lengths(values)
+    ends = numpy.cumsum(lengths) - 1  # position of the final byte of each integer
+    bytes = numpy.zeros(ends[-1] + 1, dtype=numpy.uint8)
+    for group in range(lengths.max()):
+        remaining = lengths > group
+        bytes[ends[remaining] - group] = (values[remaining] >> numpy.uint64(7 * group)) & numpy.uint64(127)
+    bytes[ends] |= 128  # add a "continuation bit" to the final byte of each integer
+    return bytes.tobytes()
+
+
+def encoded_lengths(values):
+    """
+    Returns the number of bytes of the variable-byte sequence of every integer.
+
+    :param values: a numpy array of non-negative integers
+    :return: a numpy array of the byte lengths
+    """
+    lengths = numpy.ones(len(values), dtype=numpy.int64)
+    limit = 128
+    while len(values) and limit <= values.max():
+        lengths += values >= limit
+        limit *= 128
+    return lengths
+
+
+def decode_list(buffer):
+    """
+    Decodes every variable-byte sequence in a <buffer> using bulk array operations.
+
+    The final byte of each integer is located by its "continuation bit". Every byte is
+    shifted by 7 bits for each byte that follows it within its integer, and the shifted
+    values of each integer are summed with a single <reduceat>.
+
+    :param buffer: a bytes-like object of variable-byte encoded integers
+    :return: a numpy array of the decoded integers
+    """
+    bytes = numpy.frombuffer(buffer, dtype=numpy.uint8)
+    ends = numpy.flatnonzero(bytes >= 128)
+    values = (bytes & 127).astype(numpy.int64)
+    if len(ends) == len(bytes):  # every integer fits in a single byte
+        return values
+    starts = numpy.empty(len(ends), dtype=numpy.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    shifts = 7 * (numpy.repeat(ends, ends - starts + 1) - numpy.arange(len(bytes)))
+    return numpy.add.reduceat(values << shifts, starts)
+
+
+def encode_postings(postings):
+    """
+    Encodes an inverted list as interleaved "<d-gap> <token_frequency>" variable-byte sequences.
+
+    Each document <id> is stored as the difference from the previous <id> in the list,
+    so the postings must be sorted by <id>. The first <d-gap> is the <id> itself.
+
+    :param postings: a list of (id, token_frequency) tuples sorted by id
+    :return: the encoded inverted list
+    """
+    pairs = numpy.array(postings, dtype=numpy.int64).reshape(-1, 2)
+    pairs[1:, 0] -= pairs[:-1, 0].copy()  # converts ids into d-gaps
+    return encode_list(pairs.ravel())
+
+
+def encode_skips(postings, interval=SKIP_INTERVAL):
+    """
+    Encodes an inverted list like <encode_postings>, and the skip table of its blocks.
+
+    The postings are grouped into blocks of <interval> postings. The skip entry of a block
+    is the <id> of its last posting and the byte-offset following its last byte within the
+    encoded list, so a reader can binary search the table for the block holding an <id>
+    and decode that block alone, continuing the <d-gap> values from the previous entry.
+
+    :param postings: a list of (id, token_frequency) tuples sorted by id
+    :param interval: the number of postings in a block
+    :return: a tuple of the encoded inverted list and the skip table as little-endian 32-bit (id, byte-offset) pairs
+    """
+    pairs = numpy.array(postings, dtype=numpy.int64).reshape(-1, 2)
+    ids = pairs[:, 0].copy()
+    pairs[1:, 0] -= ids[:-1]  # converts ids into d-gaps
+    values = pairs.ravel()
+    ends = numpy.cumsum(encoded_lengths(values.astype(numpy.uint64)))[1::2]  # the byte-offset following each posting
+    last = numpy.append(numpy.arange(interval - 1, len(ids) - 1, interval), len(ids) - 1) if len(ids) else []
+    table = numpy.empty((len(last), 2), '<u4')
+    table[:, 0] = ids[last]
+    table[:, 1] = ends[last]
+    return encode_list(values), table.tobytes()
+
+
+def decode_postings(buffer):
+    """
+    Decodes an inverted list encoded by <encode_postings>.
+
+    :param buffer: a bytes-like object holding a whole encoded inverted list
+    :return: a tuple of numpy arrays of document ids and token frequencies
+    """
+    values = decode_list(buffer)
+    return numpy.cumsum(values[0::2]), values[1::2]
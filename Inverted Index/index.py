@@ -1,26 +1,39 @@
 #!/usr/bin/env python
 
 from argparse import ArgumentParser
-from collection import Collection
+from codec import CODECS
+from collection import Collection, SPIMICollection
 
 
-def main():
+def main(codec='raw'):
     """
     <index.py> requires a path to a <collection> as an argument.
 
     The required "sourcefile" argument is a path to a <collection>
     The optional "-s" argument requires a path to a <stoplist> as an extra argument.
     The optional "-p" argument is a Boolean switch
+    The optional "-b" argument is a memory budget in megabytes, enabling single-pass (SPIMI) indexing
+    The optional "-w" argument is a number of worker processes used to parse the <collection>
+    The optional "-c" argument is the codec of the inverted lists, see <CODECS>, "raw" by default
+
+    :param codec: the default of the "-c" argument, "vbyte" for <index_vb.py>
     """
     parser = ArgumentParser(add_help=False)
     parser.add_argument('-s', metavar='\b <stopfile>', nargs=1)
     parser.add_argument('-p', action='store_true')
+    parser.add_argument('-b', metavar='\b <budget>', type=int)
+    parser.add_argument('-w', '--workers', metavar='\b <workers>', type=int, default=1)
+    parser.add_argument('-c', metavar='\b <codec>', choices=CODECS, default=codec)
     parser.add_argument('sourcefile', metavar='<sourcefile>')
     args = parser.parse_args()
 
-    collection = Collection(args.sourcefile, args.s[0]) if args.s else Collection(args.sourcefile)
+    stoplist = args.s[0] if args.s else None
+    if args.b:
+        collection = SPIMICollection(args.sourcefile, stoplist, args.b * 1024 * 1024, args.workers)
+    else:
+        collection = Collection(args.sourcefile, stoplist, args.workers)
     collection.write_map_to_disk()
-    collection.write_invlists_lexicon_to_disk()
+    collection.write_invlists_lexicon_to_disk(args.c)
     if args.p:
         collection.print_terms()
 
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+from codec import detect_codec, get_codec, read_header
+from compression import decode_from, SKIP_INTERVAL
+from mmap import mmap, ACCESS_READ
+import numpy
+
+
+class InvertedFile:
+
+    def __init__(self, file_path, compressed=None):
+        """
+        Reads inverted lists from a memory-mapped <invlists> file.
+
+        The whole file is mapped once, so reading an inverted list is a slice of the
+        mapping rather than a <seek> followed by a <read> for every posting.
+
+        The codec of the inverted lists is named by the header of the <invlists> file, see
+        <write_header>. A file written before the header existed is read with the codec implied
+        by <compressed>, or with the codec found by <detect_codec> if <compressed> is not given.
+
+        :param file_path: a path to an <invlists> file
+        :param compressed: True if an <invlists> file without a header is variable-byte encoded, False if it is raw
+        """
+        self.file = open(file_path, 'rb')
+        try:
+            self.buffer = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+        except ValueError:  # an empty file cannot be mapped
+            self.buffer = b''
+        self.codec = read_header(self.buffer)
+        if self.codec is None and compressed is None:
+            self.codec = detect_codec(self.buffer)
+        elif self.codec is None:
+            self.codec = get_codec('vbyte' if compressed else 'raw')
+        self.compressed = self.codec.blocked
+
+    def postings(self, byte_offset):
+        """
+        Returns the inverted list found at a <byte_offset> as arrays of ids and frequencies.
+
+        For a 32-bit <invlists> file the arrays are zero-copy strided views of the mapping.
+        For any other codec the list is sliced from the mapping through a <memoryview>
+        past its skip table and decoded by the codec, see <BlockCodec.decode_postings>.
+
+        :param byte_offset: the byte-offset of the inverted list from the <lexicon>
+        :return: a tuple of numpy arrays of document ids and within-document frequencies
+        """
+        if self.compressed:
+            document_frequency, position = decode_from(self.buffer, byte_offset)
+            length, position = decode_from(self.buffer, position)
+            position += 8 * -(-document_frequency // SKIP_INTERVAL)  # skips the skip table
+            return self.codec.decode_postings(memoryview(self.buffer)[position:position + length], document_frequency)
+        document_frequency = int(numpy.frombuffer(self.buffer, numpy.uint32, 1, byte_offset)[0])
+        pairs = numpy.frombuffer(self.buffer, numpy.uint32, 2 * document_frequency, byte_offset + 4)
+        return pairs[0::2], pairs[1::2]
+
+    def inverted_list(self, byte_offset):
+        """
+        Returns the inverted list found at a <byte_offset> without decoding it.
+
+        :param byte_offset: the byte-offset of the inverted list from the <lexicon>
+        :return: an InvertedList
+        """
+        return InvertedList(self, byte_offset)
+
+    def close(self):
+        """
+        Releases the mapping and closes the <invlists> file.
+
+        If views returned by <postings> are still alive, the mapping is instead
+        released once the last of them is garbage collected.
+        """
+        if isinstance(self.buffer, mmap):
+            try:
+                self.buffer.close()
+            except BufferError:
+                pass
+        self.buffer = b''
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class InvertedList:
+
+    def __init__(self, invlists, byte_offset):
+        """
+        An inverted list of an InvertedFile that is searched for ids without being decoded.
+
+        The ids of a 32-bit <invlists> file are a zero-copy view that is binary searched directly.
+        For any other codec only the header and the skip table are read, as a zero-copy view
+        of 32-bit "<id> <byte-offset>" pairs; see <encode_skips>.
+
+        :param invlists: an InvertedFile
+        :param byte_offset: the byte-offset of the inverted list from the <lexicon>
+        """
+        self.invlists = invlists
+        self.byte_offset = byte_offset
+        buffer = invlists.buffer
+        if invlists.compressed:
+            self.df, position = decode_from(buffer, byte_offset)
+            self.length, position = decode_from(buffer, position)
+            blocks = -(-self.df // SKIP_INTERVAL)
+            skips = numpy.frombuffer(buffer, '<u4', 2 * blocks, position)
+            self.last_ids, self.ends = skips[0::2], skips[1::2]
+            self.position = position + 8 * blocks  # the byte-offset of the encoded postings
+        else:
+            self.df = int(numpy.frombuffer(buffer, numpy.uint32, 1, byte_offset)[0])
+            self.ids_view = numpy.frombuffer(buffer, numpy.uint32, 2 * self.df, byte_offset + 4)[0::2]
+
+    def __len__(self):
+        return self.df
+
+    def ids(self):
+        """
+        Returns every id of the inverted list.
+
+        :return: a numpy array of document ids in ascending order
+        """
+        if self.invlists.compressed:
+            return self.invlists.postings(self.byte_offset)[0]
+        return self.ids_view
+
+    def contains(self, candidates):
+        """
+        Returns which of a sorted array of ids are in the inverted list.
+
+        In a 32-bit <invlists> file, the zero-copy view of the ids is binary searched for every
+        candidate, see <members>. Otherwise the skip table is binary searched for the block that
+        could hold each candidate, and only those blocks are decoded, together, by the codec of
+        the <invlists> file. Blocks between the candidates are never read, so the cost follows
+        the number of candidates rather than the length of the inverted list.
+
+        :param candidates: a numpy array of ids in ascending order
+        :return: a numpy array of booleans aligned with <candidates>
+        """
+        if not self.invlists.compressed:
+            return members(self.ids_view, candidates)
+        blocks = lower_bounds(self.last_ids, candidates)  # the first block whose last id is not smaller
+        found = numpy.zeros(len(candidates), bool)
+        inside = blocks < len(self.last_ids)
+        selected = blocks[inside]
+        selected = selected[numpy.diff(selected, prepend=-1) != 0]  # each block once, as the candidates are sorted
+        if not len(selected):
+            return found
+        starts = numpy.where(selected > 0, self.ends[numpy.maximum(selected - 1, 0)], 0).astype(numpy.int64)
+        ends = self.ends[selected].astype(numpy.int64)
+        buffer = memoryview(self.invlists.buffer)[self.position:self.position + self.length]
+        counts = numpy.minimum(SKIP_INTERVAL, self.df - selected * SKIP_INTERVAL)  # the postings of each block
+        blocks = b''.join(buffer[start:end] for start, end in zip(starts.tolist(), ends.tolist()))
+        gaps, _ = self.invlists.codec.decode_blocks(blocks, counts)
+        bases = numpy.where(selected > 0, self.last_ids[numpy.maximum(selected - 1, 0)], 0).astype(numpy.int64)
+        totals = numpy.cumsum(gaps)
+        firsts = numpy.cumsum(counts) - counts  # the index of the first posting of each block
+        ids = totals - numpy.repeat(totals[firsts] - gaps[firsts] - bases, counts)
+        found[inside] = members(ids, candidates[inside])
+        return found
+
+
+def lower_bounds(ids, candidates):
+    """
+    Returns the index of the first id not smaller than each candidate, by binary search.
+
+    Every candidate is searched at once, one halving step at a time. Unlike <searchsorted>,
+    the <ids> are only indexed, so a strided view of a mapping is never copied and the cost
+    follows the number of candidates rather than the number of ids.
+
+    :param ids: a numpy array of ids in ascending order
+    :param candidates: a numpy array of ids
+    :return: a numpy array of indexes aligned with <candidates>, len(ids) if every id is smaller
+    """
+    low = numpy.zeros(len(candidates), numpy.int64)
+    high = numpy.full(len(candidates), len(ids), numpy.int64)
+    for _ in range(len(ids).bit_length()):
+        middle = (low + high) // 2
+        smaller = (middle < high) & (ids[numpy.minimum(middle, len(ids) - 1)] < candidates)
+        low = numpy.where(smaller, middle + 1, low)
+        high = numpy.where(smaller, high, middle)
+    return low
+
+
+def members(ids, candidates):
+    """
+    Returns which of an array of candidates are in a sorted array of ids.
+
+    :param ids: a numpy array of ids in ascending order
+    :param candidates: a numpy array of ids
+    :return: a numpy array of booleans aligned with <candidates>
+    """
+    if not len(ids):
+        return numpy.zeros(len(candidates), bool)
+    positions = numpy.minimum(lower_bounds(ids, candidates), len(ids) - 1)
+    return ids[positions] == candidates
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+from collections import namedtuple
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+
+HEADER = Struct('<4sIQQQ')  # magic, block size, term count, block count, byte-offset of the block index
+TERM = Struct('<HH')  # length of the prefix shared with the previous term, length of the suffix
+ENTRY = Struct('<QIId')  # byte-offset in <invlists>, document frequency, collection frequency, maximum score
+BLOCK_OFFSET = Struct('<Q')
+MAGIC = b'LEX1'
+BLOCK_SIZE = 16
+
+LexiconEntry = namedtuple('LexiconEntry', ['offset', 'df', 'cf', 'max_score'])
+
+
+class LexiconWriter:
+
+    def __init__(self, file_path, block_size=BLOCK_SIZE):
+        """
+        Writes a binary <lexicon> file of sorted, front-coded blocks.
+
+        Terms are grouped into blocks of <block_size> entries. The first term of a block is
+        stored in full and every following term only stores the suffix that differs from
+        the previous term. Each term is followed by its <invlists> byte-offset, document
+        frequency, collection frequency and the maximum of its within-document score
+        component over its inverted list. A block index of byte-offsets is appended
+        after the blocks so that a reader can binary search the first term of each block.
+
+        :param file_path: a path to the <lexicon> file
+        :param block_size: the number of terms in each block
+        """
+        self.file = open(file_path, 'wb')
+        self.block_size = block_size
+        self.block_offsets = []
+        self.previous = b''
+        self.count = 0
+        self.file.write(HEADER.pack(MAGIC, block_size, 0, 0, 0))
+
+    def add(self, term, offset, df, cf, max_score=0.0):
+        """
+        Appends a term to the <lexicon>, terms must be added in sorted order.
+
+        :param term: a term
+        :param offset: the byte-offset of the inverted list of the term in <invlists>
+        :param df: the number of documents containing the term
+        :param cf: the number of occurrences of the term in the collection
+        :param max_score: an upper bound of the term's within-document score component, e.g. for BM25
+        """
+        encoded = term.encode('utf-8')
+        if self.count and encoded <= self.previous:
+            raise ValueError("Terms must be added to the lexicon in sorted order, '%s' is out of order." % term)
+        term = encoded
+        prefix = 0
+        if self.count % self.block_size == 0:  # begins a new block with a full term
+            self.block_offsets.append(self.file.tell())
+        else:
+            limit = min(len(term), len(self.previous), 65535)
+            while prefix < limit and term[prefix] == self.previous[prefix]:
+                prefix += 1
+        self.file.write(TERM.pack(prefix, len(term) - prefix) + term[prefix:] + ENTRY.pack(offset, df, cf, max_score))
+        self.previous = term
+        self.count += 1
+
+    def close(self):
+        """
+        Appends the block index and completes the header of the <lexicon>.
+        """
+        index_offset = self.file.tell()
+        for block_offset in self.block_offsets:
+            self.file.write(BLOCK_OFFSET.pack(block_offset))
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, self.block_size, self.count, len(self.block_offsets), index_offset))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Lexicon:
+
+    def __init__(self, file_path):
+        """
+        Looks up terms in a memory-mapped binary <lexicon> file written by a LexiconWriter.
+
+        The file is not parsed when it is opened. A lookup binary searches the first
+        term of each block and then decodes the terms of a single block.
+
+        :param file_path: a path to a <lexicon> file
+        """
+        self.file = open(file_path, 'rb')
+        self.buffer = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+        magic, self.block_size, self.count, self.block_count, self.index_offset = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError("'%s' is not a binary lexicon file." % file_path)
+
+    def block_offset(self, block):
+        """
+        Returns the byte-offset of a block from the block index.
+
+        :param block: the number of the block
+        :return: the byte-offset of the block
+        """
+        return BLOCK_OFFSET.unpack_from(self.buffer, self.index_offset + block * BLOCK_OFFSET.size)[0]
+
+    def first_term(self, block):
+        """
+        Returns the full first term of a block as bytes.
+
+        :param block: the number of the block
+        :return: the encoded first term of the block
+        """
+        position = self.block_offset(block)
+        _, length = TERM.unpack_from(self.buffer, position)
+        position += TERM.size
+        return self.buffer[position:position + length]
+
+    def iterate_block(self, block):
+        """
+        Yields the (term, LexiconEntry) tuples of a block in order, with terms as bytes.
+
+        :param block: the number of the block
+        """
+        position = self.block_offset(block)
+        term = b''
+        for _ in range(min(self.block_size, self.count - block * self.block_size)):
+            prefix, length = TERM.unpack_from(self.buffer, position)
+            position += TERM.size
+            term = term[:prefix] + self.buffer[position:position + length]
+            position += length
+            yield term, LexiconEntry._make(ENTRY.unpack_from(self.buffer, position))
+            position += ENTRY.size
+
+    def find(self, term):
+        """
+        Returns the rank of a term in sorted order and its LexiconEntry.
+
+        The rank is a dense identifier of the term, from 0 to the number of terms - 1.
+
+        :param term: a term
+        :return: a tuple of (rank, LexiconEntry), or None if the term is not in the <lexicon>
+        """
+        key = term.encode('utf-8')
+        low, high = 0, self.block_count
+        while low < high:  # finds the first block with a first term greater than the key
+            middle = (low + high) // 2
+            if self.first_term(middle) <= key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return None
+        for rank, (block_term, entry) in enumerate(self.iterate_block(low - 1), (low - 1) * self.block_size):
+            if block_term == key:
+                return rank, entry
+            if block_term > key:
+                break
+        return None
+
+    def entries(self, ranks):
+        """
+        Yields the (rank, term, LexiconEntry) tuples of terms by their rank in sorted order.
+
+        Each block holding one of the ranks is decoded once.
+
+        :param ranks: an iterable of ranks in ascending order
+        """
+        block, terms = None, []
+        for rank in ranks:
+            if rank // self.block_size != block:
+                block = rank // self.block_size
+                terms = list(self.iterate_block(block))
+            term, entry = terms[rank % self.block_size]
+            yield rank, term.decode('utf-8'), entry
+
+    def get(self, term, default=None):
+        """
+        Returns the LexiconEntry of a term.
+
+        :param term: a term
+        :param default: the value returned if the term is not in the <lexicon>
+        :return: a LexiconEntry of (offset, df, cf, max_score)
+        """
+        found = self.find(term)
+        return found[1] if found else default
+
+    def __getitem__(self, term):
+        entry = self.get(term)
+        if entry is None:
+            raise KeyError(term)
+        return entry
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def __len__(self):
+        return self.count
+
+    def items(self):
+        """
+        Yields every (term, LexiconEntry) tuple of the <lexicon> in sorted order.
+        """
+        for block in range(self.block_count):
+            for term, entry in self.iterate_block(block):
+                yield term.decode('utf-8'), entry
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
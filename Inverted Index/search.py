@@ -1,13 +1,18 @@
 #!/usr/bin/env python
 
 from argparse import ArgumentParser
-from struct import unpack
+from boolean import run_query
+from inverted_file import InvertedFile
+from lexicon import Lexicon
+from tokenizer import tokenize
+import numpy
 
 
 def main():
     """
     <search.py> requires 3 files as an argument and a number of space-separated queries (n >= 1).
-    The <lexicon> and <map> files are loaded into a dictionaries for faster access.
+    The <map> file is loaded into a dictionary for faster access.
+    The binary <lexicon> file is memory-mapped and searched for each query term without being loaded.
     The list of queries is iterated, outputting the following if the query exists in the lexicon:
 
     > [query_1]
@@ -18,15 +23,36 @@ def main():
     > ...
     > [document_n] [document_n_query_count]
 
+    The query terms are tokenized like the documents of the <collection>, see <tokenize>, so
+    "On-Campus" searches for the terms "on" and "campus".
+
     An inverted list from <invlists> is directly accessed by using a byte-offset found in the lexicon.
     The inverted list is begins with the <document frequency>, to indicate the size of the list.
     It is followed by an equal number of <docno> and <within-document frequency> pairs.
     This information is printed to the console in a list using the above format.
 
-    The conversion from binary integers to integers is handled by the <struct> library.
-    <struct> treats every 4 bytes (32 bit) from the <byte_offset> as an integer.
+    The optional "-b" argument instead evaluates the query terms as a single Boolean query of "AND",
+    "OR", "NOT" and parentheses, e.g. "cat AND (dog OR NOT mouse)", see <parse_query>, outputting:
+
+    > [query]
+    > [document_count]
+    > [document_1_docno]
+    > ...
+    > [document_n_docno]
+
+    Conjunctions start from the rarest term and only search the other inverted lists for its documents.
+
+    <invlists> is memory-mapped by an InvertedFile, which reads the codec of the inverted lists from
+    the header of the file, so an index written with any codec of <index.py> is searched, see <CODECS>.
+    A file written before the header existed is either raw or variable-byte, told apart by <detect_codec>.
+    With the "raw" codec, every 4 bytes (32 bit) from the <byte_offset> are treated as an integer
+    and the whole inverted list is returned as a zero-copy array view. With the other codecs, the
+    inverted list begins with the <document frequency> and its byte length, followed by a skip table
+    of the last <id> of every block of postings and by the encoded <d-gap> and <within-document frequency>
+    values, which are decoded in bulk from a single slice of the mapping.
     """
     parser = ArgumentParser(add_help=False)
+    parser.add_argument('-b', action='store_true')
     parser.add_argument('lexicon', metavar='<lexicon>')
     parser.add_argument('invlists', metavar='<invlists>')
     parser.add_argument('map', metavar='<map>')
@@ -34,28 +60,34 @@ def main():
     args = parser.parse_args()
 
     document_map = {}
-    term_lexicon = {}
 
-    with open(args.map, 'r') as map_file, open(args.lexicon, 'r') as lexicon_file:
+    with open(args.map, 'r') as map_file:
         for line in map_file:
             (id, docno) = line.split()
             document_map[id] = docno
-        for line in lexicon_file:
-            (term, byte_offset) = line.split()
-            term_lexicon[term] = byte_offset
 
-    with open(args.invlists, 'rb') as invlists_file:
-        for term in args.queryterms:
-            if term in term_lexicon:
+    with Lexicon(args.lexicon) as term_lexicon, InvertedFile(args.invlists) as invlists_file:
+        if args.b:
+            query = ' '.join(args.queryterms)
+            universe = numpy.array(sorted(int(id) for id in document_map), numpy.int64)
+            try:
+                ids = run_query(query, term_lexicon, invlists_file, universe)
+            except ValueError as e:
+                parser.error(str(e))
+            print(query)
+            print(len(ids))
+            for id in ids.tolist():
+                print(document_map[str(id)])
+            return
+        for term in tokenize(' '.join(args.queryterms)):
+            entry = term_lexicon.get(term)
+            if entry:
                 print(term)
-                byte_offset = int(term_lexicon[term])
-                invlists_file.seek(byte_offset)
-                document_frequency = unpack('I', invlists_file.read(4))[0]
-                print(document_frequency)
-                for _ in range(document_frequency):
-                    docno = document_map[str(unpack('I', invlists_file.read(4))[0])]
-                    within_document_frequency = str(unpack('I', invlists_file.read(4))[0])
-                    print(docno + ' ' + within_document_frequency)
+                ids, within_document_frequencies = invlists_file.postings(entry.offset)
+                print(entry.df)
+                for id, within_document_frequency in zip(ids.tolist(), within_document_frequencies.tolist()):
+                    docno = document_map[str(id)]
+                    print(docno + ' ' + str(within_document_frequency))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import pytest
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NAMES = sorted(name[:-3] for name in os.listdir(DIRECTORY) if name.endswith('.py'))
+
+# The modules of each program import each other by name, and both programs have modules of the
+# same name, so the modules of this directory are imported up front and restored before each test.
+for name in NAMES:
+    sys.modules.pop(name, None)
+sys.path.insert(0, DIRECTORY)
+MODULES = {name: __import__(name) for name in NAMES}
+
+from benchmark import generate_collection  # noqa: E402
+
+
+def restore_modules():
+    """
+    Restores the modules of this directory, which the tests of the other program replace.
+    """
+    sys.path[:] = [DIRECTORY] + [path for path in sys.path if path != DIRECTORY]
+    sys.modules.update(MODULES)
+
+
+def pytest_collectstart(collector):
+    """
+    Restores the modules of this directory before a test module of this directory is imported.
+    """
+    restore_modules()
+
+
+@pytest.fixture(autouse=True)
+def modules():
+    """
+    Restores the modules of this directory before each test.
+    """
+    restore_modules()
+
+
+@pytest.fixture(scope='session')
+def collection(tmp_path_factory):
+    """
+    Returns a path to a small synthetic <collection>, see <generate_collection>.
+    """
+    file_path = str(tmp_path_factory.mktemp('collection') / 'collection')
+    generate_collection(file_path, 300, vocabulary=2000, length=60)
+    return file_path
+
+
+@pytest.fixture
+def stoplist(tmp_path):
+    """
+    Returns a path to a <stoplist> of a few common words.
+    """
+    file_path = tmp_path / 'stoplist'
+    file_path.write_text('\n'.join(['the', 'a', 'of', 'and', 's']))
+    return str(file_path)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+from benchmark import generate_collection, generate_vocabulary, run_benchmark, STAGES
+from collection import Collection
+from trec import read_documents
+import numpy
+
+
+def test_generate_vocabulary():
+    words = generate_vocabulary(500, numpy.random.default_rng(0))
+    assert len(set(words)) == 500
+    assert words == sorted(words, key=lambda word: (len(word), word))
+    assert all(2 <= len(word) <= 10 and word.isalpha() and word.islower() for word in words)
+
+
+def test_generate_collection(tmp_path):
+    first, second, other = (str(tmp_path / name) for name in ('first', 'second', 'other'))
+    generate_collection(first, 50, vocabulary=300, length=40)
+    generate_collection(second, 50, vocabulary=300, length=40)
+    generate_collection(other, 50, vocabulary=300, length=40, seed=1)
+    with open(first) as f, open(second) as g, open(other) as h:
+        text = f.read()
+        assert text == g.read() and text != h.read()
+    documents = list(read_documents(first))
+    assert [(id, docno) for id, docno, _ in documents] == [(id, 'SYN%07d' % id) for id in range(1, 51)]
+    assert all(text.strip() for _, _, text in documents)
+    assert "'s" in text and '-' in text and ',' in text
+
+
+def test_run_benchmark(tmp_path, monkeypatch, collection):
+    result = run_benchmark(collection, trials=2)
+    monkeypatch.chdir(tmp_path)
+    c = Collection(collection)
+    c.write_invlists_lexicon_to_disk()
+    postings = sum(len(term_postings) for term_postings in c.postings.values())
+    assert (result['documents'], result['terms'], result['postings']) == (len(c.map), len(c.postings), postings)
+    assert result['invlists_bytes']['raw'] == (tmp_path / 'invlists').stat().st_size
+    assert result['lexicon_bytes'] == (tmp_path / 'lexicon').stat().st_size
+    assert result['invlists_bytes']['vbyte'] < result['invlists_bytes']['raw']
+    assert set(result['stages']) == set(STAGES)
+    assert all(stage['seconds'] > 0 for stage in result['stages'].values())
+    assert result['total']['seconds'] == sum(stage['seconds'] for stage in result['stages'].values())
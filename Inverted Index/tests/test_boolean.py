@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+from boolean import parse_query, run_query
+from collection import Collection
+from inverted_file import InvertedFile
+from lexicon import Lexicon
+import numpy
+import pytest
+
+
+def test_parse_query():
+    assert parse_query('cat dog OR NOT mouse') == ('or', [('and', [('term', 'cat'), ('term', 'dog')]),
+                                                          ('not', ('term', 'mouse'))])
+    assert parse_query('cat AND NOT NOT dog') == ('and', [('term', 'cat'), ('not', ('not', ('term', 'dog')))])
+    assert parse_query('(a OR b) c') == ('and', [('or', [('term', 'a'), ('term', 'b')]), ('term', 'c')])
+    for query in ('', 'cat AND', '(cat', 'cat OR OR dog', ')'):
+        with pytest.raises(ValueError):
+            parse_query(query)
+
+
+def naive(node, sets, universe):
+    """
+    Evaluates a node of <parse_query> with Python sets.
+    """
+    kind = node[0]
+    if kind == 'term':
+        return sets.get(node[1], set())
+    if kind == 'not':
+        return universe - naive(node[1], sets, universe)
+    children = [naive(child, sets, universe) for child in node[1]]
+    return set.union(*children) if kind == 'or' else set.intersection(*children)
+
+
+def build_index(directory, monkeypatch, collection, compressed):
+    """
+    Writes the <lexicon> and <invlists> files of a <collection> to <directory>.
+
+    :return: a dictionary of the set of ids of each term
+    """
+    monkeypatch.chdir(directory)
+    c = Collection(collection)
+    if compressed:
+        c.write_compressed_invlists_lexicon_to_disk()
+    else:
+        c.write_invlists_lexicon_to_disk()
+    return {term: set(id for id, _ in postings) for term, postings in c.postings.items()}
+
+
+@pytest.mark.parametrize('compressed', [False, True])
+def test_matches_set_evaluation(tmp_path, monkeypatch, collection, compressed):
+    sets = build_index(tmp_path, monkeypatch, collection, compressed)
+    universe = set.union(*sets.values())
+    terms = sorted(sets, key=lambda term: -len(sets[term]))
+    common, middle, rare = terms[:3], terms[len(terms) // 50:len(terms) // 50 + 3], terms[-3:]
+    queries = ['%s %s' % (common[0], common[1]), '%s %s' % (common[0], rare[0]), '%s OR %s' % (middle[0], rare[1]),
+               '%s NOT %s' % (common[0], common[1]), 'NOT %s' % middle[0], '%s %s %s' % tuple(middle),
+               '(%s OR %s) NOT (%s OR %s)' % (common[0], middle[0], common[1], middle[1]),
+               '%s missingterm' % common[0], 'missingterm OR %s' % rare[2], 'NOT (%s %s)' % (common[2], middle[2])]
+    with Lexicon('lexicon') as lexicon, InvertedFile('invlists', compressed) as invlists:
+        ids = numpy.array(sorted(universe), numpy.int64)
+        for query in queries:
+            expected = sorted(naive(parse_query(query), sets, universe))
+            assert run_query(query, lexicon, invlists, ids).tolist() == expected, query
+
+
+@pytest.mark.parametrize('compressed', [False, True])
+def test_contains_matches_isin(tmp_path, monkeypatch, collection, compressed):
+    sets = build_index(tmp_path, monkeypatch, collection, compressed)
+    random = numpy.random.default_rng(1)
+    with Lexicon('lexicon') as lexicon, InvertedFile('invlists', compressed) as invlists:
+        for term in sorted(sets, key=lambda term: -len(sets[term]))[:200:20]:
+            inverted_list = invlists.inverted_list(lexicon[term].offset)
+            ids = numpy.array(sorted(sets[term]))
+            assert len(inverted_list) == len(ids) and inverted_list.ids().tolist() == ids.tolist()
+            for size in (0, 1, 10, 100, 1000):
+                candidates = numpy.unique(random.integers(0, 320, size))
+                assert inverted_list.contains(candidates).tolist() == numpy.isin(candidates, ids).tolist()
+            assert inverted_list.contains(ids).all()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+from benchmark_codecs import benchmark_codec, decode_all, main as benchmark_main, write_lists
+from codec import BlockCodec, CODECS, detect_codec, get_codec, read_header, write_header
+from collection import Collection
+from compression import SKIP_INTERVAL
+from inverted_file import InvertedFile
+from io import BytesIO
+from json import load
+from lexicon import Lexicon
+import index
+import index_vb
+import numpy
+import pytest
+import search
+import search_vb
+import sys
+
+BLOCK_CODECS = [name for name, codec in CODECS.items() if codec.blocked]
+
+
+def random_postings(count, seed=0, spread=50, largest=1000):
+    """
+    Returns a list of <count> (id, token_frequency) tuples sorted by id, with skewed gaps and frequencies.
+    """
+    random = numpy.random.default_rng(seed)
+    ids = numpy.cumsum(random.integers(1, spread, count))
+    frequencies = numpy.minimum(random.zipf(1.5, count), largest)
+    return list(zip(ids.tolist(), frequencies.tolist()))
+
+
+def write_invlists(file_path, codec, inverted_lists):
+    """
+    Writes an <invlists> file of several inverted lists, returning the byte-offset of each.
+    """
+    offsets = []
+    with open(file_path, 'wb') as f:
+        write_header(f, codec)
+        for postings in inverted_lists:
+            offsets.append(f.tell())
+            f.write(codec.encode_postings(postings))
+    return offsets
+
+
+@pytest.mark.parametrize('name', BLOCK_CODECS)
+@pytest.mark.parametrize('values', [[1], [1, 2, 3], [127, 128, 129, 16383, 16384], [1] * 300,
+                                    [2 ** 31 - 1, 1, 2 ** 20], list(range(1, 1000, 7))])
+def test_encode_decode_chunk(name, values):
+    codec = get_codec(name)
+    encoded = codec.encode(numpy.array(values, numpy.int64))
+    decoded, position = codec.decode(b'\xff' + encoded + b'\xff', 1, len(values))
+    assert decoded.tolist() == values
+    assert position == len(encoded) + 1
+
+
+@pytest.mark.parametrize('name', list(CODECS))
+@pytest.mark.parametrize('count', [1, SKIP_INTERVAL - 1, SKIP_INTERVAL, SKIP_INTERVAL + 1, 1000])
+def test_postings_round_trip(tmp_path, name, count):
+    postings = [random_postings(count, seed) for seed in range(3)]
+    offsets = write_invlists(tmp_path / 'invlists', get_codec(name), postings)
+    with InvertedFile(str(tmp_path / 'invlists')) as invlists:
+        assert invlists.codec is get_codec(name)
+        for offset, expected in zip(offsets, postings):
+            ids, frequencies = invlists.postings(offset)
+            assert list(zip(ids.tolist(), frequencies.tolist())) == expected
+            assert len(invlists.inverted_list(offset)) == count
+            assert invlists.inverted_list(offset).ids().tolist() == [id for id, _ in expected]
+
+
+@pytest.mark.parametrize('name', list(CODECS))
+def test_contains_matches_isin(tmp_path, name):
+    postings = random_postings(1000, spread=8)
+    offset, = write_invlists(tmp_path / 'invlists', get_codec(name), [postings])
+    ids = numpy.array([id for id, _ in postings])
+    random = numpy.random.default_rng(1)
+    with InvertedFile(str(tmp_path / 'invlists')) as invlists:
+        inverted_list = invlists.inverted_list(offset)
+        for size in (0, 1, 10, 500, 5000):
+            candidates = numpy.unique(random.integers(0, ids[-1] + 20, size))
+            assert inverted_list.contains(candidates).tolist() == numpy.isin(candidates, ids).tolist()
+        assert inverted_list.contains(ids).all()
+
+
+def test_header():
+    f = BytesIO()
+    write_header(f, get_codec('pfordelta'))
+    assert read_header(f.getvalue()) is get_codec('pfordelta')
+    assert read_header(b'') is None
+    assert read_header(b'\x05\x00\x00\x00' * 8) is None
+
+
+def test_headerless_file(tmp_path):
+    for count in (1, 300):
+        postings = random_postings(count)
+        for compressed, codec in ((False, get_codec('raw')), (True, get_codec('vbyte'))):
+            (tmp_path / 'invlists').write_bytes(codec.encode_postings(postings) + codec.encode_postings(postings[:1]))
+            assert detect_codec(memoryview((tmp_path / 'invlists').read_bytes())) is codec
+            for given in (compressed, None):
+                with InvertedFile(str(tmp_path / 'invlists'), given) as invlists:
+                    assert invlists.codec is codec
+                    ids, frequencies = invlists.postings(0)
+                    assert list(zip(ids.tolist(), frequencies.tolist())) == postings
+    assert detect_codec(b'') is get_codec('raw')
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        get_codec('zstd')
+
+
+@pytest.mark.parametrize('name', list(CODECS))
+def test_index_of_every_codec(tmp_path, monkeypatch, collection, name):
+    monkeypatch.chdir(tmp_path)
+    c = Collection(collection)
+    c.write_invlists_lexicon_to_disk(name)
+    with Lexicon('lexicon') as lexicon, InvertedFile('invlists') as invlists:
+        assert invlists.codec is get_codec(name)
+        for term, entry in lexicon.items():
+            ids, frequencies = invlists.postings(entry.offset)
+            assert list(zip(ids.tolist(), frequencies.tolist())) == c.postings[term]
+
+
+def test_block_codec_is_abstract():
+    with pytest.raises(TypeError):
+        BlockCodec()
+
+
+def test_vb_programs_are_aliases(tmp_path, monkeypatch, capsys, collection):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['index_vb.py', collection])
+    index_vb.main()
+    with InvertedFile('invlists') as invlists, Lexicon('lexicon') as lexicon:
+        assert invlists.codec is get_codec('vbyte')
+        terms = [term for term, _ in lexicon.items()][:200:40]
+    outputs = []
+    for program in (search, search_vb):
+        for options, query in (([], terms), (['-b'], ['%s OR %s' % tuple(terms[:2])])):
+            monkeypatch.setattr(sys, 'argv', ['search.py'] + options + ['lexicon', 'invlists', 'map'] + query)
+            program.main()
+            outputs.append(capsys.readouterr().out)
+    assert outputs[:2] == outputs[2:] and all(outputs)
+    monkeypatch.setattr(sys, 'argv', ['index.py', '-c', 'vbyte', collection])
+    files = [(tmp_path / name).read_bytes() for name in ('invlists', 'lexicon')]
+    index.main()
+    assert [(tmp_path / name).read_bytes() for name in ('invlists', 'lexicon')] == files
+
+
+@pytest.mark.parametrize('name', list(CODECS))
+def test_benchmark_decodes_every_list(tmp_path, name):
+    lists = [random_postings(count, seed) for seed, count in enumerate((1, 127, 300, 2000))]
+    codec = get_codec(name)
+    encoded = [codec.encode_postings(postings) for postings in lists]
+    offsets = write_lists(str(tmp_path / 'invlists'), codec, encoded)
+    with InvertedFile(str(tmp_path / 'invlists')) as invlists:
+        assert decode_all(invlists, offsets) == sum(map(len, lists))
+    result = benchmark_codec(codec, lists)
+    assert result['bytes'] == sum(map(len, encoded))
+    assert result['bytes_per_posting'] == result['bytes'] / sum(map(len, lists))
+
+
+def test_benchmark_main(tmp_path, monkeypatch, capsys, collection):
+    monkeypatch.chdir(tmp_path)
+    Collection(collection).write_invlists_lexicon_to_disk('pfordelta')
+    monkeypatch.setattr(sys, 'argv', ['benchmark_codecs.py', '-c', 'raw', 'vbyte', '-k', '3', '-o', 'results',
+                                      'lexicon', 'invlists'])
+    benchmark_main()
+    lines = capsys.readouterr().out.split('\n')
+    assert [line.split()[0] for line in lines[1:3]] == ['raw', 'vbyte']
+    with open('results') as f:
+        results = load(f)
+    assert results['step'] == 3 and list(results['codecs']) == ['raw', 'vbyte']
+    assert results['codecs']['vbyte']['bytes'] < results['codecs']['raw']['bytes']
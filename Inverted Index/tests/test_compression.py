@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+from compression import (decode, decode_from, decode_list, decode_postings, encode, encode_list, encode_postings,
+                         encode_skips, encoded_lengths)
+from io import BytesIO
+import numpy
+
+VALUES = [0, 1, 127, 128, 129, 16383, 16384, 2 ** 21, 2 ** 32 - 1, 2 ** 40]
+
+
+def test_encode():
+    assert encode(0) == b'\x80'
+    assert encode(5) == b'\x85'
+    assert encode(130) == b'\x01\x82'  # 130 = 1 * 128 + 2
+
+
+def test_encode_list_matches_encode():
+    assert encode_list(VALUES) == b''.join(encode(value) for value in VALUES)
+    assert encode_list([]) == b''
+    assert encoded_lengths(numpy.array(VALUES, numpy.uint64)).tolist() == [len(encode(value)) for value in VALUES]
+
+
+def test_decode():
+    encoded = encode_list(VALUES)
+    assert decode_list(encoded).tolist() == VALUES
+    assert decode_list(encode_list([5, 6, 7])).tolist() == [5, 6, 7]
+    stream = BytesIO(encoded)
+    assert [decode(stream) for _ in VALUES] == VALUES
+    position, decoded = 0, []
+    while position < len(encoded):
+        value, position = decode_from(encoded, position)
+        decoded.append(value)
+    assert decoded == VALUES
+
+
+def test_postings_round_trip():
+    postings = [(3, 1), (4, 2), (200, 1), (100000, 300)]
+    assert encode_postings(postings) == encode_list([3, 1, 1, 2, 196, 1, 99800, 300])  # ids are stored as d-gaps
+    ids, frequencies = decode_postings(encode_postings(postings))
+    assert list(zip(ids.tolist(), frequencies.tolist())) == postings
+
+
+def test_skip_table():
+    postings = [(id, id % 5 + 1) for id in range(1, 3000, 3)]
+    encoded, table = encode_skips(postings, 128)
+    assert encoded == encode_postings(postings)
+    skips = numpy.frombuffer(table, '<u4').reshape(-1, 2)
+    assert len(skips) == -(-len(postings) // 128)
+    ends = range(128, len(postings) + 128, 128)
+    assert skips[:, 0].tolist() == [postings[min(end, len(postings)) - 1][0] for end in ends]
+    assert skips[-1, 1] == len(encoded)
+    previous, start = 0, 0
+    for last, end in skips.tolist():  # each block decodes alone, continuing from the previous id
+        gaps = decode_list(encoded[start:end])
+        ids = previous + numpy.cumsum(gaps[0::2])
+        assert ids[-1] == last
+        previous, start = last, end
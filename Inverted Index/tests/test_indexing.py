@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+from collection import Collection, SPIMICollection
+from compression import decode, decode_postings, SKIP_INTERVAL
+from inverted_file import InvertedFile
+from lexicon import Lexicon
+from struct import unpack
+import tempfile
+
+
+def read_list(invlists_file):
+    df = unpack('I', invlists_file.read(4))[0]
+    pairs = unpack('%dI' % (2 * df), invlists_file.read(8 * df))
+    return list(zip(pairs[::2], pairs[1::2]))
+
+
+def read_compressed_list(invlists_file):
+    df = decode(invlists_file)
+    length = decode(invlists_file)
+    invlists_file.read(8 * -(-df // SKIP_INTERVAL))  # the skip table
+    ids, frequencies = decode_postings(invlists_file.read(length))
+    assert len(ids) == df
+    return list(zip(ids.tolist(), frequencies.tolist()))
+
+
+def build_index(directory, monkeypatch, build, compressed=False):
+    """
+    Writes the <map>, <lexicon> and <invlists> files of a Collection to <directory>.
+
+    :return: the lines of <map> and a dictionary of the inverted list of each term
+    """
+    directory.mkdir()
+    monkeypatch.chdir(directory)
+    collection = build()
+    collection.write_map_to_disk()
+    if compressed:
+        collection.write_compressed_invlists_lexicon_to_disk()
+    else:
+        collection.write_invlists_lexicon_to_disk()
+    postings = {}
+    with Lexicon('lexicon') as lexicon, open('invlists', 'rb') as invlists_file:
+        for term, entry in lexicon.items():
+            invlists_file.seek(entry.offset)
+            postings[term] = read_compressed_list(invlists_file) if compressed else read_list(invlists_file)
+            assert (entry.df, entry.cf) == (len(postings[term]), sum(frequency for _, frequency in postings[term]))
+    return (directory / 'map').read_text().split('\n'), postings
+
+
+def test_spimi_matches_serial(tmp_path, monkeypatch, collection, stoplist):
+    serial = build_index(tmp_path / 'serial', monkeypatch, lambda: Collection(collection, stoplist))
+    assert build_index(tmp_path / 'spimi', monkeypatch,
+                       lambda: SPIMICollection(collection, stoplist, 64 * 1024)) == serial
+
+
+def test_compressed_matches_raw(tmp_path, monkeypatch, collection):
+    raw = build_index(tmp_path / 'raw', monkeypatch, lambda: Collection(collection))
+    assert build_index(tmp_path / 'vbyte', monkeypatch, lambda: Collection(collection), True) == raw
+    assert build_index(tmp_path / 'spimi', monkeypatch,
+                       lambda: SPIMICollection(collection, None, 64 * 1024), True) == raw
+
+
+def test_workers_match_serial(tmp_path, monkeypatch, collection, stoplist):
+    serial = build_index(tmp_path / 'serial', monkeypatch, lambda: Collection(collection, stoplist))
+    assert build_index(tmp_path / 'workers', monkeypatch, lambda: Collection(collection, stoplist, 3)) == serial
+    assert build_index(tmp_path / 'spimi_workers', monkeypatch,
+                       lambda: SPIMICollection(collection, stoplist, 64 * 1024, 2)) == serial
+
+
+def test_spimi_writes_terms_in_order(tmp_path, monkeypatch, collection):
+    build_index(tmp_path / 'spimi', monkeypatch, lambda: SPIMICollection(collection, None, 16 * 1024))
+    with Lexicon(str(tmp_path / 'spimi' / 'lexicon')) as lexicon:
+        terms = [term for term, _ in lexicon.items()]
+    assert terms == sorted(terms)
+
+
+def test_spimi_removes_its_runs(tmp_path, monkeypatch, collection):
+    (tmp_path / 'runs').mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path / 'runs'))
+    monkeypatch.chdir(tmp_path)
+    spimi = SPIMICollection(collection, None, 16 * 1024)
+    assert len(spimi.indexer.runs) > 1
+    assert len(list((tmp_path / 'runs').iterdir())) == len(spimi.indexer.runs)
+    spimi.write_invlists_lexicon_to_disk()
+    assert list((tmp_path / 'runs').iterdir()) == []
+
+
+def test_inverted_file_reads_every_list(tmp_path, monkeypatch, collection):
+    for name, compressed in (('raw', False), ('vbyte', True)):
+        _, postings = build_index(tmp_path / name, monkeypatch, lambda: Collection(collection), compressed)
+        with Lexicon('lexicon') as lexicon, InvertedFile('invlists', compressed) as invlists:
+            for term, entry in lexicon.items():
+                ids, frequencies = invlists.postings(entry.offset)
+                assert list(zip(ids.tolist(), frequencies.tolist())) == postings[term]
+
+
+def test_inverted_file_of_empty_collection(tmp_path):
+    (tmp_path / 'invlists').write_bytes(b'')
+    with InvertedFile(str(tmp_path / 'invlists')) as invlists:
+        assert invlists.buffer == b''
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+from lexicon import Lexicon, LexiconWriter
+import pytest
+
+TERMS = sorted(set(['a', 'ab', 'abc', 'abd', 'b', 'campus', 'camp', 'camping', 'zebra', 'zoo', 'on', 'one', 'only']
+                   + ['term%03d' % number for number in range(100)] + ['x' * 300, 'x' * 301 + 'y']))
+
+
+@pytest.fixture(params=[1, 4, 16])
+def lexicon(request, tmp_path):
+    file_path = str(tmp_path / 'lexicon')
+    with LexiconWriter(file_path, request.param) as writer:
+        for rank, term in enumerate(TERMS):
+            writer.add(term, rank * 10, rank + 1, 2 * rank + 1, rank / 4)
+    with Lexicon(file_path) as lexicon:
+        yield lexicon
+
+
+def test_round_trip(lexicon):
+    assert len(lexicon) == len(TERMS)
+    assert [term for term, _ in lexicon.items()] == TERMS
+    for rank, term in enumerate(TERMS):
+        assert lexicon.find(term) == (rank, (rank * 10, rank + 1, 2 * rank + 1, rank / 4))
+        assert lexicon.get(term) == (rank * 10, rank + 1, 2 * rank + 1, rank / 4)
+        assert term in lexicon
+        assert lexicon[term].offset == rank * 10
+
+
+def test_entries(lexicon):
+    ranks = [0, 1, 5, 17, 18, len(TERMS) - 1]
+    assert [(rank, term) for rank, term, _ in lexicon.entries(ranks)] == [(rank, TERMS[rank]) for rank in ranks]
+
+
+def test_max_score_defaults_to_zero(tmp_path):
+    with LexiconWriter(str(tmp_path / 'lexicon')) as writer:
+        writer.add('a', 0, 1, 1)
+    with Lexicon(str(tmp_path / 'lexicon')) as lexicon:
+        assert lexicon['a'].max_score == 0.0
+
+
+def test_front_coding(tmp_path):
+    file_path = tmp_path / 'lexicon'
+    with LexiconWriter(str(file_path), 4) as writer:
+        for term in ('camp', 'camping', 'campus', 'zoo'):
+            writer.add(term, 0, 1, 1)
+    assert b'camping' not in file_path.read_bytes()  # only the suffix "ing" follows "camp"
+    assert b'zoo' in file_path.read_bytes()
+
+
+def test_missing_terms(lexicon):
+    for term in ('', '0', 'aa', 'abe', 'cam', 'term1000', 'zz', 'x' * 301):
+        assert lexicon.find(term) is None
+        assert lexicon.get(term, 'missing') == 'missing'
+        assert term not in lexicon
+    with pytest.raises(KeyError):
+        lexicon['aa']
+
+
+def test_unsorted_terms(tmp_path):
+    with LexiconWriter(str(tmp_path / 'lexicon')) as writer:
+        writer.add('b', 0, 1, 1)
+        with pytest.raises(ValueError):
+            writer.add('a', 0, 1, 1)
+        with pytest.raises(ValueError):
+            writer.add('b', 0, 1, 1)
+
+
+def test_not_a_lexicon(tmp_path):
+    (tmp_path / 'lexicon').write_bytes(b'term 0\n' * 10)
+    with pytest.raises(ValueError):
+        Lexicon(str(tmp_path / 'lexicon'))
+
+
+def test_empty(tmp_path):
+    with LexiconWriter(str(tmp_path / 'lexicon')):
+        pass
+    with Lexicon(str(tmp_path / 'lexicon')) as lexicon:
+        assert len(lexicon) == 0
+        assert lexicon.get('a') is None
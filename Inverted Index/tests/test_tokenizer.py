@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+
+from tokenizer import main, tokenize, tokenize_words
+import sys
+
+
+def test_rules():
+    assert tokenize("The On-Campus yes/no can't") == ['the', 'on', 'campus', 'yes', 'no', 'can', 't']
+    assert tokenize('Hello, world! 42 times_over') == ['hello', 'world', 'times', 'over']
+    assert tokenize('') == []
+
+
+def test_stoplist():
+    assert tokenize('the cat and the hat', {'the', 'and'}) == ['cat', 'hat']
+
+
+def test_bytes_and_non_latin_text():
+    assert tokenize(b'Caf\xc3\xa9 au lait') == ['caf', 'au', 'lait']
+    assert tokenize('naïve 中文 text') == ['na', 've', 'text']
+
+
+def test_per_word_baseline():
+    assert tokenize_words("The On-Campus yes/no can't x's") == ['the', 'oncampus', 'yes', 'no', 'can']
+    assert tokenize_words('the cat', {'the'}) == ['cat']
+
+
+def test_main_measures_a_collection(monkeypatch, capsys, collection, stoplist):
+    monkeypatch.setattr(sys, 'argv', ['tokenizer.py', '-s', stoplist, '-t', '1', collection])
+    main()
+    lines = [line.split() for line in capsys.readouterr().out.splitlines()]
+    assert lines[0][0] == '300' and lines[0][1:4:2] == ['docs', 'MB']
+    assert [line[0] for line in lines] == ['300', 'per-word', 'tokenize', 'speedup']
+    assert int(lines[1][1]) > 0 and int(lines[2][1]) > 0
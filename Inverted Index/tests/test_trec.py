@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+from trec import parse_documents, read_chunk, read_documents, split_collection
+
+COLLECTION = '''<DOC>
+<DOCNO> LA010189-0001 </DOCNO>
+<DOCID> 1 </DOCID>
+<HEADLINE>
+<P>
+Rates rise
+</P>
+</HEADLINE>
+<BYLINE>
+By a reporter
+</BYLINE>
+<TEXT>
+<P>
+Interest rates rose
+</P>
+<P>
+on Monday.
+</P>
+</TEXT>
+</DOC>
+<DOC>
+<DOCNO> LA010189-0002 </DOCNO>
+<TEXT>
+Nothing else.
+</TEXT>
+</DOC>
+<DOC>
+<DOCNO> LA010189-0003 </DOCNO>
+</DOC>
+'''
+
+
+def test_reads_headline_and_text(tmp_path):
+    (tmp_path / 'collection').write_text(COLLECTION)
+    assert list(read_documents(str(tmp_path / 'collection'))) == [
+        (1, 'LA010189-0001', 'Rates rise\nInterest rates rose\non Monday.\n'),
+        (2, 'LA010189-0002', 'Nothing else.\n'),
+        (3, 'LA010189-0003', ''),
+    ]
+
+
+def test_skipped_documents_keep_their_ids(tmp_path):
+    (tmp_path / 'collection').write_text(COLLECTION)
+    documents = read_documents(str(tmp_path / 'collection'), {'LA010189-0002', 'LA010189-0003'})
+    assert list(documents) == [(2, 'LA010189-0002', 'Nothing else.\n'), (3, 'LA010189-0003', '')]
+
+
+def test_empty_collection(tmp_path):
+    (tmp_path / 'collection').write_text('')
+    assert list(read_documents(str(tmp_path / 'collection'))) == []
+
+
+def test_chunks_partition_the_collection(collection):
+    with open(collection, 'rb') as f:
+        size = len(f.read())
+    chunks = split_collection(collection, 4096)
+    assert len(chunks) > 1
+    assert chunks[0][0] == 0 and chunks[-1][1] == size
+    assert all(end == start for (_, end, _), (start, _, _) in zip(chunks, chunks[1:]))
+    documents = []
+    for start, end, id in chunks:
+        assert id == len(documents)
+        documents.extend(parse_documents(read_chunk(collection, start, end), id=id))
+    assert documents == list(read_documents(collection))